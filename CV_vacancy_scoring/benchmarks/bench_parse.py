@@ -0,0 +1,165 @@
+"""
+Бенчмарк парсеров parse_cv / parse_vac на корпусе benchmarks/corpus.
+
+Для каждой страницы: время разбора (медиана по повторам), страниц в секунду,
+пик памяти (tracemalloc) и разбивка времени по фазам:
+  dom    - построение дерева HTML (make_page: BeautifulSoup / lxml / selectolax);
+  json   - вырезание встроенного JSON (extract_json_values, только резюме);
+  прочее - выборки по data-qa и сборка Markdown.
+Заодно результат сверяется с эталоном corpus/<имя>.md: при расхождении код выхода 1.
+
+С --stream страница подаётся кусками в потоковый разбор (hh_stream.py): в общее время входит
+вырезание скелета, dom / json считаются уже по скелету, "прочит. КБ" - сколько страницы
+пришлось прочитать до остановки.
+
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --stream
+    python benchmarks/bench_parse.py --engine selectolax --targeted --repeat 20
+    python benchmarks/bench_parse.py --update-golden     # после осознанного изменения вывода
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hh_stream import skeleton  # noqa: E402
+from parse_hh import CV_JSON_MARKERS, ENGINES, extract_json_values, make_page, parse_cv, parse_vac  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+@dataclass
+class PageResult:
+    name: str
+    size_kb: float
+    total_ms: float
+    dom_ms: float
+    json_ms: float
+    peak_kb: float
+    golden_ok: Optional[bool]
+    read_kb: float = 0.0
+
+    @property
+    def other_ms(self) -> float:
+        return max(0.0, self.total_ms - self.dom_ms - self.json_ms)
+
+    @property
+    def pages_per_sec(self) -> float:
+        return 1000.0 / self.total_ms if self.total_ms else float("inf")
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def _peak_kb(fn: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def bench_page(
+    path: str, engine: str, targeted: bool, repeat: int, update_golden: bool = False, stream: bool = False
+) -> PageResult:
+    name = os.path.basename(path)
+    with open(path, encoding="utf-8") as f:
+        page = f.read()
+    is_cv = name.startswith("cv_")
+    size_kb = len(page.encode("utf-8")) / 1024
+    read_kb = size_kb
+    if stream:
+        kind = "cv" if is_cv else "vac"
+        html, read = skeleton(page, kind)
+        read_kb = len(page[:read].encode("utf-8")) / 1024
+        page_parse = parse_cv if is_cv else parse_vac
+
+        def parse(_: str, engine: str, targeted: bool) -> str:
+            return page_parse(skeleton(page, kind)[0], engine, targeted)
+    else:
+        html = page
+        parse = parse_cv if is_cv else parse_vac
+
+    md = parse(html, engine, targeted)  # прогрев (кэши regex, импорты движка)
+    golden_path = os.path.splitext(path)[0] + ".md"
+    golden_ok: Optional[bool] = None
+    if update_golden:
+        with open(golden_path, "w", encoding="utf-8") as f:
+            f.write(md)
+    elif os.path.exists(golden_path):
+        with open(golden_path, encoding="utf-8") as f:
+            golden_ok = f.read() == md
+
+    return PageResult(
+        name=name,
+        size_kb=size_kb,
+        total_ms=_median_ms(lambda: parse(html, engine, targeted), repeat),
+        dom_ms=_median_ms(lambda: make_page(html, engine, targeted), repeat),
+        json_ms=_median_ms(lambda: extract_json_values(html, CV_JSON_MARKERS), repeat) if is_cv else 0.0,
+        peak_kb=_peak_kb(lambda: parse(html, engine, targeted)),
+        golden_ok=golden_ok,
+        read_kb=read_kb,
+    )
+
+
+def run(
+    engine: str, targeted: bool, repeat: int, pattern: str = "*.html", update_golden: bool = False, stream: bool = False
+) -> List[PageResult]:
+    paths = sorted(glob.glob(os.path.join(CORPUS_DIR, pattern)))
+    return [bench_page(p, engine, targeted, repeat, update_golden, stream) for p in paths]
+
+
+def print_report(results: List[PageResult], engine: str, targeted: bool, stream: bool = False) -> None:
+    print(f"engine={engine} targeted={int(targeted)} stream={int(stream)}")
+    header = f"{'страница':<16}{'КБ':>8}{'прочит. КБ':>12}{'мс':>9}{'стр/с':>9}{'dom мс':>9}{'json мс':>9}{'прочее':>9}{'пик КБ':>10}  эталон"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        golden = {True: "ok", False: "РАСХОЖДЕНИЕ", None: "-"}[r.golden_ok]
+        print(
+            f"{r.name:<16}{r.size_kb:>8.0f}{r.read_kb:>12.0f}{r.total_ms:>9.2f}{r.pages_per_sec:>9.1f}"
+            f"{r.dom_ms:>9.2f}{r.json_ms:>9.2f}{r.other_ms:>9.2f}{r.peak_kb:>10.0f}  {golden}"
+        )
+    total_ms = sum(r.total_ms for r in results)
+    total_kb = sum(r.size_kb for r in results)
+    if total_ms:
+        print(f"итого: {len(results)} стр., {total_ms:.1f} мс, {1000 * len(results) / total_ms:.1f} стр/с, {total_kb / total_ms * 1000 / 1024:.1f} МБ/с")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--engine", choices=ENGINES, default="html.parser")
+    ap.add_argument("--targeted", action="store_true", help="индекс data-qa вместо полного дерева")
+    ap.add_argument("--repeat", type=int, default=5, help="повторов на страницу (берётся медиана)")
+    ap.add_argument("--pattern", default="*.html", help="glob по файлам корпуса, например 'cv_*.html'")
+    ap.add_argument("--update-golden", action="store_true", help="перезаписать эталонные .md текущим выводом")
+    ap.add_argument("--stream", action="store_true", help="потоковый разбор со скелетом страницы (hh_stream.py)")
+    args = ap.parse_args(argv)
+
+    results = run(args.engine, args.targeted, max(1, args.repeat), args.pattern, args.update_golden, args.stream)
+    if not results:
+        print(f"Нет страниц в {CORPUS_DIR} (сначала python benchmarks/make_corpus.py)", file=sys.stderr)
+        return 2
+    print_report(results, args.engine, args.targeted, args.stream)
+    return 1 if any(r.golden_ok is False for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Локальная замена hh.ru для нагрузочных прогонов: отдаёт страницы из benchmarks/corpus.
+
+  /resume/<id>   - одна из страниц cv_*.html (выбор по хэшу id, стабильный)
+  /vacancy/<id>  - одна из страниц vac_*.html
+
+Настраиваются задержка ответа и доля ошибок 503/429 (с Retry-After), поддерживаются
+gzip и условные запросы по ETag. Можно запустить отдельно:
+
+    python benchmarks/fake_hh.py --port 8081 --latency 0.2 --error-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import gzip
+import hashlib
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+@dataclass
+class FakeHHConfig:
+    # задержка перед ответом (секунды) и её случайный разброс +-jitter
+    latency: float = 0.05
+    jitter: float = 0.02
+    # доля ответов 503 и 429 (на 429 приходит Retry-After)
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.1
+
+
+@dataclass
+class _Page:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+@dataclass
+class FakeHHStats:
+    requests: int = 0
+    not_modified: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, name: str) -> None:
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _load_pages(prefix: str) -> List[_Page]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, f"{prefix}_*.html"))):
+        with open(path, "rb") as f:
+            body = f.read()
+        pages.append(_Page(body, gzip.compress(body, compresslevel=5), '"' + hashlib.md5(body).hexdigest() + '"'))
+    if not pages:
+        raise FileNotFoundError(f"Нет страниц {prefix}_*.html в {CORPUS_DIR} (python benchmarks/make_corpus.py)")
+    return pages
+
+
+class FakeHH:
+    """HTTP-сервер в фоновом потоке. url - адрес вида http://127.0.0.1:<port>."""
+
+    def __init__(self, config: Optional[FakeHHConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeHHConfig()
+        self.stats = FakeHHStats()
+        self.pages: Dict[str, List[_Page]] = {"resume": _load_pages("cv"), "vacancy": _load_pages("vac")}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def resume_url(self, n: int) -> str:
+        return f"{self.url}/resume/{hashlib.sha1(str(n).encode()).hexdigest()}"
+
+    def vacancy_url(self, n: int) -> str:
+        return f"{self.url}/vacancy/{100000000 + n}"
+
+    def pick(self, path: str) -> Optional[_Page]:
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) != 2 or parts[0] not in self.pages:
+            return None
+        pages = self.pages[parts[0]]
+        return pages[int(hashlib.md5(parts[1].encode()).hexdigest(), 16) % len(pages)]
+
+    def _handler(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args) -> None:  # noqa: A002
+                pass
+
+            def handle(self) -> None:
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    # клиент закрыл соединение, не дочитав ответ (потоковый разбор, HH_STREAM_PARSE)
+                    pass
+
+            def _reply(self, status: int, body: bytes = b"", headers: Tuple[Tuple[str, str], ...] = ()) -> None:
+                self.send_response(status)
+                for k, v in headers:
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self) -> None:  # noqa: N802
+                cfg = fake.config
+                fake.stats.add("requests")
+                time.sleep(max(0.0, cfg.latency + random.uniform(-cfg.jitter, cfg.jitter)))
+
+                roll = random.random()
+                if roll < cfg.rate_limit_rate:
+                    fake.stats.add("rate_limited")
+                    return self._reply(429, b"Too Many Requests", (("Retry-After", str(cfg.retry_after)),))
+                if roll < cfg.rate_limit_rate + cfg.error_rate:
+                    fake.stats.add("errors")
+                    return self._reply(503, b"Service Unavailable")
+
+                page = fake.pick(self.path)
+                if page is None:
+                    return self._reply(404, b"Not Found")
+                if self.headers.get("If-None-Match") == page.etag:
+                    fake.stats.add("not_modified")
+                    return self._reply(304, headers=(("ETag", page.etag),))
+
+                headers = [("Content-Type", "text/html; charset=utf-8"), ("ETag", page.etag)]
+                body = page.body
+                if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    body = page.gzipped
+                    headers.append(("Content-Encoding", "gzip"))
+                self._reply(200, body, tuple(headers))
+
+        return Handler
+
+    def start(self) -> "FakeHH":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-hh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=FakeHHConfig.latency)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    fake = FakeHH(FakeHHConfig(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate), args.host, args.port)
+    print(f"fake hh.ru: {fake.url}/resume/<id>, {fake.url}/vacancy/<id>")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Локальная замена OpenAI chat.completions для нагрузочных прогонов.
+
+POST /v1/chat/completions: обычный ответ или SSE-поток (stream=True, с usage в последнем
+чанке при stream_options.include_usage). Настраиваются задержка до первого токена,
+задержка на токен и доля ответов 429 (с Retry-After). Клиент openai направляется сюда
+через OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Можно запустить отдельно:
+
+    python benchmarks/fake_openai.py --port 8082 --ttft 0.5 --token-delay 0.01 --rate-limit-rate 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Ответ в том виде, в каком его пишет модель: анализ, качество резюме, итоговая оценка
+ANSWER_TEMPLATE = (
+    "Анализ: опыт кандидата частично совпадает с требованиями вакансии, "
+    "ключевые навыки (SQL, Python) подтверждены описанием задач.\n"
+    "Качество заполнения резюме: {quality}/10 - задачи и способы их решения описаны.\n"
+    "Итоговая оценка: {score}/10"
+)
+
+_WORD_RE = re.compile(r"\S+\s*")
+
+
+@dataclass
+class FakeOpenAIConfig:
+    # задержка до первого токена и на каждый следующий (секунды)
+    ttft: float = 0.3
+    token_delay: float = 0.005
+    # доля ответов 429 с Retry-After
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.2
+
+
+@dataclass
+class FakeOpenAIStats:
+    requests: int = 0
+    streamed: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            setattr(self, name, getattr(self, name) + n)
+
+
+def _answer(messages: List[Dict[str, Any]]) -> str:
+    # оценка зависит от промпта, но детерминированно - повторный прогон даёт тот же результат
+    digest = int(hashlib.md5(json.dumps(messages, ensure_ascii=False).encode()).hexdigest(), 16)
+    return ANSWER_TEMPLATE.format(quality=1 + digest % 10, score=1 + (digest >> 8) % 10)
+
+
+def _tokens(text: str) -> List[str]:
+    """Грубая нарезка на "токены" по словам - для потоковой отдачи и подсчёта usage."""
+    return _WORD_RE.findall(text)
+
+
+class FakeOpenAI:
+    """HTTP-сервер в фоновом потоке. base_url - значение для OPENAI_BASE_URL."""
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeOpenAIConfig()
+        self.stats = FakeOpenAIStats()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args) -> None:  # noqa: A002
+                pass
+
+            def _json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = {}) -> None:  # noqa: B006
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:  # noqa: N802
+                cfg = fake.config
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                fake.stats.add("requests")
+                if random.random() < cfg.rate_limit_rate:
+                    fake.stats.add("rate_limited")
+                    return self._json(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": str(cfg.retry_after)},
+                    )
+
+                messages = req.get("messages") or []
+                prompt_tokens = sum(len(_tokens(str(m.get("content", "")))) for m in messages)
+                pieces = _tokens(_answer(messages))[: int(req.get("max_tokens") or 10**6)]
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(pieces),
+                    "total_tokens": prompt_tokens + len(pieces),
+                }
+                fake.stats.add("prompt_tokens", prompt_tokens)
+                fake.stats.add("completion_tokens", len(pieces))
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "created": int(time.time()), "model": req.get("model", "gpt-4o")}
+
+                time.sleep(cfg.ttft)
+                if not req.get("stream"):
+                    time.sleep(cfg.token_delay * len(pieces))
+                    return self._json(200, {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+                fake.stats.add("streamed")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # без Content-Length: поток заканчивается закрытием соединения
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def event(payload: Any) -> None:
+                    data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+                    self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                chunk = {**base, "object": "chat.completion.chunk"}
+                try:
+                    event({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+                    for piece in pieces:
+                        time.sleep(cfg.token_delay)
+                        event({**chunk, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                    event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                    if (req.get("stream_options") or {}).get("include_usage"):
+                        event({**chunk, "choices": [], "usage": usage})
+                    event("[DONE]")
+                except (BrokenPipeError, ConnectionResetError):
+                    # клиент оборвал поток (отмена оценки) - это штатная ситуация
+                    pass
+
+        return Handler
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8082)
+    ap.add_argument("--ttft", type=float, default=FakeOpenAIConfig.ttft)
+    ap.add_argument("--token-delay", type=float, default=FakeOpenAIConfig.token_delay)
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    fake = FakeOpenAI(FakeOpenAIConfig(ttft=args.ttft, token_delay=args.token_delay, rate_limit_rate=args.rate_limit_rate), args.host, args.port)
+    print(f"fake OpenAI: OPENAI_BASE_URL={fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
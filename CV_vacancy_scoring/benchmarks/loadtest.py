@@ -0,0 +1,190 @@
+"""
+Офлайн-прогон оценки под нагрузкой: поднимает локальные замены hh.ru (fake_hh.py)
+и OpenAI (fake_openai.py), направляет на них get_html и клиент openai и гоняет
+оценку пачки резюме с заданной параллельностью.
+
+Режимы:
+  stages (по умолчанию) - тот же конвейер, что в пакетном режиме приложения
+      (fetch -> parse_cv_doc -> build_prompt -> request_gpt), с замером каждой стадии:
+      пропускная способность и p50/p95/p99 для fetch, parse, llm (и ttft при --stream);
+  batch - сквозной прогон score_batch из scoring.py, латентность на резюме.
+
+Кэши страниц и ответов LLM на время прогона кладутся во временную папку, ответы
+модели запрашиваются мимо кэша - каждый прогон честно ходит на оба сервера.
+
+    python benchmarks/loadtest.py --pairs 200 --max-http 16 --max-llm 8
+    python benchmarks/loadtest.py --pairs 100 --stream --llm-429 0.1 --hh-errors 0.05
+    python benchmarks/loadtest.py --mode batch --pairs 100
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_hh import FakeHH, FakeHHConfig  # noqa: E402
+from fake_openai import FakeOpenAI, FakeOpenAIConfig  # noqa: E402
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга (для отчёта этого достаточно)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+@dataclass
+class StageStats:
+    seconds: List[float] = field(default_factory=list)
+    errors: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.seconds.append(seconds)
+
+    def fail(self) -> None:
+        with self.lock:
+            self.errors += 1
+
+
+def print_report(stages: Dict[str, StageStats], wall: float, pairs: int, hh: FakeHH, oai: FakeOpenAI) -> None:
+    print(f"пар: {pairs}, время: {wall:.2f} с, пропускная способность: {pairs / wall:.2f} пар/с")
+    header = f"{'стадия':<8}{'n':>7}{'ошибок':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}{'оп/с':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, st in stages.items():
+        ms = [s * 1000 for s in st.seconds]
+        print(
+            f"{name:<8}{len(ms):>7}{st.errors:>8}{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}"
+            f"{percentile(ms, 99):>10.1f}{max(ms, default=float('nan')):>10.1f}{len(ms) / wall:>9.2f}"
+        )
+    print(
+        f"fake hh.ru: запросов {hh.stats.requests}, 503 {hh.stats.errors}, 429 {hh.stats.rate_limited}; "
+        f"fake OpenAI: запросов {oai.stats.requests} (поток {oai.stats.streamed}), 429 {oai.stats.rate_limited}, "
+        f"токенов {oai.stats.prompt_tokens}+{oai.stats.completion_tokens}"
+    )
+
+
+def run_stages(hh: FakeHH, pairs: int, max_http: int, max_llm: int, stream: bool, compact: bool) -> Dict[str, StageStats]:
+    # импорт после настройки env в main: клиент openai и пути кэшей читают его при импорте
+    from get_html import fetch
+    from parse_hh import parse_cv_doc, parse_vac_doc
+    from scoring import build_prompt, extract_score, request_gpt, request_gpt_stream, scoring_prompt
+
+    stages = {name: StageStats() for name in (["fetch", "parse", "ttft", "llm"] if stream else ["fetch", "parse", "llm"])}
+    vac_doc = parse_vac_doc(fetch(hh.vacancy_url(0)).text or "")
+    http_slots = threading.Semaphore(max(1, max_http))
+    llm_slots = threading.Semaphore(max(1, max_llm))
+
+    def one(n: int) -> Optional[int]:
+        started = time.perf_counter()
+        try:
+            with http_slots:
+                page = fetch(hh.resume_url(n))
+            if page.status != 200 or not page.text:
+                raise RuntimeError(f"HTTP {page.status}")
+        except Exception:
+            stages["fetch"].fail()
+            return None
+        stages["fetch"].add(time.perf_counter() - started)
+
+        # стадия parse - разбор страницы вместе со сборкой (и сжатием) промпта
+        started = time.perf_counter()
+        cv_doc = parse_cv_doc(page.text)
+        user_prompt, _ = build_prompt(vac_doc, cv_doc, compact=compact)
+        stages["parse"].add(time.perf_counter() - started)
+
+        try:
+            with llm_slots:
+                started = time.perf_counter()
+                if not stream:
+                    answer = request_gpt(scoring_prompt, user_prompt, use_cache=False)
+                else:
+                    parts = []
+                    for delta in request_gpt_stream(scoring_prompt, user_prompt, use_cache=False):
+                        if not parts:
+                            stages["ttft"].add(time.perf_counter() - started)
+                        parts.append(delta)
+                    answer = "".join(parts)
+                stages["llm"].add(time.perf_counter() - started)
+        except Exception:
+            stages["llm"].fail()
+            return None
+        return extract_score(answer)
+
+    workers = max(1, max_http) + max(1, max_llm)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loadtest") as pool:
+        for fut in as_completed([pool.submit(one, n) for n in range(pairs)]):
+            fut.result()
+    return stages
+
+
+def run_batch(hh: FakeHH, pairs: int, max_http: int, max_llm: int, stream: bool, compact: bool) -> Dict[str, StageStats]:
+    from scoring import score_batch
+
+    e2e = StageStats()
+    urls = [hh.resume_url(n) for n in range(pairs)]
+    for res in score_batch(
+        hh.vacancy_url(0), urls, max_http=max_http, max_llm=max_llm, use_cache=False, compact=compact, stream=stream
+    ):
+        if not res.done:
+            continue
+        if res.error:
+            e2e.fail()
+        else:
+            e2e.add(res.seconds)
+    return {"e2e": e2e}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("stages", "batch"), default="stages")
+    ap.add_argument("--pairs", type=int, default=100, help="сколько резюме оценить против одной вакансии")
+    ap.add_argument("--max-http", type=int, default=8)
+    ap.add_argument("--max-llm", type=int, default=4)
+    ap.add_argument("--stream", action="store_true", help="потоковые ответы модели")
+    ap.add_argument("--compact", action="store_true", help="со сжатием промпта")
+    ap.add_argument("--hh-latency", type=float, default=FakeHHConfig.latency)
+    ap.add_argument("--hh-errors", type=float, default=0.0, help="доля ответов 503 от hh.ru")
+    ap.add_argument("--hh-429", type=float, default=0.0, help="доля ответов 429 от hh.ru")
+    ap.add_argument("--hh-rps", type=float, default=0.0, help="HH_RATE_LIMIT_RPS клиента (0 - без ограничения)")
+    ap.add_argument("--llm-ttft", type=float, default=FakeOpenAIConfig.ttft)
+    ap.add_argument("--llm-token-delay", type=float, default=FakeOpenAIConfig.token_delay)
+    ap.add_argument("--llm-429", type=float, default=0.0, help="доля ответов 429 от API")
+    args = ap.parse_args(argv)
+
+    hh = FakeHH(FakeHHConfig(latency=args.hh_latency, error_rate=args.hh_errors, rate_limit_rate=args.hh_429)).start()
+    oai = FakeOpenAI(FakeOpenAIConfig(ttft=args.llm_ttft, token_delay=args.llm_token_delay, rate_limit_rate=args.llm_429)).start()
+    tmp = tempfile.TemporaryDirectory(prefix="hh-loadtest-")
+    os.environ.update({
+        "OPENAI_BASE_URL": oai.base_url,
+        "OPENAI_API_KEY": "sk-loadtest",
+        "HH_CACHE_DIR": tmp.name,
+        "HH_RATE_LIMIT_RPS": str(args.hh_rps),
+        "HH_POOL_SIZE": str(max(args.max_http, 1) * 2),
+    })
+    try:
+        run = run_stages if args.mode == "stages" else run_batch
+        started = time.perf_counter()
+        stages = run(hh, args.pairs, args.max_http, args.max_llm, args.stream, args.compact)
+        print_report(stages, time.perf_counter() - started, args.pairs, hh, oai)
+    finally:
+        hh.stop()
+        oai.stop()
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Генератор обезличенного корпуса страниц hh.ru для бенчмарка парсеров.
+
+Страницы повторяют структуру настоящих: data-qa разметка в том же порядке (у вакансии адрес, метро,
+график и дата публикации идут после описания и навыков, ниже - похожие вакансии, затем подвал),
+крупные inline-скрипты в <head> и в конце <body>, встроенный JSON состояния с маркерами
+advancedKeySkills / experience / education.
+Все имена, компании и тексты выдуманы. Генерация детерминированная.
+
+    python benchmarks/make_corpus.py            # перезаписать benchmarks/corpus/*.html
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+from typing import Dict, List
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+COMPANIES = ["ООО «Северный ветер»", "АО Альфа-Системы", "ИП Кузнецов", "Data Lab", "ПАО «Ромашка»", "Студия Пиксель"]
+ROLES = ["Аналитик данных", "Старший аналитик", "BI-разработчик", "Data Engineer", "Продуктовый аналитик"]
+SKILLS = ["SQL", "Python", "pandas", "Power BI", "Tableau", "Airflow", "ClickHouse", "PostgreSQL", "A/B-тесты", "Excel", "Git", "Spark"]
+BULLETS = [
+    "Построил витрину данных для отдела продаж",
+    "Автоматизировал ежедневную отчётность (Airflow + SQL)",
+    "Провёл A/B-тест новой воронки, конверсия +12%",
+    "Настроил дашборды в Power BI для руководства",
+    "Оптимизировал запросы к ClickHouse — ускорение в 5 раз",
+    "Внедрил проверку качества данных \"на входе\"",
+    "Обучал junior-аналитиков [SQL, pandas]",
+]
+UNIVERSITIES = ["Уральский федеральный университет", "НИУ ВШЭ", "МГТУ им. Баумана"]
+
+
+def _script_bundle(rng: random.Random, size: int) -> str:
+    """Крупный inline-скрипт, как бандлы на hh.ru: строки с кавычками, скобками и экранированием."""
+    chunk = 'window.__x=function(a){return {"k":"v\\"[{","n":[1,2,3]}};'
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        s = chunk.replace("__x", f"__f{rng.randint(0, 10**6)}")
+        parts.append(s)
+        total += len(s)
+    return "<script>" + "".join(parts) + "</script>"
+
+
+def _filler_dom(rng: random.Random, blocks: int) -> str:
+    return "".join(
+        f'<div class="bloko-column"><a data-qa="nav-link-{i}" href="/x/{i}"><span>Раздел {i}</span></a>'
+        f'<p class="muted">Подсказка&nbsp;{rng.randint(1, 999)}</p></div>'
+        for i in range(blocks)
+    )
+
+
+def resume_page(n_jobs: int, bundle_size: int, filler: int, seed: int) -> str:
+    rng = random.Random(seed)
+    role = rng.choice(ROLES)
+    experience = []
+    for i in range(n_jobs):
+        bullets = rng.sample(BULLETS, k=min(len(BULLETS), 2 + i % 4))
+        # повторяющиеся пункты - частая история в настоящих резюме
+        if i % 3 == 1:
+            bullets.append(bullets[0])
+        experience.append({
+            "companyName": rng.choice(COMPANIES),
+            "position": rng.choice(ROLES),
+            "start": f"{2023 - 2 * i}-0{1 + i % 9}-01",
+            "end": "" if i == 0 else f"{2024 - 2 * i}-12-01",
+            "description": "Отвечал за аналитику направления.\n" + "\n".join(f"- {b}" for b in bullets),
+        })
+    state = {
+        "resume": {
+            "title": {"value": role},
+            "advancedKeySkills": {"value": [{"id": k, "name": s, "general": False} for k, s in enumerate(rng.sample(SKILLS, k=5 + seed % 5))]},
+            "experience": {"value": experience},
+            "education": {"value": [{"year": 2010 + seed % 8, "organization": rng.choice(UNIVERSITIES), "result": "Факультет ИТ", "specialty": "Прикладная математика"}]},
+        }
+    }
+    return f"""<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Резюме {role} — hh.ru</title>
+<meta name="description" content="Резюме {role}"/>
+<link rel="canonical" href="https://hh.ru/resume/{seed:040x}"/>
+{_script_bundle(rng, bundle_size)}</head><body>
+<header>{_filler_dom(rng, filler)}</header>
+<main class="resume-applicant">
+<div class="resume-header"><h2 data-qa="resume-block-title-position"><span>{role}</span></h2>
+<span data-qa="resume-personal-address"><span>Екатеринбург</span></span>
+<span data-qa="resume-personal-metro">Площадь&nbsp;1905&nbsp;года</span></div>
+<div data-qa="resume-block-skills-content"><p>Люблю    данные и понятные отчёты.</p><p>Работаю с SQL<br/>и Python.</p></div>
+</main>
+<footer>{_filler_dom(rng, filler // 2)}</footer>
+<template id="HH-Lux-InitialState">{json.dumps(state, ensure_ascii=False, separators=(",", ":"))}</template>
+{_script_bundle(rng, bundle_size // 4)}
+</body></html>
+"""
+
+
+def vacancy_page(n_paragraphs: int, bundle_size: int, filler: int, seed: int) -> str:
+    rng = random.Random(seed)
+    role = rng.choice(ROLES)
+    company = rng.choice(COMPANIES)
+    desc = "".join(
+        f"<p><strong>Блок {i}.</strong> {rng.choice(BULLETS)} &amp; поддержка</p>"
+        f"<ul><li>{rng.choice(BULLETS)}</li><li>{rng.choice(BULLETS)}</li></ul>"
+        for i in range(n_paragraphs)
+    )
+    tags = "".join(f'<li data-qa="skills-element"><div data-qa="bloko-tag__text">{s}</div></li>' for s in rng.sample(SKILLS, k=4 + seed % 6))
+    # теги в блоке похожих вакансий над подвалом: parse_vac собирает bloko-tag__text со всей страницы
+    related = "".join(f'<span data-qa="bloko-tag__text">{s}</span>' for s in rng.sample(SKILLS, k=3))
+    vac_id = 100000000 + seed
+    return f"""<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Вакансия {role} в {company}</title>
+<meta name="description" content="Вакансия {role} в компании {company}. Зарплата: от 150 000 ₽. Москва. Требуемый опыт: 3–6 лет. Полная. Дата публикации: 0{1 + seed % 9}.02.2026."/>
+<link rel="canonical" href="https://hh.ru/vacancy/{vac_id}"/>
+{_script_bundle(rng, bundle_size)}</head><body>
+<header>{_filler_dom(rng, filler)}</header>
+<div class="vacancy-title"><h1 data-qa="vacancy-title">{role}</h1>
+<a data-qa="vacancy-company-name" href="/employer/1"><span>{company}</span></a></div>
+<div data-qa="vacancy-salary"><span>от 150&nbsp;000 ₽ на руки</span></div>
+<p><span data-qa="vacancy-experience">3–6 лет</span></p>
+<p data-qa="vacancy-view-employment-mode"><span data-qa="vacancy-employment-mode">Полная занятость</span></p>
+<div data-qa="vacancy-description">{desc}</div>
+<div data-qa="vacancy-skill"><ul>{tags}</ul></div>
+<p data-qa="vacancy-work-schedule">Полный день</p>
+<div class="vacancy-address"><span data-qa="vacancy-view-raw-address">Москва, ул. Примерная, 1</span>
+<span data-qa="vacancy-view-metro">Тверская</span></div>
+<p class="vacancy-creation-time-redesigned">Вакансия опубликована <span data-qa="vacancy-creation-time">{1 + seed % 9} февраля 2026</span></p>
+<section class="related-vacancies">{related}</section>
+<footer>{_filler_dom(rng, filler // 2)}</footer>
+{_script_bundle(rng, bundle_size // 4)}
+</body></html>
+"""
+
+
+# имя -> (функция, параметры): размеры от "однострочной" вакансии до резюме с 15 местами работы
+PAGES: Dict[str, tuple] = {
+    "cv_small.html": (resume_page, dict(n_jobs=1, bundle_size=20_000, filler=20, seed=1)),
+    "cv_medium.html": (resume_page, dict(n_jobs=5, bundle_size=150_000, filler=150, seed=2)),
+    "cv_large.html": (resume_page, dict(n_jobs=15, bundle_size=600_000, filler=800, seed=3)),
+    "vac_small.html": (vacancy_page, dict(n_paragraphs=1, bundle_size=10_000, filler=10, seed=4)),
+    "vac_medium.html": (vacancy_page, dict(n_paragraphs=8, bundle_size=120_000, filler=120, seed=5)),
+    "vac_large.html": (vacancy_page, dict(n_paragraphs=40, bundle_size=500_000, filler=600, seed=6)),
+}
+
+
+def main() -> None:
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for name, (fn, params) in PAGES.items():
+        html = fn(**params)
+        with open(os.path.join(CORPUS_DIR, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"{name}: {len(html.encode('utf-8')) // 1024} КБ")
+
+
+if __name__ == "__main__":
+    main()
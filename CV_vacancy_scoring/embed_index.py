@@ -0,0 +1,388 @@
+"""
+Индекс эмбеддингов разобранных резюме и вакансий для обратного поиска
+("какие из уже скачанных резюме подходят под новую вакансию") без запросов к LLM.
+
+Хранение (на каждый провайдер и тип страницы - своя папка):
+  vectors.f32   - float32-матрица строк подряд, читается через numpy.memmap, пишется дозаписью;
+  ids.sqlite    - таблица строк: doc_id, url, хэш текста, активна ли строка.
+Если текст документа изменился (другой хэш), новый вектор дописывается в конец,
+а старая строка помечается неактивной; compact() переписывает файл без таких строк.
+Поиск - одно матричное умножение запросов на матрицу индекса (векторы нормированы,
+т.е. это косинусная близость) и argpartition для top-K.
+
+    python embed_index.py add-cached                  # проиндексировать все резюме из кэша страниц
+    python embed_index.py search <URL вакансии> -k 20
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# грузим библиотеки из соседних файлов
+from hh_cache import CACHE_DIR, iter_cached_docs, load_vac_doc, normalize_url
+from hh_models import Doc, Resume
+from parse_hh import render_cv, render_vac
+
+INDEX_DIR = os.environ.get("EMBED_INDEX_DIR", os.path.join(CACHE_DIR, "embeddings"))
+# Провайдер по умолчанию: hashing - локальный, без сети; openai - text-embedding-3-*
+EMBED_PROVIDER = os.environ.get("EMBED_PROVIDER", "hashing")
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", "128"))
+
+# Сколько строк индекса умножать за раз: ограничивает временную матрицу оценок
+SEARCH_CHUNK_ROWS = 65536
+
+_TOKEN_RE = re.compile(r"[a-zа-яё0-9][a-zа-яё0-9+#]*", re.IGNORECASE)
+
+
+# ---------------------------------------------------------------------------
+# Провайдеры эмбеддингов
+# ---------------------------------------------------------------------------
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+class HashingProvider:
+    """
+    Локальный "hashing vectorizer": слова и пары слов хэшируются (crc32) в dim корзин
+    со знаком, вес - 1 + log(tf). Без сети и без обучения - для офлайн-проверок и тестов.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = _TOKEN_RE.findall(text.lower())
+        features = words + [a + " " + b for a, b in zip(words, words[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vec
+        counts: Dict[int, float] = {}
+        for f in features:
+            h = zlib.crc32(f.encode("utf-8"))
+            idx = h % self.dim
+            counts[idx] = counts.get(idx, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        val = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        vec[idx] = np.sign(val) * (1.0 + np.log(np.maximum(np.abs(val), 1.0)))
+        return vec
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize_rows(np.stack([self._vector(t) for t in texts]))
+
+
+class OpenAIProvider:
+    """Эмбеддинги OpenAI (text-embedding-3-small по умолчанию); длинные тексты обрезаются по токенам."""
+
+    MAX_INPUT_TOKENS = 8000
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        from openai import OpenAI
+
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}-{dim}"
+        self._client = OpenAI()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from prompt_compaction import truncate_tokens
+
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        inputs = [truncate_tokens(t, self.MAX_INPUT_TOKENS) or " " for t in texts]
+        response = self._client.embeddings.create(model=self.model, input=inputs, dimensions=self.dim)
+        rows = sorted(response.data, key=lambda d: d.index)
+        return _normalize_rows(np.asarray([r.embedding for r in rows], dtype=np.float32))
+
+
+PROVIDERS: Dict[str, Callable[[], object]] = {
+    "hashing": HashingProvider,
+    "openai": OpenAIProvider,
+}
+
+
+def make_provider(name: str = EMBED_PROVIDER):
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный провайдер эмбеддингов {name!r}, есть: {', '.join(PROVIDERS)}") from None
+
+
+# ---------------------------------------------------------------------------
+# Индекс
+# ---------------------------------------------------------------------------
+
+def doc_text(doc: Doc) -> str:
+    """Текст, который эмбеддится: тот же Markdown, что уходит в промпт."""
+    return render_cv(doc) if isinstance(doc, Resume) else render_vac(doc)
+
+
+def doc_id(doc: Doc, url: str = "") -> str:
+    """Стабильный ID: ID резюме/вакансии с hh.ru, иначе нормализованный URL."""
+    own = doc.resume_id if isinstance(doc, Resume) else doc.vacancy_id
+    return own or normalize_url(url or doc.url)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Hit:
+    doc_id: str
+    url: str
+    score: float
+
+
+class EmbeddingIndex:
+    """Индекс одного типа документов ("cv" или "vac") для одного провайдера."""
+
+    def __init__(self, kind: str = "cv", provider=None, root: str = INDEX_DIR):
+        self.kind = kind
+        self.provider = provider or make_provider()
+        self.dim = self.provider.dim
+        self.dir = os.path.join(root, self.provider.name, kind)
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.db_path = os.path.join(self.dir, "ids.sqlite")
+        self._row_bytes = self.dim * 4
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS rows (
+                    row INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    added_at REAL NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS rows_active_doc ON rows(doc_id) WHERE active = 1;
+                """
+            )
+            n_rows = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+        # векторы, дописанные без записи в таблицу (падение между двумя шагами), отбрасываем
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > n_rows * self._row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(n_rows * self._row_bytes)
+        self._matrix: Optional[np.ndarray] = None
+        self._meta: Optional[Tuple[np.ndarray, List[str], List[str]]] = None
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __len__(self) -> int:
+        with self._conn() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rows WHERE active = 1").fetchone()[0]
+
+    def _invalidate(self) -> None:
+        self._matrix = None
+        self._meta = None
+
+    def matrix(self) -> np.ndarray:
+        """Все строки файла векторов (включая неактивные) как read-only memmap."""
+        if self._matrix is None:
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            n = size // self._row_bytes
+            if n == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._matrix
+
+    def _active(self) -> Tuple[np.ndarray, List[str], List[str]]:
+        """Номера активных строк и их doc_id / url (кэшируется до следующего изменения)."""
+        if self._meta is None:
+            with self._conn() as conn:
+                rows = conn.execute("SELECT row, doc_id, url FROM rows WHERE active = 1 ORDER BY row").fetchall()
+            self._meta = (
+                np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+                [r[1] for r in rows],
+                [r[2] for r in rows],
+            )
+        return self._meta
+
+    def upsert(self, items: Iterable[Tuple[str, str, str]], batch: int = EMBED_BATCH) -> Dict[str, int]:
+        """
+        items - (doc_id, url, text). Эмбеддятся только новые документы и те, у которых
+        поменялся хэш текста; остальные пропускаются без обращения к провайдеру.
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0}
+        with self._conn() as conn:
+            known = {d: h for d, h in conn.execute("SELECT doc_id, content_hash FROM rows WHERE active = 1")}
+
+        pending: List[Tuple[str, str, str, str]] = []
+        seen = set()
+        for did, url, text in items:
+            if did in seen:
+                continue
+            seen.add(did)
+            h = content_hash(text)
+            if known.get(did) == h:
+                stats["unchanged"] += 1
+                continue
+            stats["updated" if did in known else "added"] += 1
+            pending.append((did, url, text, h))
+            if len(pending) >= batch:
+                self._append(pending)
+                pending = []
+        if pending:
+            self._append(pending)
+        return stats
+
+    def _append(self, items: List[Tuple[str, str, str, str]]) -> None:
+        vecs = self.provider.embed([text for _, _, text, _ in items]).astype(np.float32, copy=False)
+        if vecs.shape != (len(items), self.dim):
+            raise ValueError(f"Провайдер вернул {vecs.shape}, ожидалось {(len(items), self.dim)}")
+        now = time.time()
+        with open(self.vectors_path, "ab") as f:
+            start = f.tell() // self._row_bytes
+            f.write(vecs.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE rows SET active = 0 WHERE doc_id = ? AND active = 1",
+                [(did,) for did, _, _, _ in items],
+            )
+            conn.executemany(
+                "INSERT INTO rows(row, doc_id, url, content_hash, active, added_at) VALUES (?, ?, ?, ?, 1, ?)",
+                [(start + i, did, url, h, now) for i, (did, url, _, h) in enumerate(items)],
+            )
+        self._invalidate()
+
+    def add_docs(self, docs: Iterable[Tuple[str, Doc]], batch: int = EMBED_BATCH) -> Dict[str, int]:
+        """(url, Resume/Vacancy) -> upsert по Markdown-тексту документа."""
+        return self.upsert(((doc_id(d, url), url, doc_text(d)) for url, d in docs), batch=batch)
+
+    def search(self, queries: Union[np.ndarray, Sequence[str]], k: int = 20) -> List[List[Hit]]:
+        """
+        Top-K ближайших для каждого запроса (тексты или уже готовые векторы q x dim).
+        Все запросы обрабатываются одним умножением на каждый блок строк индекса.
+        """
+        # другой процесс мог дописать индекс - тогда перечитываем memmap и таблицу строк
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if self._matrix is not None and size != self._matrix.shape[0] * self._row_bytes:
+            self._invalidate()
+        q = queries if isinstance(queries, np.ndarray) else self.provider.embed(list(queries))
+        q = _normalize_rows(np.atleast_2d(q).astype(np.float32, copy=False))
+        rows, ids, urls = self._active()
+        if len(rows) == 0 or k <= 0:
+            return [[] for _ in range(len(q))]
+        m = self.matrix()
+        k = min(k, len(rows))
+
+        best_scores = np.full((len(q), 0), -np.inf, dtype=np.float32)
+        best_pos = np.zeros((len(q), 0), dtype=np.int64)
+        for lo in range(0, len(rows), SEARCH_CHUNK_ROWS):
+            chunk_rows = rows[lo:lo + SEARCH_CHUNK_ROWS]
+            # активные строки почти всегда идут подряд - тогда это срез memmap без копирования
+            if chunk_rows[-1] - chunk_rows[0] == len(chunk_rows) - 1:
+                block = m[chunk_rows[0]:chunk_rows[-1] + 1]
+            else:
+                block = m[chunk_rows]
+            scores = q @ block.T
+            pos = np.arange(lo, lo + len(chunk_rows), dtype=np.int64)
+            # сливаем лучших из блока с лучшими из предыдущих
+            scores = np.concatenate([best_scores, scores], axis=1)
+            pos = np.concatenate([best_pos, np.broadcast_to(pos, (len(q), len(pos)))], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                pos = np.take_along_axis(pos, top, axis=1)
+            best_scores, best_pos = scores, pos
+
+        order = np.argsort(-best_scores, axis=1)
+        out = []
+        for i in range(len(q)):
+            out.append([
+                Hit(doc_id=ids[p], url=urls[p], score=round(float(best_scores[i, j]), 4))
+                for j, p in ((j, best_pos[i, j]) for j in order[i])
+            ])
+        return out
+
+    def compact(self) -> int:
+        """Переписывает файл векторов без неактивных строк. Возвращает число удалённых строк."""
+        rows, _, _ = self._active()
+        m = self.matrix()
+        removed = len(m) - len(rows)
+        if removed == 0:
+            return 0
+        tmp = self.vectors_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for lo in range(0, len(rows), SEARCH_CHUNK_ROWS):
+                f.write(np.ascontiguousarray(m[rows[lo:lo + SEARCH_CHUNK_ROWS]]).tobytes())
+        self._invalidate()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM rows WHERE active = 0")
+            conn.executemany("UPDATE rows SET row = ? WHERE row = ?", [(-1 - i, int(r)) for i, r in enumerate(rows)])
+            conn.execute("UPDATE rows SET row = -1 - row")
+            os.replace(tmp, self.vectors_path)
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._conn() as conn:
+            active, total = conn.execute("SELECT COALESCE(SUM(active), 0), COUNT(*) FROM rows").fetchone()
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        return {"active": active, "rows": total, "bytes": size, "dim": self.dim}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--provider", default=EMBED_PROVIDER, choices=sorted(PROVIDERS))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("add-cached", help="проиндексировать все резюме из кэша страниц (только изменившиеся)")
+    p_search = sub.add_parser("search", help="резюме из индекса, ближайшие к вакансии")
+    p_search.add_argument("vacancy_url")
+    p_search.add_argument("-k", type=int, default=20)
+    sub.add_parser("compact", help="убрать из файла векторов устаревшие строки")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+
+    index = EmbeddingIndex("cv", make_provider(args.provider))
+    if args.cmd == "add-cached":
+        started = time.perf_counter()
+        stats = index.add_docs(iter_cached_docs("cv"))
+        print(f"{stats} за {time.perf_counter() - started:.1f} с, в индексе {len(index)}")
+    elif args.cmd == "search":
+        vac = load_vac_doc(args.vacancy_url)
+        if vac is None:
+            print("Вакансию не удалось прочитать", file=sys.stderr)
+            return 1
+        started = time.perf_counter()
+        hits = index.search([doc_text(vac)], k=args.k)[0]
+        print(f"{len(hits)} из {len(index)} за {(time.perf_counter() - started) * 1000:.1f} мс")
+        for h in hits:
+            print(f"{h.score:.3f}  {h.url}")
+    elif args.cmd == "compact":
+        print(f"удалено строк: {index.compact()}")
+    else:
+        print(index.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
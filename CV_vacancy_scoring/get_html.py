@@ -1,15 +1,244 @@
+from __future__ import annotations
+
+import codecs
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Protocol, Tuple
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+import telemetry
 
 # for example
 #url = 'https://ekaterinburg.hh.ru/resume/b55635f000075c6ae900bfb7af6b7632343631?query=%D0%90%D0%BD%D0%B0%D0%BB%D0%B8%D1%82%D0%B8%D0%BA+%D0%B4%D0%B0%D0%BD%D0%BD%D1%8B%D1%85+%28Data+Analyst%29&searchRid=176919267493439f5b4f31a807cf3026&hhtmFrom=resume_search_result'
 
+#USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; rv:121.0) Gecko/20100101 Firefox/121.0'
+USER_AGENT = 'Chrome/121.0 DEIC-M2-Win7-INTQZ.DEI#415 (Windows NT 10.0.11621.0; rv:121.0) Gecko/20120301 Firefox/121.0'
+
+# urllib3 сам распаковывает br, если установлен пакет brotli; иначе просим только gzip/deflate
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Таймауты (секунды): на установку соединения и на чтение ответа
+CONNECT_TIMEOUT = float(os.environ.get("HH_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("HH_READ_TIMEOUT", "20"))
+
+# Повторы на 429/5xx и сетевых ошибках: экспоненциальная пауза с джиттером
+MAX_RETRIES = int(os.environ.get("HH_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 15.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Не больше N запросов в секунду на один хост (0 - без ограничения)
+RATE_LIMIT_PER_HOST = float(os.environ.get("HH_RATE_LIMIT_RPS", "5"))
+
+POOL_SIZE = int(os.environ.get("HH_POOL_SIZE", "32"))
+
+# Размер куска при потоковом чтении тела (байты после распаковки)
+STREAM_CHUNK = int(os.environ.get("HH_STREAM_CHUNK", "16384"))
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    text: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # True, если сервер ответил 304 на условный запрос: text пустой, нужно брать сохранённую копию
+    not_modified: bool = False
+    attempts: int = 1
+    # размер тела ответа после распаковки (байты); при потоковом чтении - сколько прочитано
+    size: int = 0
+    # потоковое чтение остановлено приёмником до конца тела
+    truncated: bool = False
+
+
+class StreamSink(Protocol):
+    """Приёмник тела ответа при потоковом чтении (см. hh_stream.PageCapture)."""
+
+    def push(self, text: str) -> bool:
+        """Очередной кусок текста; True - дальше можно не читать."""
+        ...
+
+    def finish(self) -> str:
+        """Итоговый текст, который попадёт в FetchResult.text."""
+        ...
+
+
+class HostRateLimiter:
+    """
+    Ограничение частоты запросов по хосту. Каждый вызов резервирует себе слот
+    времени под локом, а ждёт уже без лока - потоки не блокируют друг друга дольше нужного.
+    """
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    # keep-alive пул: соединения с hh.ru переиспользуются между запросами и потоками
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": ACCEPT_ENCODING,
+    })
+    return session
+
+
+_session = _make_session()
+_limiter = HostRateLimiter(RATE_LIMIT_PER_HOST)
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    # "full jitter": случайная пауза в пределах растущего окна
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def fetch(
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+    sink: Optional[Callable[[], StreamSink]] = None,
+) -> FetchResult:
+    """
+    GET через общий keep-alive пул с таймаутами, повторами на 429/5xx
+    и ограничением частоты по хосту.
+
+    etag / last_modified - валидаторы сохранённой копии: с ними запрос уходит условным
+    (If-None-Match / If-Modified-Since), и при 304 тело страницы не передаётся.
+    Сетевая ошибка после исчерпания повторов пробрасывается наружу.
+
+    sink - фабрика приёмника для потокового чтения: тело декодируется кусками по STREAM_CHUNK
+    и отдаётся приёмнику, как только тот ответил True, соединение закрывается, не дочитав ответ
+    (оно не вернётся в пул, зато остаток страницы не качается). В text - результат sink.finish().
+    На каждую попытку создаётся новый приёмник.
+    """
+    with telemetry.span("fetch", host=urlsplit(url).netloc.lower(), conditional=bool(etag or last_modified), stream=sink is not None) as sp:
+        result = _fetch(url, etag, last_modified, timeout, sink)
+        sp.update(
+            status=result.status,
+            attempts=result.attempts,
+            bytes=result.size,
+            not_modified=result.not_modified,
+            truncated=result.truncated,
+        )
+    return result
+
+
+def _read_stream(response: requests.Response, sink: StreamSink) -> Tuple[str, int, bool]:
+    """Тело ответа кусками в приёмник: (итоговый текст, прочитано байт, остановлено досрочно)."""
+    try:
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    size = 0
+    stopped = False
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK):
+            size += len(chunk)
+            if sink.push(decoder.decode(chunk)):
+                stopped = True
+                break
+        else:
+            sink.push(decoder.decode(b"", final=True))
+    finally:
+        response.close()
+    return sink.finish(), size, stopped
+
+
+def _fetch(
+    url: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    timeout: Tuple[float, float],
+    sink: Optional[Callable[[], StreamSink]] = None,
+) -> FetchResult:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    host = urlsplit(url).netloc.lower()
+    attempt = 0
+    while True:
+        _limiter.wait(host)
+        try:
+            response = _session.get(url, headers=headers, timeout=timeout, stream=sink is not None)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= MAX_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+            attempt += 1
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            delay = _backoff(attempt, response.headers.get("Retry-After"))
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        result = FetchResult(
+            url=url,
+            status=response.status_code,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            not_modified=response.status_code == 304,
+            attempts=attempt + 1,
+        )
+        if response.status_code == 200 and sink is not None:
+            try:
+                result.text, result.size, result.truncated = _read_stream(response, sink())
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                # обрыв посреди тела - повторяем запрос целиком с новым приёмником
+                if attempt >= MAX_RETRIES:
+                    raise
+                time.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+        elif response.status_code == 200:
+            result.text = response.text
+            result.size = len(response.content)
+        else:
+            response.close()
+        return result
+
+
 def get_html(url):
-    response = requests.get(
-                            url
-                            #,headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; rv:121.0) Gecko/20100101 Firefox/121.0'}
-                            ,headers={'User-Agent': 'Chrome/121.0 DEIC-M2-Win7-INTQZ.DEI#415 (Windows NT 10.0.11621.0; rv:121.0) Gecko/20120301 Firefox/121.0',}
-                            )
-    if response.status_code != 200:
+    response = fetch(url)
+    if response.status != 200:
         return
     return response.text
 
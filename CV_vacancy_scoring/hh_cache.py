@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# грузим библиотеки из соседних файлов
+from get_html import fetch
+import hh_models
+import hh_stream
+import telemetry
+from hh_models import Doc, Resume, Vacancy
+from parse_hh import parse_cv_doc, parse_vac_doc, render_cv, render_vac
+from sqlite_cache import CACHE_DIR, SQLiteCache
+
+# Общий файл кэша: SQLite сам разруливает доступ из нескольких сессий Streamlit и процессов
+CACHE_PATH = os.environ.get("HH_CACHE_PATH", os.path.join(CACHE_DIR, "hh_pages.sqlite"))
+
+# TTL по типу страницы (секунды): резюме обновляются чаще вакансий
+TTL_SECONDS: Dict[str, int] = {
+    "cv": int(os.environ.get("HH_CACHE_TTL_CV", str(6 * 3600))),
+    "vac": int(os.environ.get("HH_CACHE_TTL_VAC", str(24 * 3600))),
+}
+
+# Лимит размера кэша (html + результат парсинга), сверх него вытесняем давно не читанное
+MAX_BYTES = int(os.environ.get("HH_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Версия формата parsed (сериализованный Resume/Vacancy): при смене парсера или схемы
+# старые записи перепарсиваются из сохранённого html, без похода в сеть
+PARSE_VERSION = 2000 + hh_models.SCHEMA_VERSION
+
+# Потоковое скачивание (hh_stream.py): из тела на лету вырезаются нужные узлы и JSON-блоки,
+# чтение обрывается на подвале страницы (дальше нужного нет). В кэш кладётся HTML-скелет вместо страницы
+STREAM_PARSE = os.environ.get("HH_STREAM_PARSE", "0").lower() in ("1", "true", "yes")
+
+PARSERS: Dict[str, Callable[[str], Doc]] = {
+    "cv": parse_cv_doc,
+    "vac": parse_vac_doc,
+}
+
+RENDERERS: Dict[str, Callable[..., str]] = {
+    "cv": render_cv,
+    "vac": render_vac,
+}
+
+# Параметры, которые hh.ru навешивает на ссылки из поиска и которые не меняют содержимое страницы
+TRACKING_PARAMS = {
+    "searchrid",
+    "hhtmfrom",
+    "hhtmfromlabel",
+    "hhtmsource",
+    "query",
+    "_ga",
+    "yclid",
+    "gclid",
+}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Ключ кэша: схема и хост в нижнем регистре, без фрагмента, завершающего "/"
+    и трекинговых параметров (searchRid, hhtmFrom, query, utm_* ...),
+    оставшиеся параметры отсортированы.
+    """
+    parts = urlsplit(url.strip())
+    params = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), path, urlencode(sorted(params)), ""))
+
+
+@dataclass
+class CachedPage:
+    url: str
+    kind: str
+    html: str
+    parsed: Optional[str]
+    parse_version: int
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class PageCache(SQLiteCache):
+    """
+    SQLite-кэш страниц hh.ru: сырой html + результат парсинга по нормализованному URL.
+
+    - TTL задаётся отдельно для каждого kind ("cv", "vac"); протухшая запись не удаляется сразу,
+      а отдаётся через peek() для условного запроса (ETag / Last-Modified);
+    - при превышении max_bytes вытесняются записи, к которым дольше всего не обращались (LRU);
+    - счётчики попаданий/промахов хранятся в той же базе, т.е. общие для всех процессов
+      (имена "<kind>:hits", "<kind>:misses").
+    """
+
+    TABLE = "pages"
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: Optional[Dict[str, int]] = None,
+        max_bytes: int = MAX_BYTES,
+    ):
+        self.ttl = dict(TTL_SECONDS if ttl is None else ttl)
+        super().__init__(
+            path,
+            max_bytes,
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                html TEXT NOT NULL,
+                parsed TEXT,
+                parse_version INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+            """,
+        )
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        # базы, созданные до появления валидаторов
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(pages)")}
+        for column in ("etag", "last_modified"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE pages ADD COLUMN {column} TEXT")
+        # счётчики из отдельной таблицы stats(kind, hits, misses) переносим в общие counters
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'").fetchone():
+            conn.execute(
+                "INSERT OR IGNORE INTO counters(name, value) "
+                "SELECT kind || ':hits', hits FROM stats UNION ALL SELECT kind || ':misses', misses FROM stats"
+            )
+            conn.execute("DROP TABLE stats")
+
+    _COLUMNS = "url, kind, html, parsed, parse_version, fetched_at, etag, last_modified"
+
+    def get(self, url: str, kind: str) -> Optional[CachedPage]:
+        """Свежая запись или None (протухшая запись считается промахом)."""
+        key = normalize_url(url)
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM pages WHERE key = ? AND kind = ?",
+                (key, kind),
+            ).fetchone()
+            ttl = self.ttl.get(kind)
+            if row and ttl is not None and now - row[5] > ttl:
+                row = None
+            if not row:
+                self._count(conn, f"{kind}:misses")
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(conn, f"{kind}:hits")
+        return CachedPage(*row)
+
+    def peek(self, url: str, kind: str) -> Optional[CachedPage]:
+        """Запись без учёта TTL и без счётчиков - для ревалидации протухшей копии."""
+        with self._conn() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM pages WHERE key = ? AND kind = ?",
+                (normalize_url(url), kind),
+            ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def put(
+        self,
+        url: str,
+        kind: str,
+        html: str,
+        parsed: Optional[str],
+        parse_version: int = PARSE_VERSION,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        key = normalize_url(url)
+        now = time.time()
+        size = len(html.encode("utf-8")) + len((parsed or "").encode("utf-8"))
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages(key, kind, url, html, parsed, parse_version, size, fetched_at, accessed_at, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, url, html, parsed, parse_version, size, now, now, etag, last_modified),
+            )
+            self._evict(conn)
+
+    def refresh(self, url: str) -> None:
+        """Сервер подтвердил (304), что копия актуальна: продлеваем TTL."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, normalize_url(url)),
+            )
+
+    def update_parsed(self, url: str, parsed: str, parse_version: int = PARSE_VERSION) -> None:
+        key = normalize_url(url)
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE pages SET parsed = ?, parse_version = ?, size = length(CAST(html AS BLOB)) + ? WHERE key = ?",
+                (parsed, parse_version, len(parsed.encode("utf-8")), key),
+            )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """{kind: {"hits", "misses", "entries", "bytes"}}"""
+        out: Dict[str, Dict[str, int]] = {}
+        with self._conn() as conn:
+            for name, value in self._counters(conn).items():
+                kind, _, field = name.partition(":")
+                out.setdefault(kind, {"hits": 0, "misses": 0, "entries": 0, "bytes": 0})[field] = value
+            for kind, entries, size in conn.execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM pages GROUP BY kind"):
+                out.setdefault(kind, {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}).update(entries=entries, bytes=size)
+        return out
+
+    def iter_pages(self, kind: str, batch: int = 500) -> Iterator[CachedPage]:
+        """Все записи данного kind (включая протухшие), без счётчиков и без учёта LRU."""
+        last = ""
+        while True:
+            with self._conn() as conn:
+                rows = conn.execute(
+                    f"SELECT key, {self._COLUMNS} FROM pages WHERE kind = ? AND key > ? ORDER BY key LIMIT ?",
+                    (kind, last, batch),
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for row in rows:
+                yield CachedPage(*row[1:])
+
+
+_default_cache: Optional[PageCache] = None
+
+
+def default_cache() -> PageCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PageCache()
+    return _default_cache
+
+
+def _serialize(doc: Doc) -> str:
+    return hh_models.dumps(doc).decode("utf-8")
+
+
+def load_doc(
+    url: str,
+    kind: str,
+    cache: Optional[PageCache] = None,
+    parser: Optional[Callable[[str], Doc]] = None,
+    stream: Optional[bool] = None,
+) -> Optional[Doc]:
+    """
+    Скачивание + parse_cv_doc/parse_vac_doc через кэш. None, если страницу не удалось скачать.
+    В кэше лежит сериализованная структура: повторное чтение - это json.loads, без парсинга HTML.
+    Протухшая копия с ETag/Last-Modified ревалидируется условным запросом (304 - без тела).
+    Если в кэше лежит html от старой версии парсера, перепарсиваем его без сети.
+
+    parser - замена PARSERS[kind] (например, разбор в пуле процессов, см. score_cli.py).
+    stream - потоковое скачивание со скелетом страницы (по умолчанию HH_STREAM_PARSE).
+    """
+    cache = cache or default_cache()
+    parser = parser or PARSERS[kind]
+    stream = STREAM_PARSE if stream is None else stream
+    sink = (lambda: hh_stream.capture(kind)) if stream else None
+
+    # cache: hit - свежая запись, revalidated - сервер ответил 304, miss - страница скачана заново
+    with telemetry.span(f"load_{kind}", cache="hit") as sp:
+        page = cache.get(url, kind)
+        if page is None:
+            stale = cache.peek(url, kind)
+            if stale is not None and (stale.etag or stale.last_modified):
+                res = fetch(url, etag=stale.etag, last_modified=stale.last_modified, sink=sink)
+            else:
+                stale = None
+                res = fetch(url, sink=sink)
+
+            if res.not_modified and stale is not None:
+                cache.refresh(url)
+                page = stale
+                sp["cache"] = "revalidated"
+            elif res.status != 200 or not res.text:
+                sp["cache"] = "miss"
+                return None
+            else:
+                sp["cache"] = "miss"
+                doc = parser(res.text)
+                cache.put(url, kind, res.text, _serialize(doc), etag=res.etag, last_modified=res.last_modified)
+                return doc
+
+        if page.parsed is not None and page.parse_version == PARSE_VERSION:
+            return hh_models.loads(page.parsed)
+        # html от старой версии парсера
+        sp["reparsed"] = True
+        doc = parser(page.html)
+        cache.update_parsed(url, _serialize(doc))
+        return doc
+
+
+def iter_cached_docs(kind: str, cache: Optional[PageCache] = None) -> Iterator[Tuple[str, Doc]]:
+    """(url, структура) для всех уже скачанных страниц kind - без сети; старый формат перепарсивается."""
+    cache = cache or default_cache()
+    for page in cache.iter_pages(kind):
+        if page.parsed is not None and page.parse_version == PARSE_VERSION:
+            yield page.url, hh_models.loads(page.parsed)
+        else:
+            yield page.url, PARSERS[kind](page.html)
+
+
+def load_parsed(url: str, kind: str, cache: Optional[PageCache] = None) -> Optional[str]:
+    """Markdown-выжимка страницы (как parse_cv/parse_vac) через кэш."""
+    doc = load_doc(url, kind, cache)
+    return RENDERERS[kind](doc) if doc is not None else None
+
+
+def load_cv(url: str) -> Optional[str]:
+    return load_parsed(url, "cv")
+
+
+def load_vac(url: str) -> Optional[str]:
+    return load_parsed(url, "vac")
+
+
+def load_cv_doc(url: str) -> Optional[Resume]:
+    return load_doc(url, "cv")
+
+
+def load_vac_doc(url: str) -> Optional[Vacancy]:
+    return load_doc(url, "vac")
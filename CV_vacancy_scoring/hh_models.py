@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Type, TypeVar, Union
+
+# Структурированный результат parse_cv_doc / parse_vac_doc.
+# Markdown из него собирают render_cv / render_vac в parse_hh.py.
+
+# Версия схемы: меняется при несовместимом изменении полей
+SCHEMA_VERSION = 1
+
+
+@dataclass(slots=True)
+class ExperienceItem:
+    company: str = ""
+    position: str = ""
+    start: str = ""
+    end: str = ""
+    # текст описания без строк-маркеров
+    description: str = ""
+    # строки описания, начинавшиеся с "-"
+    bullets: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class EducationItem:
+    year: str = ""
+    organization: str = ""
+    result: str = ""
+    specialty: str = ""
+
+
+@dataclass(slots=True)
+class Resume:
+    resume_id: str = ""
+    url: str = ""
+    position: str = ""
+    address: str = ""
+    metro: str = ""
+    location: str = ""
+    about: str = ""
+    skills: List[str] = field(default_factory=list)
+    experience: List[ExperienceItem] = field(default_factory=list)
+    education: List[EducationItem] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Vacancy:
+    vacancy_id: str = ""
+    url: str = ""
+    title: str = ""
+    company: str = ""
+    salary: str = ""
+    location: str = ""
+    experience: str = ""
+    employment: str = ""
+    schedule: str = ""
+    published: str = ""
+    skills: List[str] = field(default_factory=list)
+    description: str = ""
+
+
+Doc = Union[Resume, Vacancy]
+T = TypeVar("T", ExperienceItem, EducationItem)
+
+_KINDS: Dict[str, Type[Any]] = {"cv": Resume, "vac": Vacancy}
+_NESTED: Dict[str, Type[Any]] = {"experience": ExperienceItem, "education": EducationItem}
+
+
+def _item_to_dict(obj: Any) -> Dict[str, Any]:
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+
+def to_dict(doc: Doc) -> Dict[str, Any]:
+    """Плоский dict из примитивов (вложенные элементы - списки dict)."""
+    out: Dict[str, Any] = {"kind": "cv" if isinstance(doc, Resume) else "vac", "v": SCHEMA_VERSION}
+    for name in doc.__slots__:
+        value = getattr(doc, name)
+        if name in _NESTED and isinstance(doc, Resume):
+            value = [_item_to_dict(x) for x in value]
+        out[name] = value
+    return out
+
+
+def _item_from_dict(cls: Type[T], data: Dict[str, Any]) -> T:
+    known = {f.name for f in fields(cls)}
+    return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def from_dict(data: Dict[str, Any]) -> Doc:
+    """Обратное к to_dict. Неизвестные поля (из более новой схемы) игнорируются."""
+    cls = _KINDS[data["kind"]]
+    known = {f.name for f in fields(cls)}
+    kwargs = {k: v for k, v in data.items() if k in known}
+    if cls is Resume:
+        for name, item_cls in _NESTED.items():
+            kwargs[name] = [_item_from_dict(item_cls, x) for x in kwargs.get(name) or []]
+    return cls(**kwargs)
+
+
+def dumps(doc: Doc, fmt: str = "json") -> bytes:
+    """Сериализация в компактный JSON (orjson, если установлен) или msgpack."""
+    data = to_dict(doc)
+    if fmt == "msgpack":
+        import msgpack
+
+        return msgpack.packb(data, use_bin_type=True)
+    if fmt != "json":
+        raise ValueError(f"Неизвестный формат {fmt!r}")
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(data)
+
+
+def loads(raw: Union[bytes, str], fmt: str = "json") -> Doc:
+    if fmt == "msgpack":
+        import msgpack
+
+        return from_dict(msgpack.unpackb(raw, raw=False))
+    if fmt != "json":
+        raise ValueError(f"Неизвестный формат {fmt!r}")
+    return from_dict(json.loads(raw))
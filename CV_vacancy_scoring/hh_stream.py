@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+# грузим библиотеки из соседних файлов
+from parse_hh import CV_JSON_MARKERS, CV_POSITION_MARKERS, _cut_balanced, _markers_re
+
+# Потоковый разбор страниц hh.ru.
+#
+# Тело ответа подаётся кусками в PageCapture.push(). По ходу чтения из него вырезается только то,
+# что нужно parse_cv_doc / parse_vac_doc: узлы с нужными data-qa (целиком, с вложенной разметкой),
+# title / meta / link и JSON-блоки по маркерам. Содержимое <script> / <style> до HTML-парсера
+# не доходит, в памяти держится только незавершённый хвост. Как только прочитано всё, что может
+# понадобиться parse_* (StreamSpec.done), push() возвращает True - соединение можно закрывать.
+#
+# finish() собирает из вырезанного маленький HTML-"скелет": parse_cv_doc / parse_vac_doc
+# дают на нём тот же результат, что и на полной странице, и он же кладётся в кэш страниц.
+# Узлы data-qa parse_* ищут по всей странице, а необязательные (метро, даты, график, теги навыков)
+# у hh.ru идут после описания, поэтому "всё нашлось" по самим узлам не определить. Концом
+# содержимого считается подвал страницы (StreamSpec.end_tags) или </body>: после него
+# нужных parse_* узлов нет, и дочитываются только ещё не пришедшие JSON-блоки резюме.
+# Подвал, скрипты в конце <body> и хвост после него не скачиваются.
+
+# Теги без закрывающего тега: в стек открытых узлов не попадают
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"))
+# Теги, которые parse_* ищут по всей странице, а не внутри data-qa узла
+HEAD_TAGS = frozenset(("title", "meta", "link"))
+
+_RAW_OPEN_RE = re.compile(r"<(script|style)\b[^>]*>", re.I)
+_RAW_CLOSE_RE = {tag: re.compile("</" + tag, re.I) for tag in ("script", "style")}
+
+
+@dataclass
+class StreamSpec:
+    """Что вырезать из страницы и когда можно перестать читать."""
+
+    # data-qa, у которых parse_* берут первый узел в документе
+    first_qa: FrozenSet[str]
+    # data-qa, у которых нужны все узлы (all_texts)
+    all_qa: FrozenSet[str] = frozenset()
+    # теги, у которых нужен первый узел (title, h1)
+    first_tags: FrozenSet[str] = frozenset()
+    # теги, у которых нужны все узлы (meta, link)
+    all_tags: FrozenSet[str] = frozenset(("meta", "link"))
+    # теги, с которых начинается хвост страницы после содержимого (подвал hh.ru)
+    end_tags: FrozenSet[str] = frozenset(("footer",))
+    # маркер встроенного JSON -> открывающая скобка блока (как в extract_json_blocks)
+    json_markers: Dict[str, str] = field(default_factory=dict)
+    # True, когда дальше в странице нет ничего нужного parse_*
+    done: Callable[["PageCapture"], bool] = lambda capture: False
+
+
+class _RawTextFilter:
+    """Выкидывает содержимое <script> / <style> из потока, сами теги оставляет."""
+
+    def __init__(self) -> None:
+        self.buf = ""
+        self.close_tag: Optional[str] = None
+
+    def feed(self, text: str) -> str:
+        buf = self.buf + text
+        out: List[str] = []
+        while True:
+            if self.close_tag is not None:
+                m = _RAW_CLOSE_RE[self.close_tag].search(buf)
+                if m is None:
+                    # закрывающий тег мог оборваться на границе куска
+                    buf = buf[-(len(self.close_tag) + 1):]
+                    break
+                buf = buf[m.start():]
+                self.close_tag = None
+            m = _RAW_OPEN_RE.search(buf)
+            if m is None:
+                # незакрытый "<..." в конце - возможно, начало <script, ждём следующий кусок
+                lt = buf.rfind("<")
+                if lt != -1 and buf.find(">", lt) == -1:
+                    out.append(buf[:lt])
+                    buf = buf[lt:]
+                else:
+                    out.append(buf)
+                    buf = ""
+                break
+            out.append(buf[: m.end()])
+            self.close_tag = m.group(1).lower()
+            buf = buf[m.end():]
+        self.buf = buf
+        return "".join(out)
+
+    def close(self) -> str:
+        rest = "" if self.close_tag is not None else self.buf
+        self.buf = ""
+        return rest
+
+
+class _JsonScanner:
+    """
+    Потоковый extract_json_blocks: маркеры ищутся по мере поступления текста, блок после маркера
+    вырезается, когда пришла его закрывающая скобка. Буфер держится только от начала
+    самого раннего незавершённого блока (или последних символов, где мог оборваться маркер).
+    """
+
+    def __init__(self, markers: Dict[str, str]):
+        self.markers = markers
+        # маркер -> (абсолютное начало маркера, абсолютный конец блока, текст от маркера до конца блока);
+        # None - блока нет (выясняется только в конце страницы)
+        self.found: Dict[str, Optional[Tuple[int, int, str]]] = {}
+        self._pending: List[Tuple[str, int]] = []
+        self._re = _markers_re(tuple(markers)) if markers else None
+        self._keep = max((len(mk) for mk in markers), default=1) - 1
+        self._buf = ""
+        self._base = 0
+        self._scan = 0
+
+    @property
+    def complete(self) -> bool:
+        return len(self.found) == len(self.markers)
+
+    def feed(self, text: str, final: bool = False) -> None:
+        if self.complete:
+            return
+        self._buf += text
+        buf, base = self._buf, self._base
+
+        if self._re is not None and len(self.found) + len(self._pending) < len(self.markers):
+            seen = {mk for mk, _ in self._pending}
+            # как finditer в extract_json_blocks: поиск продолжается с конца маркера, в том числе внутри блоков
+            for m in self._re.finditer(buf, self._scan - base):
+                self._scan = base + m.end()
+                mk = m.group()
+                if mk not in self.found and mk not in seen:
+                    seen.add(mk)
+                    self._pending.append((mk, base + m.start()))
+            if not final:
+                self._scan = max(self._scan, base + len(buf) - self._keep)
+
+        waiting: List[Tuple[str, int]] = []
+        for mk, start in self._pending:
+            open_char = self.markers[mk]
+            i = buf.find(open_char, start - base)
+            block = _cut_balanced(buf, i, open_char) if i != -1 else None
+            if block is not None:
+                end = i + len(block)
+                self.found[mk] = (start, base + end, buf[start - base : end])
+            elif final:
+                self.found[mk] = None
+            else:
+                waiting.append((mk, start))
+        self._pending = waiting
+
+        keep_from = min([start for _, start in waiting] + [self._scan])
+        self._buf = buf[keep_from - base :]
+        self._base = keep_from
+
+    def segments(self) -> List[str]:
+        """Вырезанные куски текста в порядке документа, пересекающиеся склеены."""
+        spans = sorted(v for v in self.found.values() if v is not None)
+        out: List[Tuple[int, int, str]] = []
+        for start, end, text in spans:
+            if out and start < out[-1][1]:
+                prev_start, prev_end, prev_text = out[-1]
+                if end > prev_end:
+                    out[-1] = (prev_start, end, prev_text + text[prev_end - start :])
+                continue
+            out.append((start, end, text))
+        return [text for _, _, text in out]
+
+
+class _DomCollector(HTMLParser):
+    """Собирает разметку нужных узлов (в исходном виде) по событиям html.parser."""
+
+    def __init__(self, spec: StreamSpec):
+        super().__init__(convert_charrefs=False)
+        self.spec = spec
+        self.head: List[str] = []
+        self.body: List[str] = []
+        # data-qa -> есть ли в узле непустой текст
+        self.qa: Dict[str, bool] = {}
+        self.tags: Set[str] = set()
+        # встретился подвал (spec.end_tags) или </body> вне захватываемого узла: дальше узлов для parse_* нет
+        self.content_ended = False
+        # открытые теги захватываемого узла: (тег, data-qa)
+        self._stack: Optional[List[Tuple[str, Optional[str]]]] = None
+        self._out = self.body
+
+    @property
+    def idle(self) -> bool:
+        """Сейчас не внутри захватываемого узла."""
+        return self._stack is None
+
+    def _emit(self, text: str) -> None:
+        self._out.append(text)
+
+    def _start(self, tag: str, attrs: List[Tuple[str, Optional[str]]], void: bool) -> None:
+        qa = next((v for k, v in attrs if k == "data-qa"), None)
+        raw = self.get_starttag_text() or ""
+        if self._stack is not None:
+            # вложенный узел захватывается вместе с родителем
+            self._emit(raw)
+            if qa is not None:
+                self.qa.setdefault(qa, False)
+            if tag in self.spec.first_tags:
+                self.tags.add(tag)
+            if not void:
+                self._stack.append((tag, qa))
+            return
+
+        if tag in self.spec.end_tags:
+            self.content_ended = True
+        if qa is not None and (qa in self.spec.all_qa or (qa in self.spec.first_qa and qa not in self.qa)):
+            self.qa.setdefault(qa, False)
+        elif tag in self.spec.all_tags or (tag in self.spec.first_tags and tag not in self.tags):
+            self.tags.add(tag)
+            qa = None
+        else:
+            return
+        self._out = self.head if tag in HEAD_TAGS else self.body
+        self._emit(raw)
+        if not void:
+            self._stack = [(tag, qa)]
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self._start(tag, attrs, tag in VOID_TAGS)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self._start(tag, attrs, True)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._stack is None:
+            if tag == "body":
+                self.content_ended = True
+            return
+        self._emit(f"</{tag}>")
+        # незакрытые вложенные теги закрываются вместе с родителем, как в браузере
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+        if not self._stack:
+            self._stack = None
+
+    def _text(self, text: str, filled: bool) -> None:
+        if self._stack is None:
+            return
+        self._emit(text)
+        if filled:
+            for _, qa in self._stack:
+                if qa is not None:
+                    self.qa[qa] = True
+
+    def handle_data(self, data: str) -> None:
+        self._text(data, bool(data.strip()))
+
+    def handle_entityref(self, name: str) -> None:
+        self._text(f"&{name};", name != "nbsp")
+
+    def handle_charref(self, name: str) -> None:
+        self._text(f"&#{name};", True)
+
+    def handle_comment(self, data: str) -> None:
+        if self._stack is not None:
+            self._emit(f"<!--{data}-->")
+
+
+class PageCapture:
+    """
+    Приёмник потокового ответа (см. get_html.fetch(sink=...)): push() кусков текста,
+    finish() - HTML-скелет для parse_cv_doc / parse_vac_doc.
+    """
+
+    def __init__(self, spec: StreamSpec):
+        self.spec = spec
+        self._dom = _DomCollector(spec)
+        self._raw = _RawTextFilter()
+        self.json = _JsonScanner(spec.json_markers)
+        self.done = False
+
+    def push(self, text: str) -> bool:
+        """Очередной кусок страницы. True - всё нужное вырезано, дальше можно не читать."""
+        if self.done:
+            return True
+        self.json.feed(text)
+        self._dom.feed(self._raw.feed(text))
+        # узел, который сейчас захватывается, дочитываем до конца - иначе его текст обрежется
+        self.done = self._dom.idle and self.spec.done(self)
+        return self.done
+
+    def finish(self) -> str:
+        if not self.done:
+            # страница дочитана до конца: незакрытые блоки так и не закрылись
+            self.json.feed("", final=True)
+            self._dom.feed(self._raw.close())
+            self._dom.close()
+        json_part = ""
+        segments = self.json.segments()
+        if segments:
+            json_part = '<script type="application/json">' + "\n".join(segments) + "</script>"
+        return (
+            "<!DOCTYPE html>\n<html><head>" + "".join(self._dom.head) + "</head><body>"
+            + "".join(self._dom.body) + json_part + "</body></html>\n"
+        )
+
+    # --- для StreamSpec.done ---
+    def content_ended(self) -> bool:
+        """Документ прочитан до подвала или </body>."""
+        return self._dom.content_ended
+
+    def seen(self, *qa: str) -> bool:
+        """Встретился хотя бы один из узлов."""
+        return any(q in self._dom.qa for q in qa)
+
+    def filled(self, qa: str) -> bool:
+        """Узел встретился и в нём есть текст."""
+        return self._dom.qa.get(qa, False)
+
+    def has_json(self, *markers: str) -> bool:
+        """Все блоки по маркерам вырезаны."""
+        return all(mk in self.json.found for mk in markers)
+
+
+_CV_BLOCKS = ('"advancedKeySkills":{"value":', '"experience":{"value":', '"education":{"value":')
+
+
+def _cv_done(c: PageCapture) -> bool:
+    # JSON состояния может лежать и после подвала;
+    # должность: из DOM, иначе нужны все запасные маркеры (берётся первый по приоритету)
+    return (
+        c.content_ended()
+        and c.has_json(*_CV_BLOCKS)
+        and (c.filled("resume-block-title-position") or c.has_json(*CV_POSITION_MARKERS))
+    )
+
+
+def _vac_done(c: PageCapture) -> bool:
+    # bloko-tag__text собираются со всего содержимого, необязательные узлы идут после описания
+    return c.content_ended()
+
+
+SPECS: Dict[str, StreamSpec] = {
+    "cv": StreamSpec(
+        first_qa=frozenset((
+            "resume-block-title-position",
+            "resume-personal-metro",
+            "resume-personal-address",
+            "resume-block-skills-content",
+        )),
+        json_markers=CV_JSON_MARKERS,
+        done=_cv_done,
+    ),
+    "vac": StreamSpec(
+        first_qa=frozenset((
+            "vacancy-title",
+            "vacancy-company-name",
+            "vacancy-company",
+            "vacancy-salary",
+            "vacancy-salary-compensation-type-net",
+            "vacancy-salary-compensation-type-gross",
+            "vacancy-experience",
+            "vacancy-employment-mode",
+            "vacancy-employment",
+            "vacancy-work-schedule",
+            "vacancy-schedule",
+            "vacancy-view-location",
+            "vacancy-view-raw-address",
+            "vacancy-view-metro",
+            "vacancy-creation-time",
+            "vacancy-publication-time",
+            "vacancy-description",
+            "vacancy-description-container",
+        )),
+        all_qa=frozenset(("bloko-tag__text", "vacancy-skill")),
+        first_tags=frozenset(("h1", "title")),
+        done=_vac_done,
+    ),
+}
+
+
+def capture(kind: str) -> PageCapture:
+    """Новый приёмник для страницы типа kind ("cv" / "vac")."""
+    return PageCapture(SPECS[kind])
+
+
+def skeleton(html: str, kind: str, chunk: int = 16384) -> Tuple[str, int]:
+    """
+    Скелет уже скачанной страницы, как если бы она читалась потоком кусками по chunk символов.
+    Возвращает (скелет, сколько символов пришлось прочитать).
+    """
+    c = capture(kind)
+    read = 0
+    for i in range(0, len(html), chunk):
+        read = min(len(html), i + chunk)
+        if c.push(html[i : i + chunk]):
+            break
+    return c.finish(), read
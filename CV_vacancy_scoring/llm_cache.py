@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# грузим библиотеки из соседних файлов
+from sqlite_cache import CACHE_DIR, SQLiteCache
+
+# Лежит рядом с кэшем страниц hh.ru
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_responses.sqlite"))
+
+# TTL ответа (секунды), 0 - без срока
+TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL", "0"))
+# Лимит на размер ответов в базе (МБ), сверх него вытесняем давно не читанное
+MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+
+def make_key(model: str, messages: Any, **params: Any) -> str:
+    """sha256 от канонического JSON всех входов, влияющих на ответ (модель, промпты, параметры)."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    content: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    created_at: float
+    hits: int
+
+
+class LLMCache(SQLiteCache):
+    """
+    Дисковый кэш ответов LLM по хэшу входов. Имеет смысл для детерминированных
+    вызовов (temperature=0). В каждой записи хранится расход токенов, поэтому
+    stats() показывает, сколько токенов сэкономили повторные обращения.
+    """
+
+    TABLE = "responses"
+
+    def __init__(self, path: str = CACHE_PATH, ttl: int = TTL_SECONDS, max_bytes: int = MAX_BYTES):
+        self.ttl = ttl
+        super().__init__(
+            path,
+            max_bytes,
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at);
+            """,
+        )
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        # базы из версий без лимита по байтам: добавляем колонку и досчитываем размеры
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+        if "size" not in columns:
+            conn.execute("ALTER TABLE responses ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE responses SET size = length(CAST(content AS BLOB))")
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT content, model, prompt_tokens, completion_tokens, created_at, hits FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row and self.ttl and now - row[4] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if not row:
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+        return CachedResponse(*row[:5], hits=row[5] + 1)
+
+    def put(self, key: str, model: str, content: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO responses(key, model, content, prompt_tokens, completion_tokens, size, created_at, accessed_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0) "
+                # перезапись в обход кэша обновляет ответ, но не сбрасывает накопленные попадания
+                "ON CONFLICT(key) DO UPDATE SET content = excluded.content, prompt_tokens = excluded.prompt_tokens, "
+                "completion_tokens = excluded.completion_tokens, size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, model, content, prompt_tokens, completion_tokens, size, now, now),
+            )
+            self._evict(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """Попадания/промахи, число записей и их размер, сэкономленные повторными обращениями токены."""
+        with self._conn() as conn:
+            counters = self._counters(conn)
+            entries, size, saved_prompt, saved_completion = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits * prompt_tokens), 0), "
+                "COALESCE(SUM(hits * completion_tokens), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": entries,
+            "bytes": size,
+            "saved_prompt_tokens": saved_prompt,
+            "saved_completion_tokens": saved_completion,
+        }
+
+
+_default_cache: Optional[LLMCache] = None
+
+
+def default_cache() -> LLMCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LLMCache()
+    return _default_cache
@@ -0,0 +1,278 @@
+"""
+Оценка больших объёмов через OpenAI Batch API (дешевле и без лимитов на частоту запросов,
+результат - в течение суток).
+
+    python openai_batch.py export pairs.csv -d batch/      # страницы -> промпты -> batch/requests-001.jsonl ...
+    python openai_batch.py submit -d batch/                # загрузка файлов и запуск пакетов
+    python openai_batch.py download -d batch/              # статус; готовые результаты -> batch/results-*.jsonl
+    python openai_batch.py import -d batch/ -o results.jsonl
+
+Вход и выход - как у score_cli.py: CSV/JSONL пар (vacancy_url, cv_url) и JSONL результатов
+того же формата (с той же логикой контрольной точки). По умолчанию запросы структурированные
+(JSON по SCORE_SCHEMA). Импортированные ответы попадают и в кэш ответов LLM, так что
+интерактивная оценка тех же пар потом берёт их из кэша.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# грузим библиотеки из соседних файлов
+from hh_models import Resume, Vacancy
+from llm_cache import default_cache as llm_cache, make_key
+from score_cli import DocLoader, Pair, PairResult, open_output, pair_key, read_checkpoint, read_pairs, set_answer
+from scoring import DEFAULT_MAX_HTTP, LLM_MODEL, PROMPT_COMPACTION, build_prompt, chat_request, client, scoring_prompt
+
+ENDPOINT = "/v1/chat/completions"
+# Лимиты одного файла Batch API: 50 000 запросов и 200 МБ (берём с запасом)
+MAX_REQUESTS_PER_FILE = 50_000
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024
+
+MANIFEST = "manifest.jsonl"
+BATCHES = "batches.json"
+
+
+@dataclass
+class ManifestRow:
+    custom_id: str
+    vacancy_url: str
+    cv_url: str
+    position: str = ""
+    tokens_before: Optional[int] = None
+    tokens_after: Optional[int] = None
+    # ключ кэша ответов LLM для этого запроса
+    key: str = ""
+    # страница не прочиталась - запроса в пакете нет, при импорте будет строка с ошибкой
+    error: str = ""
+
+
+def _custom_id(vacancy_url: str, cv_url: str) -> str:
+    return "cv-" + make_key("pair", list(pair_key(vacancy_url, cv_url)))[:32]
+
+
+def _prepare(loader: DocLoader, vac_url: str, cv_url: str, structured: bool, compact: bool) -> Tuple[ManifestRow, Optional[Dict[str, Any]]]:
+    row = ManifestRow(custom_id=_custom_id(vac_url, cv_url), vacancy_url=vac_url, cv_url=cv_url)
+    try:
+        vac_doc = loader.get(vac_url, "vac")
+        if not isinstance(vac_doc, Vacancy):
+            raise ValueError("Вакансию не удалось прочитать")
+        cv_doc = loader.get(cv_url, "cv")
+        if not isinstance(cv_doc, Resume):
+            raise ValueError("Резюме не удалось прочитать")
+    except Exception as e:
+        row.error = f"{type(e).__name__}: {e}"
+        return row, None
+    row.position = cv_doc.position or "Кандидат"
+    user_prompt, report = build_prompt(vac_doc, cv_doc, compact=compact)
+    if report is not None:
+        row.tokens_before, row.tokens_after = report.original_tokens, report.compacted_tokens
+    messages, params = chat_request(scoring_prompt, user_prompt, structured)
+    row.key = make_key(LLM_MODEL, messages, **params)
+    request = {
+        "custom_id": row.custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {"model": LLM_MODEL, "messages": messages, **params},
+    }
+    return row, request
+
+
+def export_batch(
+    pairs: List[Pair],
+    out_dir: str,
+    structured: bool = True,
+    compact: bool = PROMPT_COMPACTION,
+    max_http: int = DEFAULT_MAX_HTTP,
+    parse_workers: Optional[int] = None,
+) -> List[str]:
+    """Файлы запросов Batch API (по лимитам на файл) и manifest.jsonl для обратного сопоставления."""
+    os.makedirs(out_dir, exist_ok=True)
+    parse_pool = ProcessPoolExecutor(max_workers=parse_workers or None) if parse_workers != 0 else None
+    loader = DocLoader(parse_pool, threading.Semaphore(max(1, max_http)))
+    files: List[str] = []
+    out = None
+    count = size = 0
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as manifest, \
+                ThreadPoolExecutor(max_workers=max(1, max_http), thread_name_prefix="batch-export") as pool:
+            # map сохраняет порядок пар, страницы при этом грузятся параллельно
+            for row, request in pool.map(lambda p: _prepare(loader, p[0], p[1], structured, compact), pairs):
+                manifest.write(json.dumps(asdict(row), ensure_ascii=False) + "\n")
+                if request is None:
+                    continue
+                line = (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+                if out is None or count >= MAX_REQUESTS_PER_FILE or size + len(line) > MAX_BYTES_PER_FILE:
+                    if out is not None:
+                        out.close()
+                    files.append(os.path.join(out_dir, f"requests-{len(files) + 1:03d}.jsonl"))
+                    out = open(files[-1], "wb")
+                    count = size = 0
+                out.write(line)
+                count += 1
+                size += len(line)
+    finally:
+        if out is not None:
+            out.close()
+        if parse_pool is not None:
+            parse_pool.shutdown()
+    return files
+
+
+def submit_batch(out_dir: str, completion_window: str = "24h") -> List[str]:
+    """Загружает requests-*.jsonl и создаёт по пакету на файл; id пакетов - в batches.json."""
+    ids = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "requests-*.jsonl"))):
+        with open(path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=ENDPOINT,
+            completion_window=completion_window,
+            metadata={"source": os.path.basename(path)},
+        )
+        ids.append(batch.id)
+    with open(os.path.join(out_dir, BATCHES), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    return ids
+
+
+def download_results(out_dir: str) -> Dict[str, str]:
+    """Статусы пакетов; у завершённых скачивает results-<id>.jsonl / errors-<id>.jsonl."""
+    with open(os.path.join(out_dir, BATCHES), encoding="utf-8") as f:
+        ids = json.load(f)
+    statuses = {}
+    for batch_id in ids:
+        batch = client.batches.retrieve(batch_id)
+        statuses[batch_id] = batch.status
+        for prefix, file_id in (("results", batch.output_file_id), ("errors", batch.error_file_id)):
+            path = os.path.join(out_dir, f"{prefix}-{batch_id}.jsonl")
+            if file_id and not os.path.exists(path):
+                client.files.content(file_id).write_to_file(path)
+    return statuses
+
+
+def read_manifest(out_dir: str) -> Dict[str, ManifestRow]:
+    with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+        return {row.custom_id: row for row in (ManifestRow(**json.loads(line)) for line in f if line.strip())}
+
+
+def import_results(out_dir: str, cache: bool = True) -> Iterator[PairResult]:
+    """
+    Результаты пакетов в формате score_cli (PairResult). Пары без ответа в файлах
+    результатов (пакет ещё идёт или истёк) не возвращаются - их можно доотправить.
+    """
+    manifest = read_manifest(out_dir)
+    for row in manifest.values():
+        if row.error:
+            yield PairResult(vacancy_url=row.vacancy_url, cv_url=row.cv_url, error=row.error, finished_at=time.time())
+
+    paths = sorted(glob.glob(os.path.join(out_dir, "results-*.jsonl")) + glob.glob(os.path.join(out_dir, "errors-*.jsonl")))
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                row = manifest.get(item.get("custom_id", ""))
+                if row is None:
+                    continue
+                res = PairResult(
+                    vacancy_url=row.vacancy_url,
+                    cv_url=row.cv_url,
+                    position=row.position,
+                    tokens_before=row.tokens_before,
+                    tokens_after=row.tokens_after,
+                    finished_at=time.time(),
+                )
+                response = item.get("response") or {}
+                body = response.get("body") or {}
+                if item.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+                    err = item.get("error") or body.get("error") or {}
+                    res.error = f"Batch API {response.get('status_code', '')}: {err.get('message', err) if isinstance(err, dict) else err}"
+                    yield res
+                    continue
+                content = (body["choices"][0]["message"].get("content") or "").strip()
+                set_answer(res, content)
+                # пустой ответ не кэшируем: иначе он отдавался бы как попадание в кэш
+                if cache and row.key and content:
+                    usage = body.get("usage") or {}
+                    llm_cache().put(
+                        row.key,
+                        body.get("model", LLM_MODEL),
+                        content,
+                        prompt_tokens=usage.get("prompt_tokens", 0),
+                        completion_tokens=usage.get("completion_tokens", 0),
+                    )
+                yield res
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_export = sub.add_parser("export", help="страницы -> файлы запросов Batch API")
+    p_export.add_argument("input", help="CSV (vacancy_url, cv_url) или JSONL с такими ключами")
+    p_export.add_argument("-d", "--dir", required=True)
+    p_export.add_argument("--skip-done", help="JSONL результатов score_cli: уже оценённые пары не экспортируются")
+    p_export.add_argument("--free-text", action="store_true", help="ответ свободным текстом, а не JSON по схеме")
+    p_export.add_argument("--compact", action=argparse.BooleanOptionalAction, default=PROMPT_COMPACTION)
+    p_export.add_argument("--max-http", type=int, default=DEFAULT_MAX_HTTP)
+    p_export.add_argument("--parse-workers", type=int, default=None)
+
+    p_submit = sub.add_parser("submit", help="загрузить файлы и создать пакеты")
+    p_submit.add_argument("-d", "--dir", required=True)
+
+    p_download = sub.add_parser("download", help="статус пакетов и скачивание готовых результатов")
+    p_download.add_argument("-d", "--dir", required=True)
+
+    p_import = sub.add_parser("import", help="результаты пакетов -> JSONL в формате score_cli")
+    p_import.add_argument("-d", "--dir", required=True)
+    p_import.add_argument("-o", "--output", required=True)
+    p_import.add_argument("--no-cache", action="store_true", help="не класть ответы в кэш ответов LLM")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        done = read_checkpoint(args.skip_done) if args.skip_done else set()
+        todo = list({pair_key(v, c): (v, c) for v, c in read_pairs(args.input) if pair_key(v, c) not in done}.values())
+        files = export_batch(
+            todo, args.dir, structured=not args.free_text, compact=args.compact,
+            max_http=args.max_http, parse_workers=args.parse_workers,
+        )
+        print(f"пар: {len(todo)}, файлов запросов: {len(files)} ({args.dir})", file=sys.stderr)
+    elif args.cmd == "submit":
+        for batch_id in submit_batch(args.dir):
+            print(batch_id)
+    elif args.cmd == "download":
+        for batch_id, status in download_results(args.dir).items():
+            print(f"{batch_id}: {status}")
+    else:
+        done = read_checkpoint(args.output)
+        # пары, для которых в файле уже есть только строка с ошибкой: повторный импорт
+        # не дописывает ту же ошибку ещё раз, но ответ, пришедший позже, запишет
+        failed = read_checkpoint(args.output, retry_errors=False) - done
+        written = 0
+        with open_output(args.output) as out:
+            for res in import_results(args.dir, cache=not args.no_cache):
+                key = pair_key(res.vacancy_url, res.cv_url)
+                if key in done or (res.error and key in failed):
+                    continue
+                if res.error:
+                    failed.add(key)
+                else:
+                    done.add(key)
+                out.write(json.dumps(asdict(res), ensure_ascii=False) + "\n")
+                written += 1
+        print(f"импортировано: {written} ({args.output})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,379 @@
 from __future__ import annotations
 
 import json
+import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from bs4 import BeautifulSoup
 
-def parse_cv(html: str) -> str:
+import telemetry
+from hh_models import EducationItem, ExperienceItem, Resume, Vacancy
+
+
+# ---------------------------------------------------------------------------
+# Встроенный JSON в страницах hh.ru
+# ---------------------------------------------------------------------------
+
+# Маркеры "title" / "desiredPosition" / "position" — запасные источники должности
+CV_POSITION_MARKERS = ('"title":{"value":', '"desiredPosition":{"value":', '"position":{"value":')
+
+# маркер -> открывающая скобка блока, который надо вырезать после него
+CV_JSON_MARKERS: Dict[str, str] = {
+    '"advancedKeySkills":{"value":': "[",
+    '"experience":{"value":': "[",
+    '"education":{"value":': "[",
+    **{mk: "{" for mk in CV_POSITION_MARKERS},
+}
+
+# Токены для подсчёта вложенности: строка JSON целиком (с escape-последовательностями,
+# возможно незакрытая) или скобка нужного типа. Всё остальное regex пропускает на скорости C.
+_STR_TOKEN = r'"[^"\\]*(?:\\.[^"\\]*)*"?'
+_BLOCK_TOKENS = {
+    "[": re.compile(_STR_TOKEN + r"|[\[\]]", re.S),
+    "{": re.compile(_STR_TOKEN + r"|[{}]", re.S),
+}
+
+
+@lru_cache(maxsize=32)
+def _markers_re(markers: Tuple[str, ...]) -> "re.Pattern[str]":
+    return re.compile("|".join(re.escape(m) for m in markers))
+
+
+def _cut_balanced(text: str, start: int, open_char: str) -> Optional[str]:
+    """Вырезает сбалансированный блок, начинающийся с open_char в позиции start."""
+    depth = 0
+    for m in _BLOCK_TOKENS[open_char].finditer(text, start):
+        tok = m.group()
+        if tok == open_char:
+            depth += 1
+        elif tok[0] != '"':
+            depth -= 1
+            if depth == 0:
+                return text[start : m.end()]
+    return None
+
+
+def extract_json_blocks(text: str, markers: Dict[str, str]) -> Dict[str, Optional[str]]:
     """
-    Парсит HTML страницы резюме (формат hh.ru) и возвращает Markdown-выжимку по кандидату.
+    Находит первое вхождение каждого маркера и вырезает сбалансированный JSON-блок,
+    начинающийся с первой открывающей скобки после начала маркера
+    (строки и escape-последовательности учитываются).
+
+    Все маркеры ищутся одним скомпилированным regex за один проход по тексту,
+    блок вырезается сразу, как только найден его маркер.
+    Возвращает {marker: block_or_None} для всех переданных маркеров.
+    """
+    found: Dict[str, Optional[str]] = {mk: None for mk in markers}
+    pending = set(markers)
+    if not pending:
+        return found
+
+    for m in _markers_re(tuple(markers)).finditer(text):
+        mk = m.group()
+        if mk not in pending:
+            continue
+        pending.discard(mk)
+
+        open_char = markers[mk]
+        i = text.find(open_char, m.start())
+        if i != -1:
+            found[mk] = _cut_balanced(text, i, open_char)
+        if not pending:
+            break
+    return found
+
+
+def extract_json_values(text: str, markers: Dict[str, str]) -> Dict[str, Any]:
+    """То же, что extract_json_blocks, но сразу возвращает распарсенные объекты (или None)."""
+    out: Dict[str, Any] = {}
+    for mk, block in extract_json_blocks(text, markers).items():
+        if not block:
+            out[mk] = None
+            continue
+        try:
+            out[mk] = json.loads(block)
+        except Exception:
+            out[mk] = None
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Движки разбора HTML
+# ---------------------------------------------------------------------------
+#
+# "html.parser" / "lxml" / "html5lib" - дерево BeautifulSoup с соответствующим билдером,
+# "selectolax" - C-парсер lexbor (pip install selectolax), дерево в разы легче.
+#
+# targeted=True: вместо отдельного обхода дерева на каждый select_one строим за один проход
+# индекс data-qa -> узлы (плюс h1/title/meta/link) и отвечаем на все запросы из него.
+# Поддерживаются только селекторы, которые используют парсеры ниже:
+# '[data-qa="x"]', '[data-qa="x"] tag', '[data-qa="x"] [data-qa="y"]', 'tag' и их перечисления через запятую.
+# selectolax работает только в targeted-режиме.
+
+PARSER_ENGINE = os.environ.get("HH_PARSER_ENGINE", "html.parser")
+PARSER_TARGETED = os.environ.get("HH_PARSER_TARGETED", "0").lower() in ("1", "true", "yes")
+
+SOUP_ENGINES = ("html.parser", "lxml", "html5lib")
+ENGINES = SOUP_ENGINES + ("selectolax",)
+
+# Теги, строки внутри которых BeautifulSoup не включает в get_text() родителя
+_STRING_CONTAINERS = frozenset(("script", "style", "template", "rt", "rp"))
+# Теги, которые ищутся на верхнем уровне (не внутри data-qa узла)
+_INDEXED_TAGS = frozenset(("h1", "title", "meta", "link"))
+
+_QA_RE = re.compile(r'\[data-qa="([^"]+)"\]')
+_SIMPLE_SEL_RE = re.compile(r'^(?:\[data-qa="([^"]+)"\](?:\s+(\[data-qa="[^"]+"\]|[a-z][a-z0-9]*))?|([a-z][a-z0-9]*))$')
+
+
+class _Page(ABC):
+    """Минимальный интерфейс к разобранной странице, который нужен parse_cv / parse_vac."""
+
+    @abstractmethod
+    def first_text(self, css: str, sep: str = " ") -> Optional[str]:
+        """get_text(sep, strip=True) первого совпадения или None, если узла нет."""
+        ...
+
+    @abstractmethod
+    def all_texts(self, css: str, sep: str = " ") -> List[str]:
+        ...
+
+    @abstractmethod
+    def meta_content(self, attr: str, value: str) -> Optional[str]:
+        """content первого <meta {attr}="{value}">."""
+        ...
+
+    @abstractmethod
+    def link_href(self, rel: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def title_text(self) -> Optional[str]:
+        ...
+
+
+class _SoupPage(_Page):
+    """Полное дерево BeautifulSoup, каждый запрос - отдельный select_one/find (исходное поведение)."""
+
+    def __init__(self, html: str, features: str = "html.parser"):
+        self.soup = BeautifulSoup(html, features)
+
+    def first_text(self, css: str, sep: str = " ") -> Optional[str]:
+        el = self.soup.select_one(css)
+        return el.get_text(sep, strip=True) if el else None
+
+    def all_texts(self, css: str, sep: str = " ") -> List[str]:
+        return [el.get_text(sep, strip=True) for el in self.soup.select(css)]
+
+    def meta_content(self, attr: str, value: str) -> Optional[str]:
+        tag = self.soup.find("meta", attrs={attr: value})
+        return tag.get("content") if tag else None
+
+    def link_href(self, rel: str) -> Optional[str]:
+        link = self.soup.find("link", attrs={"rel": rel})
+        return link.get("href") if link else None
+
+    def title_text(self) -> Optional[str]:
+        return self.soup.title.get_text(" ", strip=True) if self.soup.title else None
+
+
+class _IndexedPage(_Page):
+    """
+    Общая часть targeted-режима: индекс строится одним обходом дерева,
+    запросы разбираются в (data-qa, вложенный селектор) и отвечаются из индекса.
+    Узлы хранятся в порядке документа, поэтому семантика "первый в документе" сохраняется.
+    """
+
+    def __init__(self) -> None:
+        self.by_qa: Dict[str, List[Any]] = {}
+        self.by_tag: Dict[str, List[Any]] = {}
+        self.order: Dict[int, int] = {}
+
+    # --- то, что реализует конкретный движок ---
+    @abstractmethod
+    def _node_id(self, node: Any) -> int:
+        ...
+
+    @abstractmethod
+    def _attr(self, node: Any, name: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _descendants(self, node: Any, tag: str) -> Iterator[Any]:
+        ...
+
+    @abstractmethod
+    def _has_ancestor(self, node: Any, ids: Set[int]) -> bool:
+        ...
+
+    @abstractmethod
+    def _text(self, node: Any, sep: str) -> str:
+        ...
+
+    # --- индекс ---
+    def _add(self, node: Any, tag: str, qa: Optional[str]) -> None:
+        if qa is not None:
+            self.by_qa.setdefault(qa, []).append(node)
+            self.order[self._node_id(node)] = len(self.order)
+        if tag in _INDEXED_TAGS:
+            self.by_tag.setdefault(tag, []).append(node)
+
+    def _match(self, css: str, first: bool) -> List[Any]:
+        found: List[Any] = []
+        for part in css.split(","):
+            m = _SIMPLE_SEL_RE.match(part.strip())
+            if not m:
+                raise ValueError(f"targeted-режим не поддерживает селектор {part.strip()!r}")
+            qa, sub, tag = m.groups()
+            if tag:
+                nodes = self.by_tag.get(tag, []) if tag in _INDEXED_TAGS else []
+                found.extend(nodes[:1] if first else nodes)
+            elif not sub:
+                found.extend(self.by_qa.get(qa, []))
+            elif sub.startswith("["):
+                # '[data-qa="x"] [data-qa="y"]' - узлы y, у которых есть предок x
+                outer = {self._node_id(n) for n in self.by_qa.get(qa, [])}
+                inner_qa = _QA_RE.match(sub).group(1)
+                found.extend(n for n in self.by_qa.get(inner_qa, []) if self._has_ancestor(n, outer))
+            else:
+                for n in self.by_qa.get(qa, []):
+                    for d in self._descendants(n, sub):
+                        found.append(d)
+                        if first:
+                            break
+                    if first and found:
+                        break
+
+        if css.count(",") and len(found) > 1:
+            # объединение селекторов: порядок документа, без дублей
+            uniq = {self._node_id(n): n for n in found}
+            found = sorted(uniq.values(), key=lambda n: self.order.get(self._node_id(n), 0))
+        return found
+
+    def first_text(self, css: str, sep: str = " ") -> Optional[str]:
+        nodes = self._match(css, first=True)
+        return self._text(nodes[0], sep) if nodes else None
+
+    def all_texts(self, css: str, sep: str = " ") -> List[str]:
+        return [self._text(n, sep) for n in self._match(css, first=False)]
+
+    def meta_content(self, attr: str, value: str) -> Optional[str]:
+        for node in self.by_tag.get("meta", []):
+            if self._attr(node, attr) == value:
+                return self._attr(node, "content")
+        return None
+
+    def link_href(self, rel: str) -> Optional[str]:
+        for node in self.by_tag.get("link", []):
+            if rel in (self._attr(node, "rel") or "").split():
+                return self._attr(node, "href")
+        return None
+
+    def title_text(self) -> Optional[str]:
+        titles = self.by_tag.get("title")
+        return self._text(titles[0], " ") if titles else None
+
+
+class _IndexedSoupPage(_IndexedPage):
+    def __init__(self, html: str, features: str = "html.parser"):
+        super().__init__()
+        soup = BeautifulSoup(html, features)
+        for el in soup.find_all(True):
+            self._add(el, el.name, el.get("data-qa"))
+
+    def _node_id(self, node: Any) -> int:
+        return id(node)
+
+    def _attr(self, node: Any, name: str) -> Optional[str]:
+        v = node.get(name)
+        return " ".join(v) if isinstance(v, list) else v
+
+    def _descendants(self, node: Any, tag: str) -> Iterator[Any]:
+        return iter(node.find_all(tag))
 
+    def _has_ancestor(self, node: Any, ids: Set[int]) -> bool:
+        return any(id(p) in ids for p in node.parents)
+
+    def _text(self, node: Any, sep: str) -> str:
+        return node.get_text(sep, strip=True)
+
+
+class _SelectolaxPage(_IndexedPage):
+    def __init__(self, html: str):
+        from selectolax.lexbor import LexborHTMLParser
+
+        super().__init__()
+        tree = LexborHTMLParser(html)
+        for node in tree.root.traverse() if tree.root else ():
+            self._add(node, node.tag, node.attributes.get("data-qa"))
+
+    def _node_id(self, node: Any) -> int:
+        return node.mem_id
+
+    def _attr(self, node: Any, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+    def _descendants(self, node: Any, tag: str) -> Iterator[Any]:
+        root_id = node.mem_id
+        return (n for n in node.traverse() if n.tag == tag and n.mem_id != root_id)
+
+    def _has_ancestor(self, node: Any, ids: Set[int]) -> bool:
+        p = node.parent
+        while p is not None:
+            if p.mem_id in ids:
+                return True
+            p = p.parent
+        return False
+
+    def _text(self, node: Any, sep: str) -> str:
+        # как BeautifulSoup.get_text(sep, strip=True): строки без комментариев и без содержимого
+        # script/style/..., если сам узел не такой контейнер
+        root_id = node.mem_id
+        own = node.tag if node.tag in _STRING_CONTAINERS else None
+        parts: List[str] = []
+        for n in node.traverse(include_text=True):
+            if n.tag != "-text":
+                continue
+            container = None
+            p = n.parent
+            while p is not None:
+                if p.tag in _STRING_CONTAINERS:
+                    container = p.tag
+                    break
+                if p.mem_id == root_id:
+                    break
+                p = p.parent
+            if container != own:
+                continue
+            t = (n.text(deep=False) or "").strip()
+            if t:
+                parts.append(t)
+        return sep.join(parts)
+
+
+def make_page(html: str, engine: Optional[str] = None, targeted: Optional[bool] = None) -> _Page:
+    engine = engine or PARSER_ENGINE
+    targeted = PARSER_TARGETED if targeted is None else targeted
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок парсинга {engine!r}, доступны: {', '.join(ENGINES)}")
+    if engine == "selectolax":
+        return _SelectolaxPage(html)
+    if targeted:
+        return _IndexedSoupPage(html, engine)
+    return _SoupPage(html, engine)
+
+
+@telemetry.traced("parse_cv")
+def parse_cv_doc(html: str, engine: Optional[str] = None, targeted: Optional[bool] = None) -> Resume:
     """
+    Парсит HTML страницы резюме (формат hh.ru) в структуру Resume.
 
-    soup = BeautifulSoup(html, "html.parser")
+    engine / targeted - движок разбора HTML (см. make_page), по умолчанию из env.
+    """
+
+    with telemetry.span("parse_cv.dom", bytes=len(html), engine=engine or PARSER_ENGINE):
+        page = make_page(html, engine, targeted)
 
     def clean(text: Optional[str]) -> str:
         if not text:
@@ -19,8 +381,7 @@ def parse_cv(html: str) -> str:
         return re.sub(r"\s+", " ", text).strip()
 
     def sel_text(css: str) -> str:
-        el = soup.select_one(css)
-        return clean(el.get_text(" ", strip=True) if el else "")
+        return clean(page.first_text(css))
 
     # --- 1) Достаём то, что обычно стабильно лежит в DOM по data-qa ---
     position = sel_text('[data-qa="resume-block-title-position"]')
@@ -38,166 +399,136 @@ def parse_cv(html: str) -> str:
     # --- 2) Достаём структурированные данные из встроенного JSON в HTML ---
     # В hh-страницах часто есть крупный JSON-объект/кусок со словами:
     # "advancedKeySkills": {"value":[...]} , "experience": {"value":[...]} и т.д.
-    def extract_balanced_json_after_marker(
-        text: str, marker: str, open_char: str, close_char: str
-    ) -> Optional[str]:
-        """
-        Находит marker, затем первый open_char после него и вырезает сбалансированный JSON-блок,
-        учитывая строки и escape-последовательности.
-        """
-        i = text.find(marker)
-        if i == -1:
-            return None
-        i = text.find(open_char, i)
-        if i == -1:
-            return None
-
-        depth = 0
-        in_str = False
-        esc = False
-        start = i
-
-        for j in range(i, len(text)):
-            ch = text[j]
-
-            if in_str:
-                if esc:
-                    esc = False
-                elif ch == "\\":
-                    esc = True
-                elif ch == '"':
-                    in_str = False
-                continue
-
-            # вне строки
-            if ch == '"':
-                in_str = True
-                continue
-
-            if ch == open_char:
-                depth += 1
-            elif ch == close_char:
-                depth -= 1
-                if depth == 0:
-                    return text[start : j + 1]
+    # Все блоки вырезаются за один проход по странице.
+    with telemetry.span("parse_cv.json"):
+        blocks = extract_json_values(html, CV_JSON_MARKERS)
 
-        return None
-
-    def extract_value_array(marker: str) -> Optional[List[Any]]:
-        block = extract_balanced_json_after_marker(
-            html, marker=marker, open_char="[", close_char="]"
-        )
-        if not block:
-            return None
-        try:
-            return json.loads(block)
-        except Exception:
-            return None
-
-    def extract_value_object(marker: str) -> Optional[Dict[str, Any]]:
-        block = extract_balanced_json_after_marker(
-            html, marker=marker, open_char="{", close_char="}"
-        )
-        if not block:
-            return None
-        try:
-            return json.loads(block)
-        except Exception:
-            return None
+    def value_array(marker: str) -> Optional[List[Any]]:
+        v = blocks.get(marker)
+        return v if isinstance(v, list) else None
 
     # Навыки: advancedKeySkills.value = [{id, name, general}, ...]
-    skills_items = extract_value_array('"advancedKeySkills":{"value":') or []
+    skills_items = value_array('"advancedKeySkills":{"value":') or []
     skills = [clean(x.get("name")) for x in skills_items if isinstance(x, dict) and x.get("name")]
     # Опыт: experience.value = [{companyName, position, start, end, description, ...}, ...]
-    exp_items = extract_value_array('"experience":{"value":') or []
+    exp_items = value_array('"experience":{"value":') or []
     # Образование: education.value = [...]
-    edu_items = extract_value_array('"education":{"value":') or []
+    edu_items = value_array('"education":{"value":') or []
 
     # Если "position" не нашли в DOM — иногда она есть и в JSON (ищем грубо)
     if not position:
         # Популярный ключ у HH менялся, поэтому ищем по нескольким маркерам
-        for mk in ('"title":{"value":', '"desiredPosition":{"value":', '"position":{"value":'):
-            obj = extract_value_object(mk)
+        for mk in CV_POSITION_MARKERS:
+            obj = blocks.get(mk)
             if isinstance(obj, dict):
                 v = obj.get("value")
                 if isinstance(v, str) and clean(v):
                     position = clean(v)
                     break
 
-    # --- 3) Формируем Markdown ---
+    # Ссылка и ID резюме (если страница отдаёт canonical)
+    url = clean(page.link_href("canonical"))
+    m = re.search(r"/resume/([0-9a-f]+)", url)
+    resume_id = m.group(1) if m else ""
+
+    experience: List[ExperienceItem] = []
+    for item in exp_items:
+        if not isinstance(item, dict):
+            continue
+        exp = ExperienceItem(
+            company=clean(item.get("companyName") or ""),
+            position=clean(item.get("position") or item.get("jobTitle") or ""),
+            start=clean(item.get("start") or item.get("startDate") or ""),
+            end=clean(item.get("end") or item.get("endDate") or ""),
+        )
+        desc = item.get("description")
+        if isinstance(desc, str) and clean(desc):
+            # Превращаем маркеры "- " в списки, остальное оставляем текстом
+            desc_lines = [x.rstrip() for x in desc.splitlines()]
+            bullets = [clean(x[1:]) for x in desc_lines if x.lstrip().startswith("-")]
+            exp.description = clean("\n".join([x for x in desc_lines if not x.lstrip().startswith("-")]))
+            exp.bullets = [b for b in bullets if b]
+        experience.append(exp)
+
+    education: List[EducationItem] = []
+    for item in edu_items:
+        if not isinstance(item, dict):
+            continue
+        education.append(EducationItem(
+            year=clean(str(item.get("year") or "")),
+            organization=clean(item.get("organization") or item.get("universityName") or ""),
+            result=clean(item.get("result") or item.get("faculty") or ""),
+            specialty=clean(item.get("specialty") or ""),
+        ))
+
+    return Resume(
+        resume_id=resume_id,
+        url=url,
+        position=position,
+        address=address,
+        metro=metro,
+        location=location,
+        about=about,
+        skills=skills,
+        experience=experience,
+        education=education,
+    )
+
+
+def render_cv(cv: Resume) -> str:
+    """Markdown-выжимка по кандидату из структуры parse_cv_doc."""
     lines: List[str] = []
 
-    header = position or "Кандидат"
+    header = cv.position or "Кандидат"
     lines.append(f"# {header}")
 
-    if location:
-        lines.append(f"- **Локация:** {location}")
+    if cv.location:
+        lines.append(f"- **Локация:** {cv.location}")
 
     # --- About ---
-    if about:
+    if cv.about:
         lines.append("")
         lines.append("## Обо мне")
-        lines.append(about)
+        lines.append(cv.about)
 
     # --- Skills ---
-    if skills:
+    if cv.skills:
         lines.append("")
         lines.append("## Ключевые навыки")
-        for s in skills:
+        for s in cv.skills:
             lines.append(f"- {s}")
 
     # --- Experience ---
-    if exp_items:
+    if cv.experience:
         lines.append("")
         lines.append("## Опыт работы")
 
-        for item in exp_items:
-            if not isinstance(item, dict):
-                continue
-            company = clean(item.get("companyName") or "")
-            role = clean(item.get("position") or item.get("jobTitle") or "")
-            start = clean(item.get("start") or item.get("startDate") or "")
-            end = clean(item.get("end") or item.get("endDate") or "")
-            period = " — ".join([x for x in [start, end] if x]) if (start or end) else ""
+        for item in cv.experience:
+            period = " — ".join([x for x in [item.start, item.end] if x]) if (item.start or item.end) else ""
 
-            title_bits = [b for b in [company, role] if b]
+            title_bits = [b for b in [item.company, item.position] if b]
             title = " — ".join(title_bits) if title_bits else "Место работы"
             if period:
                 lines.append(f"### {title} ({period})")
             else:
                 lines.append(f"### {title}")
 
-            desc = item.get("description")
-            if isinstance(desc, str) and clean(desc):
-                # Превращаем маркеры "- " в списки, остальное оставляем текстом
-                desc_lines = [x.rstrip() for x in desc.splitlines()]
-                bullets = [clean(x[1:]) for x in desc_lines if x.lstrip().startswith("-")]
-                plain = clean("\n".join([x for x in desc_lines if not x.lstrip().startswith("-")]))
-                if plain:
-                    lines.append(plain)
-                if bullets:
-                    for b in bullets:
-                        if b:
-                            lines.append(f"- {b}")
+            if item.description:
+                lines.append(item.description)
+            for b in item.bullets:
+                lines.append(f"- {b}")
             lines.append("")
 
     # --- Education ---
-    if edu_items:
+    if cv.education:
         lines.append("")
         lines.append("## Образование")
 
-        for item in edu_items:
-            if not isinstance(item, dict):
-                continue
-            year = clean(str(item.get("year") or ""))
-            org = clean(item.get("organization") or item.get("universityName") or "")
-            result = clean(item.get("result") or item.get("faculty") or "")
-            specialty = clean(item.get("specialty") or "")
-
-            parts = [p for p in [org, result, specialty] if p]
+        for item in cv.education:
+            parts = [p for p in [item.organization, item.result, item.specialty] if p]
             line = " — ".join(parts) if parts else ""
-            if year and line:
-                lines.append(f"- **{year}**: {line}")
+            if item.year and line:
+                lines.append(f"- **{item.year}**: {line}")
             elif line:
                 lines.append(f"- {line}")
 
@@ -205,16 +536,25 @@ def parse_cv(html: str) -> str:
     return md
 
 
+def parse_cv(html: str, engine: Optional[str] = None, targeted: Optional[bool] = None) -> str:
+    """
+    Парсит HTML страницы резюме (формат hh.ru) и возвращает Markdown-выжимку по кандидату.
 
+    engine / targeted - движок разбора HTML (см. make_page), по умолчанию из env.
+    """
+    return render_cv(parse_cv_doc(html, engine, targeted))
 
 
-def parse_vac(html: str) -> str:
+@telemetry.traced("parse_vac")
+def parse_vac_doc(html: str, engine: Optional[str] = None, targeted: Optional[bool] = None) -> Vacancy:
     """
-    Парсит HTML страницы вакансии (hh.ru) и возвращает Markdown-выжимку по вакансии.
+    Парсит HTML страницы вакансии (hh.ru) в структуру Vacancy.
 
+    engine / targeted - движок разбора HTML (см. make_page), по умолчанию из env.
     """
 
-    soup = BeautifulSoup(html, "html.parser")
+    with telemetry.span("parse_vac.dom", bytes=len(html), engine=engine or PARSER_ENGINE):
+        page = make_page(html, engine, targeted)
 
     def clean(text: Optional[str]) -> str:
         if not text:
@@ -222,17 +562,14 @@ def parse_vac(html: str) -> str:
         return re.sub(r"\s+", " ", text).strip()
 
     def sel_text(css: str) -> str:
-        el = soup.select_one(css)
-        if not el:
-            return ""
-        return clean(el.get_text(" ", strip=True))
+        return clean(page.first_text(css))
 
     def meta(name: Optional[str] = None, prop: Optional[str] = None) -> str:
         if name:
-            tag = soup.find("meta", attrs={"name": name})
+            content = page.meta_content("name", name)
         else:
-            tag = soup.find("meta", attrs={"property": prop}) if prop else None
-        return clean(tag.get("content") if tag else "")
+            content = page.meta_content("property", prop) if prop else None
+        return clean(content)
 
     def parse_from_meta_description(desc: str) -> Tuple[str, str, str, str]:
         """
@@ -274,7 +611,7 @@ def parse_vac(html: str) -> str:
     title = (
         sel_text('[data-qa="vacancy-title"]')
         or sel_text("h1")
-        or clean(soup.title.get_text(" ", strip=True) if soup.title else "")
+        or clean(page.title_text())
     )
 
     company = (
@@ -302,18 +639,19 @@ def parse_vac(html: str) -> str:
     published = sel_text('[data-qa="vacancy-creation-time"]') or sel_text('[data-qa="vacancy-publication-time"]')
 
     # Описание вакансии
-    desc_block = soup.select_one('[data-qa="vacancy-description"]') or soup.select_one('[data-qa="vacancy-description-container"]')
+    desc_text = page.first_text('[data-qa="vacancy-description"]', "\n")
+    if desc_text is None:
+        desc_text = page.first_text('[data-qa="vacancy-description-container"]', "\n")
     description = ""
-    if desc_block:
+    if desc_text is not None:
         # Сохраняем переносы строк чуть аккуратнее
-        description = desc_block.get_text("\n", strip=True)
-        description = re.sub(r"\n{3,}", "\n\n", description).strip()
+        description = re.sub(r"\n{3,}", "\n\n", desc_text).strip()
 
     # Ключевые навыки (теги)
     skills: List[str] = []
     # Часто внутри есть теги bloko-tag__text
-    for el in soup.select('[data-qa="bloko-tag__text"], [data-qa="vacancy-skill"] [data-qa="bloko-tag__text"]'):
-        t = clean(el.get_text(" ", strip=True))
+    for text in page.all_texts('[data-qa="bloko-tag__text"], [data-qa="vacancy-skill"] [data-qa="bloko-tag__text"]'):
+        t = clean(text)
         if t and t not in skills:
             skills.append(t)
 
@@ -333,48 +671,74 @@ def parse_vac(html: str) -> str:
     # canonical + vacancy id (приятно иметь)
     canonical = ""
     vac_id = ""
-    link = soup.find("link", attrs={"rel": "canonical"})
-    if link and link.get("href"):
-        canonical = clean(link["href"])
+    href = page.link_href("canonical")
+    if href:
+        canonical = clean(href)
         m = re.search(r"/vacancy/(\d+)", canonical)
         if m:
             vac_id = m.group(1)
 
-    # --- Markdown сборка ---
+    return Vacancy(
+        vacancy_id=vac_id,
+        url=canonical,
+        title=title,
+        company=company,
+        salary=salary,
+        location=location,
+        experience=experience,
+        employment=employment,
+        schedule=schedule,
+        published=published,
+        skills=skills,
+        description=description,
+    )
+
+
+def render_vac(vac: Vacancy) -> str:
+    """Markdown-выжимка по вакансии из структуры parse_vac_doc."""
     lines: List[str] = []
-    lines.append(f"# {title or 'Вакансия'}")
+    lines.append(f"# {vac.title or 'Вакансия'}")
 
     # шапка-атрибуты
-    if company:
-        lines.append(f"- **Компания:** {company}")
-    if salary:
-        lines.append(f"- **Зарплата:** {salary}")
-    if location:
-        lines.append(f"- **Локация:** {location}")
-    if experience:
-        lines.append(f"- **Опыт:** {experience}")
-    if employment:
-        lines.append(f"- **Занятость:** {employment}")
-    if schedule:
-        lines.append(f"- **График:** {schedule}")
-    if published:
-        lines.append(f"- **Опубликовано:** {published}")
-    if vac_id:
-        lines.append(f"- **Vacancy ID:** {vac_id}")
-    if canonical:
-        lines.append(f"- **Ссылка:** {canonical}")
+    if vac.company:
+        lines.append(f"- **Компания:** {vac.company}")
+    if vac.salary:
+        lines.append(f"- **Зарплата:** {vac.salary}")
+    if vac.location:
+        lines.append(f"- **Локация:** {vac.location}")
+    if vac.experience:
+        lines.append(f"- **Опыт:** {vac.experience}")
+    if vac.employment:
+        lines.append(f"- **Занятость:** {vac.employment}")
+    if vac.schedule:
+        lines.append(f"- **График:** {vac.schedule}")
+    if vac.published:
+        lines.append(f"- **Опубликовано:** {vac.published}")
+    if vac.vacancy_id:
+        lines.append(f"- **Vacancy ID:** {vac.vacancy_id}")
+    if vac.url:
+        lines.append(f"- **Ссылка:** {vac.url}")
 
     # навыки
-    if skills:
+    if vac.skills:
         lines.append("")
         lines.append("## Ключевые навыки")
-        for s in skills:
+        for s in vac.skills:
             lines.append(f"- {s}")
 
     # описание
-    if description:
+    if vac.description:
         lines.append("")
         lines.append("## Описание")
-        lines.append(description)
+        lines.append(vac.description)
 
     return "\n".join(lines).rstrip() + "\n"
+
+
+def parse_vac(html: str, engine: Optional[str] = None, targeted: Optional[bool] = None) -> str:
+    """
+    Парсит HTML страницы вакансии (hh.ru) и возвращает Markdown-выжимку по вакансии.
+
+    engine / targeted - движок разбора HTML (см. make_page), по умолчанию из env.
+    """
+    return render_vac(parse_vac_doc(html, engine, targeted))
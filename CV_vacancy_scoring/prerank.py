@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from scipy import sparse
+
+from hh_models import Resume, Vacancy
+
+# Локальная предварительная оценка резюме до запроса к LLM:
+# - покрытие ключевых навыков вакансии навыками резюме (advancedKeySkills);
+# - BM25 по Markdown-текстам (вакансия как запрос, резюме как документы).
+# Всё считается разом для всей пачки на разреженных матрицах.
+
+_TOKEN_RE = re.compile(r"[a-zа-яё0-9][a-zа-яё0-9+#]*", re.IGNORECASE)
+
+# Служебные слова, которые есть в любом резюме/вакансии и только шумят в BM25
+STOP_WORDS = frozenset(
+    """
+    и в во на по с со к ко о об от до из за для не но а или что как это то же бы ли
+    при без под над про у мы вы он она они их его ее её наш ваш свой который
+    the and of to in for with on at by an or is are be as from
+    опыт работы работа компания вакансия резюме лет год года навыки ключевые
+    """.split()
+)
+
+# Вес навыков и текста в базовой оценке
+SKILL_WEIGHT = 0.6
+TEXT_WEIGHT = 0.4
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def normalize_skill(skill: str) -> str:
+    return re.sub(r"\s+", " ", skill).strip().lower()
+
+
+def _vocab(items: Iterable[Iterable[str]]) -> Dict[str, int]:
+    vocab: Dict[str, int] = {}
+    for tokens in items:
+        for t in tokens:
+            if t not in vocab:
+                vocab[t] = len(vocab)
+    return vocab
+
+
+def _count_matrix(rows: Sequence[Sequence[str]], vocab: Dict[str, int], binary: bool = False) -> sparse.csr_matrix:
+    """Документы x термины (CSR), термины вне словаря пропускаются."""
+    indptr = [0]
+    indices: List[int] = []
+    for tokens in rows:
+        ids = [vocab[t] for t in tokens if t in vocab]
+        if binary:
+            ids = list(set(ids))
+        indices.extend(ids)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    m = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(vocab)), dtype=np.float32)
+    m.sum_duplicates()
+    return m
+
+
+def bm25_scores(query: str, docs: Sequence[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """BM25 каждого документа относительно query, вектор длины len(docs)."""
+    if not docs:
+        return np.zeros(0, dtype=np.float32)
+    doc_tokens = [tokenize(d) for d in docs]
+    # словарь только из терминов запроса: остальные в сумму BM25 не входят
+    vocab = _vocab([tokenize(query)])
+    if not vocab:
+        return np.zeros(len(docs), dtype=np.float32)
+
+    tf = _count_matrix(doc_tokens, vocab)
+    q = np.asarray(_count_matrix([tokenize(query)], vocab).todense()).ravel()
+
+    n_docs = len(docs)
+    doc_len = np.array([len(t) for t in doc_tokens], dtype=np.float32)
+    avg_len = float(doc_len.mean()) or 1.0
+    df = np.bincount(tf.indices, minlength=len(vocab)).astype(np.float32)
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+    # BM25-вес только на ненулевых элементах CSR
+    rows = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+    norm = k1 * (1.0 - b + b * doc_len[rows] / avg_len)
+    weighted = tf.copy()
+    weighted.data = tf.data * (k1 + 1.0) / (tf.data + norm)
+    return np.asarray(weighted @ (idf * q)).ravel()
+
+
+def skill_overlap(vac_skills: Sequence[str], cv_skills: Sequence[Sequence[str]], cv_texts: Sequence[str]) -> np.ndarray:
+    """
+    Доля навыков вакансии, найденных у каждого кандидата (0..1).
+    Навык из списка advancedKeySkills засчитывается целиком, упоминание только в тексте - наполовину.
+    """
+    skills = list(dict.fromkeys(normalize_skill(s) for s in vac_skills if s.strip()))
+    if not skills or not cv_skills:
+        return np.zeros(len(cv_skills), dtype=np.float32)
+    vocab = {s: i for i, s in enumerate(skills)}
+
+    exact = _count_matrix([[normalize_skill(s) for s in row] for row in cv_skills], vocab, binary=True)
+    patterns = [re.compile(r"(?<![\w+#])" + re.escape(s) + r"(?![\w+#])") for s in skills]
+    mentioned = _count_matrix(
+        [[s for s, p in zip(skills, patterns) if p.search(text.lower())] for text in cv_texts],
+        vocab,
+        binary=True,
+    )
+    hit = exact.maximum(mentioned * 0.5)
+    return np.asarray(hit.sum(axis=1)).ravel() / len(skills)
+
+
+@dataclass
+class PreScore:
+    index: int
+    # базовая оценка 1..10
+    score: float
+    skill_overlap: float
+    bm25: float
+    matched_skills: List[str] = field(default_factory=list)
+
+
+def prerank(vacancy: Vacancy, vac_md: str, resumes: Sequence[Resume], cv_mds: Sequence[str]) -> List[PreScore]:
+    """Базовая оценка для каждого резюме (в исходном порядке)."""
+    if not resumes:
+        return []
+    overlap = skill_overlap(vacancy.skills, [r.skills for r in resumes], cv_mds)
+    text = bm25_scores(vac_md, cv_mds)
+    text_norm = text / text.max() if text.size and text.max() > 0 else np.zeros_like(text)
+    combined = SKILL_WEIGHT * overlap + TEXT_WEIGHT * text_norm
+
+    vac_skills = {normalize_skill(s): s for s in vacancy.skills}
+    out: List[PreScore] = []
+    for i, r in enumerate(resumes):
+        own = {normalize_skill(s) for s in r.skills}
+        out.append(PreScore(
+            index=i,
+            score=round(1.0 + 9.0 * float(combined[i]), 1),
+            skill_overlap=round(float(overlap[i]), 3),
+            bm25=round(float(text[i]), 3),
+            matched_skills=[orig for norm, orig in vac_skills.items() if norm in own],
+        ))
+    return out
+
+
+def select_for_llm(scores: Sequence[PreScore], top_k: Optional[int] = None, threshold: Optional[float] = None) -> Set[int]:
+    """
+    Индексы резюме, которые стоит отправить в LLM: top_k лучших и/или все с базовой оценкой >= threshold.
+    Если заданы оба ограничения, нужно пройти оба. Без ограничений - все.
+    """
+    chosen = [s for s in scores if threshold is None or s.score >= threshold]
+    if top_k is not None:
+        chosen = sorted(chosen, key=lambda s: s.score, reverse=True)[:max(0, top_k)]
+    return {s.index for s in chosen}
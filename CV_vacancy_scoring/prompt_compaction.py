@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import copy
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+from hh_models import ExperienceItem, Resume, Vacancy
+from parse_hh import render_cv, render_vac
+
+# Сжатие промпта для оценки под бюджет токенов:
+# 1) одинаковые пункты опыта (часто копируются из места в место) остаются один раз;
+# 2) каждый раздел обрезается до своего бюджета;
+# 3) если резюме всё ещё не влезает - сначала сокращаются описания старых и нерелевантных
+#    вакансии мест работы, потом такие места выкидываются целиком (последнее место остаётся всегда).
+
+# Бюджеты в токенах (env переопределяет)
+PROMPT_MAX_TOKENS = int(os.environ.get("PROMPT_MAX_TOKENS", "6000"))
+CV_MAX_TOKENS = int(os.environ.get("PROMPT_CV_MAX_TOKENS", "4000"))
+ABOUT_MAX_TOKENS = int(os.environ.get("PROMPT_ABOUT_MAX_TOKENS", "300"))
+JOB_MAX_TOKENS = int(os.environ.get("PROMPT_JOB_MAX_TOKENS", "350"))
+VAC_DESCRIPTION_MAX_TOKENS = int(os.environ.get("PROMPT_VAC_DESCRIPTION_MAX_TOKENS", "1500"))
+MAX_SKILLS = int(os.environ.get("PROMPT_MAX_SKILLS", "40"))
+
+ELLIPSIS = "…"
+
+_WORD_RE = re.compile(r"[a-zа-яё0-9][a-zа-яё0-9+#]*", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    # словарь BPE скачивается при первом обращении; без сети считаем приблизительно
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # незнакомая tiktoken модель: словарь актуальных моделей OpenAI
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Число токенов (tiktoken, если установлен; иначе грубая оценка ~3 символа на токен)."""
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + 2) // 3
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """Обрезает текст до max_tokens, стараясь резать по концу строки/предложения."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _encoding(model)
+    if enc is None:
+        cut = text[: max_tokens * 3]
+    else:
+        cut = enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    # не рвём предложение посередине, если есть разумная граница во второй половине
+    for sep in ("\n", ". ", "; "):
+        pos = cut.rfind(sep)
+        if pos > len(cut) // 2:
+            cut = cut[: pos + len(sep)]
+            break
+    return cut.rstrip() + ELLIPSIS
+
+
+def _norm_line(line: str) -> str:
+    return " ".join(_WORD_RE.findall(line.lower()))
+
+
+def _terms(text: str) -> Set[str]:
+    return {w for w in _WORD_RE.findall(text.lower()) if len(w) > 2}
+
+
+@dataclass
+class CompactionReport:
+    original_tokens: int = 0
+    compacted_tokens: int = 0
+    cv_original_tokens: int = 0
+    cv_compacted_tokens: int = 0
+    vac_original_tokens: int = 0
+    vac_compacted_tokens: int = 0
+    duplicate_bullets: int = 0
+    trimmed_jobs: int = 0
+    dropped_jobs: int = 0
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+def _dedupe_bullets(cv: Resume) -> int:
+    """Убирает повторяющиеся пункты (и по всему резюме, и внутри одного места работы)."""
+    seen: Set[str] = set()
+    removed = 0
+    for job in cv.experience:
+        kept = []
+        for b in job.bullets:
+            key = _norm_line(b)
+            if key and key in seen:
+                removed += 1
+                continue
+            seen.add(key)
+            kept.append(b)
+        job.bullets = kept
+    return removed
+
+
+def _job_tokens(job: ExperienceItem, model: str) -> int:
+    return count_tokens("\n".join([job.description, *job.bullets]), model)
+
+
+def _trim_job(job: ExperienceItem, max_tokens: int, model: str) -> bool:
+    """Обрезает описание места работы до max_tokens: сначала хвост пунктов, потом текст."""
+    if _job_tokens(job, model) <= max_tokens:
+        return False
+    while job.bullets and _job_tokens(job, model) > max_tokens:
+        job.bullets.pop()
+    if _job_tokens(job, model) > max_tokens:
+        job.description = truncate_tokens(job.description, max_tokens, model)
+    return True
+
+
+def compact_cv(
+    cv: Resume,
+    vacancy: Optional[Vacancy] = None,
+    max_tokens: int = CV_MAX_TOKENS,
+    about_max_tokens: int = ABOUT_MAX_TOKENS,
+    job_max_tokens: int = JOB_MAX_TOKENS,
+    max_skills: int = MAX_SKILLS,
+    model: str = "gpt-4o",
+) -> Tuple[Resume, CompactionReport]:
+    """Сжатая копия резюме (исходный объект не меняется) и отчёт."""
+    report = CompactionReport()
+    report.cv_original_tokens = count_tokens(render_cv(cv), model)
+    cv = copy.deepcopy(cv)
+
+    report.duplicate_bullets = _dedupe_bullets(cv)
+
+    cv.about = truncate_tokens(cv.about, about_max_tokens, model)
+    if len(cv.skills) > max_skills:
+        report.notes.append(f"навыки: {len(cv.skills)} -> {max_skills}")
+        cv.skills = cv.skills[:max_skills]
+    for job in cv.experience:
+        if _trim_job(job, job_max_tokens, model):
+            report.trimmed_jobs += 1
+
+    if count_tokens(render_cv(cv), model) > max_tokens and len(cv.experience) > 1:
+        # hh отдаёт опыт от нового к старому: индекс - это "возраст" места работы
+        wanted = _terms(" ".join([vacancy.title, " ".join(vacancy.skills), vacancy.description])) if vacancy else set()
+
+        def relevance(job: ExperienceItem) -> float:
+            if not wanted:
+                return 0.0
+            own = _terms(" ".join([job.position, job.description, *job.bullets]))
+            return len(own & wanted) / len(wanted)
+
+        # кандидаты на сокращение: все, кроме последнего места; сначала нерелевантные, среди равных - старые
+        order = sorted(range(1, len(cv.experience)), key=lambda i: (relevance(cv.experience[i]), -i))
+
+        # шаг 1: от описаний старых/нерелевантных мест остаётся только заголовок
+        for i in order:
+            if count_tokens(render_cv(cv), model) <= max_tokens:
+                break
+            job = cv.experience[i]
+            if job.description or job.bullets:
+                job.description, job.bullets = "", []
+                report.trimmed_jobs += 1
+
+        # шаг 2: выкидываем такие места целиком
+        kept = list(range(len(cv.experience)))
+        probe = copy.copy(cv)
+        for i in order:
+            probe.experience = [cv.experience[k] for k in kept]
+            if count_tokens(render_cv(probe), model) <= max_tokens:
+                break
+            kept.remove(i)
+        report.dropped_jobs = len(cv.experience) - len(kept)
+        cv.experience = [cv.experience[k] for k in kept]
+
+    report.cv_compacted_tokens = count_tokens(render_cv(cv), model)
+    report.original_tokens = report.cv_original_tokens
+    report.compacted_tokens = report.cv_compacted_tokens
+    return cv, report
+
+
+def compact_vacancy(
+    vac: Vacancy,
+    description_max_tokens: int = VAC_DESCRIPTION_MAX_TOKENS,
+    max_skills: int = MAX_SKILLS,
+    model: str = "gpt-4o",
+) -> Vacancy:
+    vac = copy.deepcopy(vac)
+    vac.description = truncate_tokens(vac.description, description_max_tokens, model)
+    vac.skills = vac.skills[:max_skills]
+    return vac
+
+
+def compact_pair(vac: Vacancy, cv: Resume, model: str = "gpt-4o") -> Tuple[str, str, CompactionReport]:
+    """
+    Markdown вакансии и резюме для промпта, сжатые под бюджеты выше, и отчёт
+    с числом токенов до и после.
+    """
+    vac_small = compact_vacancy(vac, model=model)
+    vac_md = render_vac(vac_small)
+
+    cv_budget = min(CV_MAX_TOKENS, max(500, PROMPT_MAX_TOKENS - count_tokens(vac_md, model)))
+    cv_small, report = compact_cv(cv, vac, max_tokens=cv_budget, model=model)
+    cv_md = render_cv(cv_small)
+
+    report.vac_original_tokens = count_tokens(render_vac(vac), model)
+    report.vac_compacted_tokens = count_tokens(vac_md, model)
+    report.original_tokens = report.vac_original_tokens + report.cv_original_tokens
+    report.compacted_tokens = report.vac_compacted_tokens + report.cv_compacted_tokens
+    return vac_md, cv_md, report
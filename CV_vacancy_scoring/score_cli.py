@@ -0,0 +1,329 @@
+"""
+Пакетная оценка пар (вакансия, резюме) из командной строки - без Streamlit,
+например ночной задачей.
+
+Вход - CSV с колонками vacancy_url, cv_url или JSONL с такими же ключами.
+Результаты пишутся в JSONL по мере готовности (по строке на пару). Выходной файл
+служит и контрольной точкой: при повторном запуске пары, которые в нём уже есть,
+пропускаются, так что упавший прогон продолжается с места остановки.
+
+    python score_cli.py pairs.csv -o results.jsonl
+    python score_cli.py pairs.jsonl -o results.jsonl --max-http 16 --max-llm 8 --parse-workers 4
+
+Страницы скачиваются через общий кэш hh_cache (повторный прогон сеть не трогает),
+HTML разбирается в пуле процессов, запросы к LLM идут параллельно с ограничением.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# грузим библиотеки из соседних файлов
+import hh_models
+import telemetry
+from hh_cache import PARSERS, load_doc, normalize_url
+from hh_models import Doc, Resume, Vacancy
+from scoring import (
+    DEFAULT_MAX_HTTP,
+    DEFAULT_MAX_LLM,
+    PROMPT_COMPACTION,
+    SCORING_STRUCTURED,
+    build_prompt,
+    extract_score,
+    parse_score_json,
+    request_gpt,
+    scoring_prompt,
+)
+
+Pair = Tuple[str, str]
+
+# Как часто сбрасывать выходной файл на диск (fsync), в строках
+FSYNC_EVERY = int(os.environ.get("SCORING_FSYNC_EVERY", "20"))
+
+
+@dataclass
+class PairResult:
+    vacancy_url: str
+    cv_url: str
+    position: str = ""
+    score: Optional[int] = None
+    # только в структурированном режиме
+    resume_quality: Optional[int] = None
+    response: str = ""
+    error: str = ""
+    seconds: float = 0.0
+    tokens_before: Optional[int] = None
+    tokens_after: Optional[int] = None
+    finished_at: float = 0.0
+
+
+def set_answer(res: PairResult, text: str) -> None:
+    """Ответ модели в результат: из JSON берутся поля схемы, из свободного текста - оценка."""
+    parsed = parse_score_json(text)
+    if parsed is not None:
+        res.response, res.score, res.resume_quality = parsed.analysis, parsed.score, parsed.resume_quality
+    else:
+        res.response, res.score = text, extract_score(text)
+
+
+def pair_key(vacancy_url: str, cv_url: str) -> Pair:
+    return normalize_url(vacancy_url), normalize_url(cv_url)
+
+
+def read_pairs(path: str) -> Iterator[Pair]:
+    """Пары из CSV (заголовок vacancy_url, cv_url) или JSONL; формат - по расширению."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+            rows: Iterator[Dict[str, str]] = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for n, row in enumerate(rows, 1):
+            vac, cv = (row.get("vacancy_url") or "").strip(), (row.get("cv_url") or "").strip()
+            if not vac or not cv:
+                print(f"{path}:{n}: нет vacancy_url или cv_url, строка пропущена", file=sys.stderr)
+                continue
+            yield vac, cv
+
+
+def read_checkpoint(path: str, retry_errors: bool = True) -> Set[Pair]:
+    """
+    Пары, уже записанные в выходной файл. Оборванная при падении последняя строка
+    не читается как JSON и просто игнорируется. С retry_errors пары с ошибкой
+    оцениваются заново.
+    """
+    done: Set[Pair] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if retry_errors and row.get("error"):
+                continue
+            done.add(pair_key(row["vacancy_url"], row["cv_url"]))
+    return done
+
+
+def open_output(path: str):
+    """Файл для дозаписи; если прошлый прогон оборвался посреди строки, начинаем с новой."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(path, "a", encoding="utf-8")
+    if needs_newline:
+        out.write("\n")
+    return out
+
+
+def _parse_page(kind: str, html: str) -> bytes:
+    """Выполняется в дочернем процессе: в родителя возвращается сериализованная структура."""
+    return hh_models.dumps(PARSERS[kind](html))
+
+
+class DocLoader:
+    """
+    Загрузка страниц через кэш hh_cache с разбором HTML в пуле процессов.
+    Одна и та же страница (обычно вакансия, общая для многих пар) грузится один раз.
+    """
+
+    def __init__(self, parse_pool: Optional[ProcessPoolExecutor], http_slots: threading.Semaphore):
+        self.parse_pool = parse_pool
+        self.http_slots = http_slots
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def _parser(self, kind: str) -> Optional[Callable[[str], Doc]]:
+        if self.parse_pool is None:
+            return None
+        pool = self.parse_pool
+        return lambda html: hh_models.loads(pool.submit(_parse_page, kind, html).result())
+
+    def _load(self, url: str, kind: str) -> Optional[Doc]:
+        with self.http_slots:
+            return load_doc(url, kind, parser=self._parser(kind))
+
+    def get(self, url: str, kind: str) -> Optional[Doc]:
+        key = (normalize_url(url), kind)
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if owner:
+            failed = False
+            try:
+                fut.set_result(self._load(url, kind))
+            except BaseException as e:
+                fut.set_exception(e)
+                failed = True
+            # резюме обычно встречается в одной паре - не держим его в памяти;
+            # вакансии остаются до конца прогона, кроме неудачных загрузок (таймаут, 429):
+            # следующая пара с той же вакансией попробует загрузить её заново
+            if kind == "cv" or failed:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return fut.result()
+
+
+def score_pairs(
+    pairs: List[Pair],
+    max_http: int = DEFAULT_MAX_HTTP,
+    max_llm: int = DEFAULT_MAX_LLM,
+    parse_workers: Optional[int] = None,
+    use_cache: bool = True,
+    compact: bool = PROMPT_COMPACTION,
+    system_prompt: str = scoring_prompt,
+    structured: bool = SCORING_STRUCTURED,
+    leftover: Optional[List[PairResult]] = None,
+) -> Iterator[PairResult]:
+    """
+    Оценивает пары, отдавая результаты по мере готовности (не по порядку).
+    parse_workers - число процессов для разбора HTML (0 - разбирать в потоках, None - по числу ядер).
+    leftover - если генератор прервали (Ctrl+C, close()), сюда попадают пары, которые были
+    уже в работе и досчитались, но не были получены вызывающим (последняя отданная - тоже,
+    её вызывающий мог не успеть записать).
+    """
+    if not pairs:
+        return
+    http_slots = threading.Semaphore(max(1, max_http))
+    llm_slots = threading.Semaphore(max(1, max_llm))
+    parse_pool = ProcessPoolExecutor(max_workers=parse_workers or None) if parse_workers != 0 else None
+    loader = DocLoader(parse_pool, http_slots)
+
+    def one(vac_url: str, cv_url: str) -> PairResult:
+        res = PairResult(vacancy_url=vac_url, cv_url=cv_url)
+        started = time.perf_counter()
+        try:
+            vac_doc = loader.get(vac_url, "vac")
+            if not isinstance(vac_doc, Vacancy):
+                raise ValueError("Вакансию не удалось прочитать")
+            cv_doc = loader.get(cv_url, "cv")
+            if not isinstance(cv_doc, Resume):
+                raise ValueError("Резюме не удалось прочитать")
+            res.position = cv_doc.position or "Кандидат"
+            user_prompt, report = build_prompt(vac_doc, cv_doc, compact=compact)
+            if report is not None:
+                res.tokens_before, res.tokens_after = report.original_tokens, report.compacted_tokens
+            with llm_slots:
+                answer = request_gpt(system_prompt, user_prompt, use_cache=use_cache, structured=structured)
+            set_answer(res, answer)
+        except Exception as e:
+            res.error = f"{type(e).__name__}: {e}"
+        res.seconds = round(time.perf_counter() - started, 3)
+        res.finished_at = time.time()
+        return res
+
+    # потоков столько, чтобы оба лимита могли быть выбраны одновременно
+    workers = min(len(pairs), max(1, max_http) + max(1, max_llm))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cli-score")
+    futures = [pool.submit(one, vac, cv) for vac, cv in pairs]
+    taken: Set[Future] = set()
+    try:
+        for fut in as_completed(futures):
+            yield fut.result()
+            taken.add(fut)
+    finally:
+        # при Ctrl+C / закрытии генератора не начинаем новые пары, начатые - дожидаемся
+        pool.shutdown(wait=True, cancel_futures=True)
+        if leftover is not None:
+            leftover.extend(f.result() for f in futures if f not in taken and f.done() and not f.cancelled())
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("input", help="CSV (vacancy_url, cv_url) или JSONL с такими ключами")
+    ap.add_argument("-o", "--output", required=True, help="JSONL с результатами, он же контрольная точка")
+    ap.add_argument("--max-http", type=int, default=DEFAULT_MAX_HTTP)
+    ap.add_argument("--max-llm", type=int, default=DEFAULT_MAX_LLM)
+    ap.add_argument("--parse-workers", type=int, default=None, help="процессов для разбора HTML (0 - без пула)")
+    ap.add_argument("--no-cache", action="store_true", help="запросы к модели мимо кэша ответов")
+    ap.add_argument(
+        "--compact", action=argparse.BooleanOptionalAction, default=PROMPT_COMPACTION,
+        help="сжимать промпт под бюджет токенов (по умолчанию - PROMPT_COMPACTION)",
+    )
+    ap.add_argument("--structured", action="store_true", default=SCORING_STRUCTURED, help="ответ модели в JSON по схеме")
+    ap.add_argument("--metrics", help="куда записать метрики стадий в формате Prometheus (textfile) по окончании")
+    ap.add_argument("--keep-errors", action="store_true", help="не переоценивать пары, завершившиеся ошибкой")
+    args = ap.parse_args(argv)
+
+    telemetry.serve_metrics()
+    done = read_checkpoint(args.output, retry_errors=not args.keep_errors)
+    seen: Set[Pair] = set()
+    todo: List[Pair] = []
+    for vac, cv in read_pairs(args.input):
+        key = pair_key(vac, cv)
+        if key in done or key in seen:
+            continue
+        seen.add(key)
+        todo.append((vac, cv))
+    print(f"к оценке: {len(todo)}, уже готово: {len(done)}", file=sys.stderr)
+
+    written = failed = 0
+    written_keys: Set[Pair] = set()
+    started = time.perf_counter()
+    leftover: List[PairResult] = []
+    results = score_pairs(
+        todo,
+        max_http=args.max_http,
+        max_llm=args.max_llm,
+        parse_workers=args.parse_workers,
+        use_cache=not args.no_cache,
+        compact=args.compact,
+        structured=args.structured,
+        leftover=leftover,
+    )
+    with open_output(args.output) as out:
+
+        def write(res: PairResult) -> None:
+            nonlocal written, failed
+            out.write(json.dumps(asdict(res), ensure_ascii=False) + "\n")
+            out.flush()
+            written_keys.add(pair_key(res.vacancy_url, res.cv_url))
+            written += 1
+            failed += bool(res.error)
+
+        try:
+            for res in results:
+                write(res)
+                if written % FSYNC_EVERY == 0:
+                    os.fsync(out.fileno())
+                    elapsed = time.perf_counter() - started
+                    print(f"{written}/{len(todo)} ({written / elapsed:.2f} пар/с, ошибок {failed})", file=sys.stderr)
+        except KeyboardInterrupt:
+            print("прерывание: дожидаюсь пар, которые уже в работе", file=sys.stderr)
+            # дождаться начатых пар; их ответы уже оплачены, поэтому пишем их в контрольную точку
+            results.close()
+            for res in leftover:
+                if pair_key(res.vacancy_url, res.cv_url) not in written_keys:
+                    write(res)
+            print(f"прервано: записано {written}, при повторном запуске продолжим отсюда", file=sys.stderr)
+            return 130
+        finally:
+            out.flush()
+            os.fsync(out.fileno())
+            if args.metrics:
+                # разбор в пуле процессов пишет span в дочерних процессах, здесь их нет
+                with open(args.metrics, "w", encoding="utf-8") as f:
+                    f.write(telemetry.registry.render_prometheus())
+    print(f"готово: {written} за {time.perf_counter() - started:.1f} с, ошибок {failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,471 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+# грузим библиотеки из соседних файлов
+import telemetry
+from hh_cache import load_cv_doc, load_vac_doc
+from hh_models import Resume, Vacancy
+from llm_cache import default_cache as llm_cache, make_key
+from parse_hh import render_cv, render_vac
+from prerank import prerank, select_for_llm
+from prompt_compaction import CompactionReport, compact_pair
+
+load_dotenv()
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+scoring_prompt = """
+                    Оцени кандидата, насколько он подходит для данной вакансии.
+                    Сначала напиши короткий анализ, который будет пояснять оценку.
+                    Отдельно оцени качество заполнения резюме (понятно ли, с какими задачами сталкивался кандидат и каким образом их решал?). Эта оценка должна учитываться при выставлении финальной оценки - нам важно нанимать таких кандидатов, которые могут рассказать про свою работу
+                    Потом представь результат в виде оценки от 1 до 10.
+                """.strip()
+
+client = OpenAI(api_key=OPENAI_API_KEY)
+
+LLM_MODEL = "gpt-4o"
+LLM_PARAMS = {"max_tokens": 600, "temperature": 0}
+
+# Сжимать ли вакансию/резюме в промпте под бюджет токенов (см. prompt_compaction.py).
+# По умолчанию выключено: сжатие меняет промпт, а с ним и оценки; включать после замера на своих парах
+PROMPT_COMPACTION = os.environ.get("PROMPT_COMPACTION", "0").lower() in ("1", "true", "yes")
+
+# Структурированный ответ (JSON по схеме SCORE_SCHEMA) вместо свободного текста
+SCORING_STRUCTURED = os.environ.get("SCORING_STRUCTURED", "0").lower() in ("1", "true", "yes")
+
+# Порядок полей важен: модель сначала пишет анализ, потом выставляет оценки
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {"type": "string", "description": "Короткий анализ, поясняющий оценку"},
+        "resume_quality": {
+            "type": "integer",
+            "description": "Качество заполнения резюме от 1 до 10: понятно ли, какие задачи решал кандидат и как",
+        },
+        "score": {"type": "integer", "description": "Итоговая оценка соответствия вакансии от 1 до 10"},
+    },
+    "required": ["analysis", "resume_quality", "score"],
+    "additionalProperties": False,
+}
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "cv_score", "strict": True, "schema": SCORE_SCHEMA},
+}
+
+# Лимиты одновременных запросов для пакетного режима (можно переопределить env-ом)
+DEFAULT_MAX_HTTP = int(os.environ.get("SCORING_MAX_HTTP", "8"))
+DEFAULT_MAX_LLM = int(os.environ.get("SCORING_MAX_LLM", "4"))
+
+
+def chat_request(system_prompt: str, user_prompt: str, structured: bool = False) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """Сообщения и параметры запроса к модели (они же - ключ кэша ответов и тело запроса в Batch API)."""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    params: Dict[str, Any] = dict(LLM_PARAMS)
+    if structured:
+        params["response_format"] = RESPONSE_FORMAT
+    return messages, params
+
+
+def request_gpt(system_prompt, user_prompt, use_cache=True, structured=SCORING_STRUCTURED):
+    """
+    Запрос к модели через дисковый кэш ответов: одинаковые (модель, промпты, параметры)
+    при temperature=0 не оплачиваются повторно. use_cache=False - идём в API мимо кэша
+    (свежий ответ всё равно сохраняется).
+
+    structured=True - ответ JSON по схеме SCORE_SCHEMA (см. parse_score_json).
+    """
+    messages, params = chat_request(system_prompt, user_prompt, structured)
+    key = make_key(LLM_MODEL, messages, **params)
+    with telemetry.span("llm", model=LLM_MODEL, cache="miss" if use_cache else "bypass") as sp:
+        if use_cache:
+            cached = llm_cache().get(key)
+            if cached is not None:
+                sp.update(cache="hit", bytes=len(cached.content.encode("utf-8")))
+                return cached.content
+
+        response = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            **params,
+        )
+        content = (response.choices[0].message.content or "").strip()
+        usage = response.usage
+        sp.update(
+            bytes=len(content.encode("utf-8")),
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+    # пустой ответ (фильтр контента и т.п.) не кэшируем, как и ошибки
+    if content:
+        llm_cache().put(
+            key,
+            LLM_MODEL,
+            content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+    return content
+
+
+def request_gpt_stream(system_prompt, user_prompt, use_cache=True, structured=SCORING_STRUCTURED) -> Iterator[str]:
+    """
+    То же, что request_gpt, но отдаёт ответ кусками по мере генерации (stream=True).
+    Ответ из кэша отдаётся одним куском. Если генератор закрыть раньше времени,
+    соединение с API закрывается и генерация (и расход токенов) прекращается;
+    в кэш попадают только полные ответы.
+
+    Span "llm_stream" длится, пока читают генератор; время до первого куска - в атрибуте ttft.
+    """
+    messages, params = chat_request(system_prompt, user_prompt, structured)
+    key = make_key(LLM_MODEL, messages, **params)
+    with telemetry.span("llm_stream", model=LLM_MODEL, cache="miss" if use_cache else "bypass") as sp:
+        if use_cache:
+            cached = llm_cache().get(key)
+            if cached is not None:
+                sp.update(cache="hit", bytes=len(cached.content.encode("utf-8")))
+                yield cached.content
+                return
+
+        started = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params,
+        )
+        parts: List[str] = []
+        usage = None
+        finished = False
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        sp["ttft"] = round(time.perf_counter() - started, 4)
+                    parts.append(delta)
+                    yield delta
+            finished = True
+        finally:
+            if not finished:
+                stream.close()
+            sp.update(
+                bytes=sum(len(x.encode("utf-8")) for x in parts),
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0,
+            )
+
+    content = "".join(parts).strip()
+    # поток без текста (только finish_reason=content_filter и т.п.) не кэшируем, как и ошибки
+    if content:
+        llm_cache().put(
+            key,
+            LLM_MODEL,
+            content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+
+def build_user_prompt(vac_description: str, cv_description: str) -> str:
+    return f"# ВАКАНСИЯ:\n{vac_description}\n\n# РЕЗЮМЕ:\n{cv_description}"
+
+
+@telemetry.traced("build_prompt")
+def build_prompt(vac_doc: Vacancy, cv_doc: Resume, compact: bool = PROMPT_COMPACTION) -> Tuple[str, Optional[CompactionReport]]:
+    """Пользовательский промпт из структур вакансии и резюме; при compact - сжатый, с отчётом о токенах."""
+    if not compact:
+        return build_user_prompt(render_vac(vac_doc), render_cv(cv_doc)), None
+    vac_md, cv_md, report = compact_pair(vac_doc, cv_doc)
+    return build_user_prompt(vac_md, cv_md), report
+
+
+# "Оценка: 7/10", "Итоговая оценка — 8", "**7 из 10**" и т.п.
+_SCORE_RE = re.compile(r"(?<![\d.,])(10|[1-9])(?:[.,]\d)?\s*(?:/\s*10|из\s+10)?(?![\d%])")
+_SCORE_HINT_RE = re.compile(r"оценк|score|итог", re.IGNORECASE)
+# явная форма "N/10" / "N из 10": её можно принимать и без слова "оценка" рядом
+_SCORE_OUT_OF_RE = re.compile(r"(?<![\d.,])(10|[1-9])(?:[.,]\d)?\s*(?:/\s*10|из\s+10)(?![\d%])")
+
+
+@dataclass
+class ScoreResult:
+    analysis: str
+    resume_quality: Optional[int]
+    score: Optional[int]
+
+
+def _clamp_score(value: Any) -> Optional[int]:
+    try:
+        return min(10, max(1, int(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_score_json(text: Optional[str]) -> Optional[ScoreResult]:
+    """Ответ в структурированном режиме (JSON по SCORE_SCHEMA) или None, если это не он."""
+    if not text or not text.lstrip().startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "score" not in data:
+        return None
+    return ScoreResult(
+        analysis=str(data.get("analysis") or ""),
+        resume_quality=_clamp_score(data.get("resume_quality")),
+        score=_clamp_score(data.get("score")),
+    )
+
+
+def extract_score(text: Optional[str], partial: bool = False) -> Optional[int]:
+    """
+    Достаёт финальную оценку 1..10 из ответа модели. Структурированный ответ (JSON)
+    читается как есть. В свободном тексте модель пишет оценку в конце, поэтому смотрим
+    с конца: сначала строки со словами "оценка"/"итог", потом просто последнее подходящее число.
+
+    partial - ответ ещё пишется: смотрим только законченные строки и берём число лишь
+    из строки с "оценка"/"итог" или в форме "N/10"; последнее число в тексте ("5 лет опыта")
+    оценкой не считаем, пока ответ не закончен.
+    """
+    if not text:
+        return None
+    if partial:
+        text = text[:text.rfind("\n") + 1]
+    else:
+        parsed = parse_score_json(text)
+        if parsed is not None:
+            return parsed.score
+
+    lines = [x for x in text.splitlines() if x.strip()]
+    for line in reversed(lines):
+        if _SCORE_HINT_RE.search(line):
+            found = _SCORE_RE.findall(line)
+            if found:
+                return int(found[-1])
+        if partial:
+            found = _SCORE_OUT_OF_RE.findall(line)
+            if found:
+                return int(found[-1])
+
+    if partial:
+        return None
+    found = _SCORE_RE.findall(lines[-1]) if lines else []
+    return int(found[-1]) if found else None
+
+
+@dataclass
+class BatchResult:
+    cv_url: str
+    position: str = ""
+    score: Optional[int] = None
+    response: str = ""
+    error: str = ""
+    seconds: float = 0.0
+    # локальная предварительная оценка (prerank), если она считалась
+    prescore: Optional[float] = None
+    skill_overlap: Optional[float] = None
+    sent_to_llm: bool = False
+    # токены вакансии+резюме до и после сжатия промпта
+    tokens_before: Optional[int] = None
+    tokens_after: Optional[int] = None
+    # оценка качества заполнения резюме (только в структурированном режиме)
+    resume_quality: Optional[int] = None
+    # False - промежуточное состояние при потоковом ответе (оценка уже видна, анализ ещё пишется)
+    done: bool = True
+
+
+def score_batch(
+    vac_url: str,
+    cv_urls: List[str],
+    max_http: int = DEFAULT_MAX_HTTP,
+    max_llm: int = DEFAULT_MAX_LLM,
+    system_prompt: str = scoring_prompt,
+    gpt: Callable[..., str] = request_gpt,
+    use_cache: bool = True,
+    top_k: Optional[int] = None,
+    min_prescore: Optional[float] = None,
+    compact: bool = PROMPT_COMPACTION,
+    stream: bool = False,
+    gpt_stream: Callable[..., Iterator[str]] = request_gpt_stream,
+    structured: bool = SCORING_STRUCTURED,
+) -> Iterator[BatchResult]:
+    """
+    Оценивает пачку резюме против одной вакансии.
+
+    Вакансия скачивается и парсится один раз, резюме - параллельно в пуле потоков;
+    страницы берутся через общий кэш hh_cache, повторная оценка сеть не трогает.
+    Число одновременных HTTP-запросов к hh.ru и запросов к LLM ограничено
+    отдельными семафорами. Результаты отдаются по мере готовности (не по порядку).
+
+    top_k / min_prescore включают локальный предварительный отбор (prerank): сначала
+    скачиваются все резюме, каждому считается базовая оценка, и в LLM уходят только
+    top_k лучших и/или с базовой оценкой не ниже min_prescore. Остальные возвращаются
+    только с базовой оценкой.
+
+    stream=True - ответ модели читается потоком: как только в нём появляется оценка,
+    отдаётся промежуточный результат с done=False (тот же cv_url, потом придёт финальный).
+
+    structured=True - ответ модели в JSON (SCORE_SCHEMA): в response кладётся анализ,
+    оценки берутся из полей score / resume_quality.
+    """
+    vac_doc = load_vac_doc(vac_url)
+    if vac_doc is None:
+        raise ValueError("Вакансию не удалось прочитать")
+    vac_description = render_vac(vac_doc)
+
+    # убираем пустые строки и дубли, сохраняя порядок
+    urls = list(dict.fromkeys(u.strip() for u in cv_urls if u and u.strip()))
+    if not urls:
+        return
+
+    http_slots = threading.Semaphore(max(1, max_http))
+    llm_slots = threading.Semaphore(max(1, max_llm))
+    prerank_on = top_k is not None or min_prescore is not None
+    # результаты и промежуточные обновления от потоков-исполнителей
+    events: "queue.Queue[BatchResult]" = queue.Queue()
+    cancelled = threading.Event()
+
+    def fetch_cv(res: BatchResult) -> Optional[Resume]:
+        with http_slots:
+            cv_doc = load_cv_doc(res.cv_url)
+        if cv_doc is None:
+            res.error = "Резюме не удалось прочитать"
+            return None
+        res.position = cv_doc.position or "Кандидат"
+        return cv_doc
+
+    def ask_llm(res: BatchResult, cv_doc: Resume) -> None:
+        user_prompt, report = build_prompt(vac_doc, cv_doc, compact=compact)
+        if report is not None:
+            res.tokens_before, res.tokens_after = report.original_tokens, report.compacted_tokens
+        with llm_slots:
+            if cancelled.is_set():
+                raise RuntimeError("Оценка отменена")
+            if not stream:
+                res.response = gpt(system_prompt, user_prompt, use_cache=use_cache, structured=structured)
+            else:
+                parts: List[str] = []
+                chunks = gpt_stream(system_prompt, user_prompt, use_cache=use_cache, structured=structured)
+                try:
+                    for delta in chunks:
+                        if cancelled.is_set():
+                            break
+                        parts.append(delta)
+                        # оценку ищем на границах строк, чтобы не ловить недописанные числа;
+                        # в недописанном JSON её не найти, там ждём конца ответа
+                        if "\n" in delta and not structured:
+                            score = extract_score("".join(parts), partial=True)
+                            if score is not None and score != res.score:
+                                res.score = score
+                                res.response = "".join(parts)
+                                events.put(replace(res, done=False))
+                finally:
+                    chunks.close()
+                res.response = "".join(parts).strip()
+        res.sent_to_llm = True
+        parsed = parse_score_json(res.response)
+        if parsed is not None:
+            res.response, res.score, res.resume_quality = parsed.analysis, parsed.score, parsed.resume_quality
+        else:
+            res.score = extract_score(res.response)
+
+    def timed(res: BatchResult, fn: Callable[[], None]) -> BatchResult:
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            res.error = f"{type(e).__name__}: {e}"
+        finally:
+            res.seconds += time.perf_counter() - started
+        return res
+
+    def full(cv_url: str) -> None:
+        res = BatchResult(cv_url=cv_url)
+
+        def run() -> None:
+            cv_doc = fetch_cv(res)
+            if cv_doc is not None:
+                ask_llm(res, cv_doc)
+
+        events.put(timed(res, run))
+
+    def llm_only(res: BatchResult, cv_doc: Resume) -> None:
+        events.put(timed(res, lambda: ask_llm(res, cv_doc)))
+
+    # потоков столько, чтобы оба лимита могли быть выбраны одновременно
+    workers = min(len(urls), max(1, max_http) + max(1, max_llm))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cv-score") as pool:
+        if not prerank_on:
+            futures = [pool.submit(full, u) for u in urls]
+        else:
+            # 1) скачиваем и парсим все резюме
+            fetched: List[Tuple[BatchResult, Resume]] = []
+            docs: Dict[str, Resume] = {}
+
+            def fetch_only(cv_url: str) -> BatchResult:
+                res = BatchResult(cv_url=cv_url)
+
+                def run() -> None:
+                    cv_doc = fetch_cv(res)
+                    if cv_doc is not None:
+                        docs[cv_url] = cv_doc
+
+                return timed(res, run)
+
+            for fut in as_completed([pool.submit(fetch_only, u) for u in urls]):
+                res = fut.result()
+                if res.cv_url in docs:
+                    fetched.append((res, docs[res.cv_url]))
+                else:
+                    yield res
+
+            # 2) базовая оценка для всех и отбор кандидатов для LLM
+            cv_mds = [render_cv(doc) for _, doc in fetched]
+            with telemetry.span("prerank", resumes=len(fetched)):
+                pre = prerank(vac_doc, vac_description, [doc for _, doc in fetched], cv_mds)
+            chosen = select_for_llm(pre, top_k=top_k, threshold=min_prescore)
+            futures = []
+            for p in pre:
+                res = fetched[p.index][0]
+                res.prescore = p.score
+                res.skill_overlap = p.skill_overlap
+                if p.index in chosen:
+                    cv_doc = fetched[p.index][1]
+                    futures.append(pool.submit(llm_only, res, cv_doc))
+                else:
+                    yield res
+
+        # 3) результаты LLM (и промежуточные обновления) по мере готовности
+        pending = len(futures)
+        try:
+            while pending:
+                res = events.get()
+                if res.done:
+                    pending -= 1
+                yield res
+        finally:
+            # если генератор бросили на полпути (например, Streamlit перезапустил скрипт),
+            # не начинаем новые запросы и обрываем идущие потоковые ответы
+            cancelled.set()
+            for fut in futures:
+                fut.cancel()
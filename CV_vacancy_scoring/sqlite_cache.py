@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Общая основа дисковых кэшей (hh_cache.PageCache, llm_cache.LLMCache): SQLite-файл в CACHE_DIR,
+# соединение на операцию, счётчики попаданий/промахов в той же базе (общие для всех процессов)
+# и лимит на суммарный размер записей с вытеснением давно не читанных (LRU).
+
+CACHE_DIR = os.environ.get("HH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+_COUNTERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SQLiteCache:
+    """
+    База SQLite-кэша. Подкласс задаёт TABLE и схему; в таблице записей обязательны
+    колонки key (первичный ключ), size (байты записи) и accessed_at (время последнего чтения).
+    """
+
+    TABLE = ""
+
+    def __init__(self, path: str, max_bytes: int, schema: str):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(schema + _COUNTERS_SCHEMA)
+            self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Доводит базу, созданную старой версией, до текущей схемы."""
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # Отдельное соединение на операцию: дёшево и безопасно для потоков/процессов
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO counters(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _counters(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return dict(conn.execute("SELECT name, value FROM counters"))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # чистим с запасом до 90% лимита, чтобы не вытеснять на каждой вставке
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.TABLE} ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany(f"DELETE FROM {self.TABLE} WHERE key = ?", victims)
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute(f"DELETE FROM {self.TABLE}")
+            conn.execute("DELETE FROM counters")
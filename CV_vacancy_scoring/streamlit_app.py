@@ -2,69 +2,158 @@ from __future__ import annotations
 
 import json
 import re
+import time
 from typing import Any, Dict, List, Optional, Tuple
 from bs4 import BeautifulSoup
 
 import streamlit as st
-from dotenv import load_dotenv
-import os
-from openai import OpenAI
 
 # грузим библиотеки из соседних файлов
-from get_html import get_html
-from parse_hh import parse_cv, parse_vac
+import telemetry
+from hh_cache import default_cache, load_cv_doc, load_vac_doc
+from llm_cache import default_cache as llm_cache
+from parse_hh import render_cv, render_vac
+from scoring import (
+    DEFAULT_MAX_HTTP,
+    DEFAULT_MAX_LLM,
+    PROMPT_COMPACTION,
+    SCORING_STRUCTURED,
+    build_prompt,
+    build_user_prompt,
+    request_gpt,
+    parse_score_json,
+    request_gpt_stream,
+    score_batch,
+    scoring_prompt,
+)
 
-load_dotenv()
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# /metrics для Prometheus, если задан TELEMETRY_PROM_PORT (один сервер на процесс)
+telemetry.serve_metrics()
+run_started = time.time()
 
-scoring_prompt = """
-                    Оцени кандидата, насколько он подходит для данной вакансии.
-                    Сначала напиши короткий анализ, который будет пояснять оценку.
-                    Отдельно оцени качество заполнения резюме (понятно ли, с какими задачами сталкивался кандидат и каким образом их решал?). Эта оценка должна учитываться при выставлении финальной оценки - нам важно нанимать таких кандидатов, которые могут рассказать про свою работу
-                    Потом представь результат в виде оценки от 1 до 10.
-                """.strip()
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+# основная часть страницы приложения
+st.title('CV Scoring App')
 
-def request_gpt(system_prompt, user_prompt):
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},  
-            {"role": "user", "content": user_prompt},     
-        ],
-        max_tokens=600,
-        temperature=0,
+# статистика кэша страниц hh.ru (общая для всех сессий)
+with st.sidebar:
+    st.caption('Кэш страниц hh.ru')
+    for kind, stat in default_cache().stats().items():
+        st.caption(f"{kind}: {stat['entries']} стр., {stat['bytes'] // 1024} КБ, попаданий {stat['hits']}, промахов {stat['misses']}")
+    llm_stat = llm_cache().stats()
+    st.caption('Кэш ответов LLM')
+    st.caption(
+        f"{llm_stat['entries']} отв., попаданий {llm_stat['hits']}, промахов {llm_stat['misses']}, "
+        f"сэкономлено токенов {llm_stat['saved_prompt_tokens'] + llm_stat['saved_completion_tokens']}"
     )
-    return response.choices[0].message.content.strip()
+    use_cache = not st.checkbox('Не брать ответы LLM из кэша')
+    compact = st.checkbox('Сжимать промпт под бюджет токенов', value=PROMPT_COMPACTION)
+    stream = st.checkbox('Потоковый вывод ответа', value=True)
+    debug = st.checkbox('Панель отладки: время стадий')
+    structured = st.checkbox('Структурированный ответ (JSON: анализ, качество резюме, оценка)', value=SCORING_STRUCTURED)
 
+mode = st.radio('Режим', ['Одно резюме', 'Пакетная оценка'], horizontal=True)
 
-# основная часть страницы приложения
-st.title('CV Scoring App')
+if mode == 'Одно резюме':
+    # два поля для ввода данных
+    vac = st.text_area('Введите URL вакансии')
+    cv = st.text_area('Введите URL резюме')
 
-# два поля для ввода данных
-vac = st.text_area('Введите URL вакансии')
-cv = st.text_area('Введите URL резюме')
+    # кнопка и реакция на неё
+    if st.button('Оценка резюме'):
+        with st.spinner('Анализирую...'):
+            # Формирование пользовательского промпта
+            # страницы берутся из общего кэша, если их уже скачивали
+            cv_doc = load_cv_doc(cv)
+            vac_doc = load_vac_doc(vac)
+            report = None
+            if cv_doc is not None and vac_doc is not None:
+                user_prompt, report = build_prompt(vac_doc, cv_doc, compact=compact)
+            else:
+                cv_description = render_cv(cv_doc) if cv_doc is not None else "Резюме не удалось прочитать"
+                vac_description = render_vac(vac_doc) if vac_doc is not None else "Вакансию не удалось прочитать"
+                user_prompt = build_user_prompt(vac_description, cv_description)
+            # JSON по частям читать неудобно - структурированный ответ ждём целиком
+            if not stream or structured:
+                response = request_gpt(scoring_prompt, user_prompt, use_cache=use_cache, structured=structured)
+        parsed = parse_score_json(response) if structured else None
+        if parsed is not None:
+            col_score, col_quality = st.columns(2)
+            col_score.metric('Оценка', f'{parsed.score}/10')
+            col_quality.metric('Качество резюме', f'{parsed.resume_quality}/10')
+            st.write(parsed.analysis)
+        elif stream and not structured:
+            # анализ печатается по мере генерации; если пользователь уйдёт со страницы,
+            # Streamlit закроет генератор и запрос к API оборвётся
+            st.write_stream(request_gpt_stream(scoring_prompt, user_prompt, use_cache=use_cache, structured=False))
+        else:
+            st.write(response)
+        if report is not None:
+            st.caption(f'Токенов в промпте: {report.original_tokens} -> {report.compacted_tokens}')
 
+else:
+    vac = st.text_area('Введите URL вакансии')
+    cvs = st.text_area('Введите URL резюме (по одному на строку)', height=200)
 
+    col_http, col_llm = st.columns(2)
+    max_http = col_http.number_input('Одновременных запросов к hh.ru', 1, 64, DEFAULT_MAX_HTTP)
+    max_llm = col_llm.number_input('Одновременных запросов к LLM', 1, 32, DEFAULT_MAX_LLM)
 
-# кнопка и реакция на неё
-if st.button('Оценка резюме'):
-    with st.spinner('Анализирую...'):
-        # Формирование пользовательского промпта
-        html_cv = get_html(cv)
-        if html_cv:
-            cv_description = parse_cv(html_cv)
-        else:
-            cv_description = "Резюме не удалось прочитать"
-        
-        html_vac = get_html(vac)
-        if html_vac:
-            vac_description = parse_vac(html_vac)
+    # локальный предварительный отбор: в LLM уходят только лучшие по навыкам и тексту
+    use_prerank = st.checkbox('Предварительный отбор без LLM (навыки + BM25)')
+    top_k = None
+    min_prescore = None
+    if use_prerank:
+        col_k, col_t = st.columns(2)
+        top_k = int(col_k.number_input('Отправить в LLM лучших', 1, 1000, 30))
+        min_prescore = col_t.slider('Минимальная базовая оценка', 1.0, 10.0, 1.0, 0.5)
+
+    if st.button('Оценить пачку'):
+        cv_urls = list(dict.fromkeys(x.strip() for x in cvs.splitlines() if x.strip()))
+        progress = st.progress(0.0, text='Анализирую...')
+        table = st.empty()
+        rows = {}
+        finished = 0
+        try:
+            for res in score_batch(vac.strip(), cv_urls, max_http=int(max_http), max_llm=int(max_llm), use_cache=use_cache,
+                                    top_k=top_k, min_prescore=min_prescore, compact=compact, stream=stream,
+                                    structured=structured):
+                # при потоковом ответе по одному резюме приходит несколько обновлений
+                finished += res.done
+                rows[res.cv_url] = {
+                    'Оценка': res.score,
+                    'Базовая оценка': res.prescore,
+                    'Качество резюме': res.resume_quality,
+                    'Навыки, %': round(res.skill_overlap * 100) if res.skill_overlap is not None else None,
+                    'Должность': res.position,
+                    'Резюме': res.cv_url,
+                    'Ошибка': res.error,
+                    'Время, с': round(res.seconds, 1),
+                    'Токенов до сжатия': res.tokens_before,
+                    'Токенов после': res.tokens_after,
+                    'Анализ': res.response,
+                }
+                # таблица сортируется кликом по заголовку колонки
+                ordered = sorted(rows.values(), key=lambda r: (r['Оценка'] or 0, r['Базовая оценка'] or 0), reverse=True)
+                table.dataframe(ordered, use_container_width=True, hide_index=True)
+                progress.progress(finished / len(cv_urls), text=f'Готово {finished} из {len(cv_urls)}')
+        except ValueError as e:
+            st.error(str(e))
         else:
-            vac_description = "Вакансию не удалось прочитать"
+            progress.empty()
 
-        user_prompt = f"# ВАКАНСИЯ:\n{vac_description}\n\n# РЕЗЮМЕ:\n{cv_description}"
-        response = request_gpt(scoring_prompt, user_prompt)
-    st.write(response)
+# тайминги стадий (скачивание, разбор HTML/JSON, промпт, LLM) за этот запуск страницы;
+# счётчики общие для процесса, так что одновременные сессии видят и чужие span
+if debug:
+    spans = [x for x in telemetry.registry.recent if x.started_at >= run_started]
+    with st.expander('Отладка: время стадий', expanded=True):
+        if spans:
+            st.dataframe(telemetry.summarize(spans), use_container_width=True, hide_index=True)
+            st.dataframe(
+                [{'стадия': x.name, 'мс': round(x.seconds * 1000, 1), 'поток': x.thread, 'ошибка': x.error, **x.attrs} for x in spans],
+                use_container_width=True,
+                hide_index=True,
+            )
+        else:
+            st.caption('За этот запуск стадий не было')
+        st.code(telemetry.registry.render_prometheus(), language='text')
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Замеры стадий конвейера оценки: fetch (hh.ru), parse_cv / parse_vac (с фазами dom и json),
+# load_cv / load_vac (кэш страниц), llm (модель и кэш ответов).
+# Каждая стадия оборачивается в span(): длительность, размер ответа, токены, попадание в кэш.
+# Из них же собираются метрики в формате Prometheus (render_prometheus / serve_metrics)
+# и, при TELEMETRY_LOG=1, структурированные JSON-логи по каждому span.
+
+TELEMETRY_LOG = os.environ.get("TELEMETRY_LOG", "0").lower() in ("1", "true", "yes")
+# Порт для /metrics (0 - не поднимать сервер)
+TELEMETRY_PROM_PORT = int(os.environ.get("TELEMETRY_PROM_PORT", "0"))
+
+logger = logging.getLogger("cv_scoring.telemetry")
+if TELEMETRY_LOG and not logger.handlers:
+    # по строке JSON на span в stderr, независимо от настройки логирования приложения
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Границы корзин гистограммы длительностей (секунды)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Сколько последних span держать в памяти для панели отладки
+RECENT_SPANS = 2000
+
+
+@dataclass
+class Span:
+    name: str
+    started_at: float
+    seconds: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    thread: str = ""
+    error: str = ""
+
+
+@dataclass
+class _Histogram:
+    counts: List[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    total: int = 0
+    sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Метрики процесса: гистограммы длительностей и счётчики, плюс кольцевой буфер последних span."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, _Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.recent: Deque[Span] = deque(maxlen=RECENT_SPANS)
+        self._collectors: List[List[Span]] = []
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, s: Span) -> None:
+        with self._lock:
+            self.histograms.setdefault(s.name, _Histogram()).observe(s.seconds)
+            self.recent.append(s)
+            for spans in self._collectors:
+                spans.append(s)
+        if s.error:
+            self.count("errors_total", stage=s.name)
+        if s.attrs.get("bytes"):
+            self.count("bytes_total", s.attrs["bytes"], stage=s.name)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if s.attrs.get(kind):
+                self.count("tokens_total", s.attrs[kind], stage=s.name, kind=kind.split("_")[0])
+        if s.attrs.get("cache"):
+            self.count("cache_total", stage=s.name, result=s.attrs["cache"])
+
+    @contextmanager
+    def collect(self) -> Iterator[List[Span]]:
+        """Собирает все span (из любых потоков), завершившиеся внутри блока."""
+        spans: List[Span] = []
+        with self._lock:
+            self._collectors.append(spans)
+        try:
+            yield spans
+        finally:
+            with self._lock:
+                self._collectors.remove(spans)
+
+    def render_prometheus(self, prefix: str = "cv_scoring") -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        lines: List[str] = []
+        with self._lock:
+            histograms = {k: (list(h.counts), h.total, h.sum) for k, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for stage, (counts, total, total_sum) in sorted(histograms.items()):
+            for bound, n in zip(BUCKETS, counts):
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {total_sum:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {total}')
+
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                typed.add(name)
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{prefix}_{name}{{{label_str}}} {int(value) if float(value).is_integer() else value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Замер стадии. В блоке можно дописывать атрибуты в отданный dict:
+    bytes (размер ответа), prompt_tokens / completion_tokens, cache ("hit"/"miss"/...) -
+    по ним считаются метрики; остальные ключи попадают только в лог и панель отладки.
+    """
+    s = Span(name=name, started_at=time.time(), attrs=attrs, thread=threading.current_thread().name)
+    started = time.perf_counter()
+    try:
+        yield s.attrs
+    except BaseException as e:
+        # GeneratorExit - штатное закрытие потокового ответа, не ошибка
+        if not isinstance(e, GeneratorExit):
+            s.error = type(e).__name__
+        raise
+    finally:
+        s.seconds = time.perf_counter() - started
+        registry.record(s)
+        if TELEMETRY_LOG:
+            logger.info(json.dumps(
+                {"span": s.name, "seconds": round(s.seconds, 6), "thread": s.thread, "error": s.error or None, **s.attrs},
+                ensure_ascii=False,
+                default=str,
+            ))
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Декоратор: каждый вызов функции - span с этим именем."""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def collect() -> ContextManager[List[Span]]:
+    return registry.collect()
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def summarize(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Сводка по стадиям: число, суммарное время, p50/p95/max, байты, токены, попадания в кэш."""
+    groups: Dict[str, List[Span]] = {}
+    for s in spans:
+        groups.setdefault(s.name, []).append(s)
+    rows = []
+    for name, items in sorted(groups.items(), key=lambda kv: -sum(s.seconds for s in kv[1])):
+        secs = [s.seconds for s in items]
+        caches: Dict[str, int] = {}
+        for s in items:
+            if s.attrs.get("cache"):
+                caches[s.attrs["cache"]] = caches.get(s.attrs["cache"], 0) + 1
+        rows.append({
+            "стадия": name,
+            "n": len(items),
+            "всего, с": round(sum(secs), 3),
+            "p50, мс": round(_percentile(secs, 50) * 1000, 1),
+            "p95, мс": round(_percentile(secs, 95) * 1000, 1),
+            "max, мс": round(max(secs) * 1000, 1),
+            "КБ": round(sum(s.attrs.get("bytes") or 0 for s in items) / 1024, 1),
+            "токенов": sum((s.attrs.get("prompt_tokens") or 0) + (s.attrs.get("completion_tokens") or 0) for s in items),
+            "кэш": ", ".join(f"{k} {v}" for k, v in sorted(caches.items())),
+            "ошибок": sum(1 for s in items if s.error),
+        })
+    return rows
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve_metrics(port: int = TELEMETRY_PROM_PORT, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Поднимает (один раз на процесс) HTTP /metrics для Prometheus в фоновом потоке."""
+    global _server
+    if _server is not None or not port:
+        return _server
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            pass
+
+        def do_GET(self) -> None:  # noqa: N802
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        _server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        # порт уже занят (например, вторым процессом Streamlit) - метрики отдаёт тот процесс
+        logger.warning("telemetry: порт %s занят, /metrics не поднят", port)
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
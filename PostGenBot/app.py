@@ -1,18 +1,29 @@
 import os
-import io
 import time
-import uuid
 import base64
-from typing import Dict, Any, Optional, Tuple
+import hashlib
+import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator, TypeVar
 
-import requests
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
-from pydantic import BaseModel
+import logging
 
-from PIL import Image, ImageDraw, ImageFont
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import AnyHttpUrl, BaseModel
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from async_cache import AsyncTTLCache
+from image_store import DiskImageStore, MemoryImageStore, StoredImage
+from jobs import JobManager, QueueFull
+import story_render
 
 
 # ---------------------------
@@ -22,33 +33,116 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CURRENTS_API_KEY = os.getenv("CURRENTS_API_KEY")
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
 
+# Процессов для рендера картинок (кроп, оверлей, JPEG): столько картинок рисуются параллельно
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
 # TTL на хранение картинок в памяти (секунды)
 IMAGE_TTL_SECONDS = int(os.getenv("IMAGE_TTL_SECONDS", "1800"))  # 30 минут по умолчанию
 
-# Шрифт с кириллицей.
-DEFAULT_FONT_PATHS = [
-    os.getenv("FONT_PATH", "").strip(),
-    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-]
-
-def pick_font_path() -> Optional[str]:
-    for p in DEFAULT_FONT_PATHS:
-        if p and os.path.exists(p):
-            return p
-    return None
-
+# Лимит на суммарный размер картинок (МБ): сверх него вытесняются давно не запрошенные
+IMAGE_STORE_MAX_MB = int(os.getenv("IMAGE_STORE_MAX_MB", "256"))
+# Папка для картинок, общая для всех воркеров/реплик; пусто - хранить в памяти процесса
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "").strip()
+# Как часто чистить протухшие картинки в фоне (секунды)
+IMAGE_CLEANUP_INTERVAL = int(os.getenv("IMAGE_CLEANUP_INTERVAL", "60"))
+# Ширины версий для /image/{image_id}?w=...: запрошенная округляется вверх до ближайшей из списка,
+# чтобы число версий одной картинки было ограничено
+IMAGE_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "360,540,720,1080").split(",") if w.strip())
+
+# Кэш новостей по (тема, язык): свежие - NEWS_CACHE_TTL секунд, ещё NEWS_STALE_TTL
+# секунд отдаются устаревшие, пока в фоне идёт обновление
+NEWS_LANGUAGE = os.getenv("NEWS_LANGUAGE", "en")
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", "600"))
+NEWS_STALE_TTL = int(os.getenv("NEWS_STALE_TTL", "3600"))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", "256"))
+
+# Фоновые задачи /jobs: сколько генераций идёт одновременно и сколько может ждать в очереди
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
 
 if not OPENAI_API_KEY or not CURRENTS_API_KEY or not STABILITY_API_KEY:
     raise ValueError("Нужны переменные окружения: OPENAI_API_KEY, CURRENTS_API_KEY, STABILITY_API_KEY")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+logger = logging.getLogger("postgenbot")
+
+# Общий пул соединений для CurrentsAPI и Stability (создаётся при первом запросе)
+_http: Optional[httpx.AsyncClient] = None
+
+T = TypeVar("T")
+
+
+# Рендер картинок вне event loop и вне GIL, в отдельных процессах (запускаются при первой картинке).
+# spawn, а не fork: fork процесса с потоками (uvicorn, asyncio.to_thread) может унаследовать занятые блокировки
+def _new_image_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=IMAGE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=story_render.warm_up,
+    )
+
+
+image_pool = _new_image_pool()
+
+
+async def run_in_image_pool(fn: Callable[..., T], *args: Any) -> T:
+    """Выполняет fn в пуле рендера. Если воркер умер (OOM и т.п.), пул пересоздаётся и задача повторяется один раз."""
+    global image_pool
+    loop = asyncio.get_running_loop()
+    pool = image_pool
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Пул рендера картинок сломан, пересоздаю")
+        if image_pool is pool:
+            image_pool = _new_image_pool()
+            pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(image_pool, fn, *args)
+
+
+def http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http
+
+
+async def _cleanup_loop() -> None:
+    while True:
+        await asyncio.sleep(IMAGE_CLEANUP_INTERVAL)
+        try:
+            await asyncio.to_thread(image_store.cleanup)
+        except Exception:
+            logger.exception("Ошибка фоновой чистки картинок")
 
-app = FastAPI(title="Post+Image Generator API")
 
-# Простейшее in-memory хранилище для картинок
-# image_id -> {"bytes": b"...", "created_at": float, "content_type": "image/jpeg"}
-IMAGE_STORE: Dict[str, Dict[str, Any]] = {}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cleanup_task = asyncio.create_task(_cleanup_loop())
+    yield
+    cleanup_task.cancel()
+    await job_manager.stop()
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+    await client.close()
+    image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Post+Image Generator API", lifespan=lifespan)
+
+news_cache: AsyncTTLCache[str] = AsyncTTLCache(NEWS_CACHE_TTL, NEWS_STALE_TTL, NEWS_CACHE_MAX_ENTRIES)
+
+# Хранилище готовых картинок: в памяти процесса или в общей папке (см. image_store.py)
+if IMAGE_STORE_DIR:
+    image_store = DiskImageStore(IMAGE_STORE_DIR, IMAGE_STORE_MAX_MB * 1024 * 1024, IMAGE_TTL_SECONDS)
+else:
+    image_store = MemoryImageStore(IMAGE_STORE_MAX_MB * 1024 * 1024, IMAGE_TTL_SECONDS)
 
 
 # ---------------------------
@@ -58,28 +152,36 @@ class Topic(BaseModel):
     topic: str
 
 
-# ---------------------------
-# Helpers: cleanup
-# ---------------------------
-def cleanup_images() -> None:
-    """Удаляем протухшие картинки из памяти."""
-    now = time.time()
-    expired = [k for k, v in IMAGE_STORE.items() if now - v["created_at"] > IMAGE_TTL_SECONDS]
-    for k in expired:
-        IMAGE_STORE.pop(k, None)
+class JobRequest(Topic):
+    # куда отправить POST с результатом по завершении (необязательно); не http(s) URL - 422 сразу
+    callback_url: Optional[AnyHttpUrl] = None
 
 
 # ---------------------------
 # News
 # ---------------------------
-def get_recent_news(topic: str) -> str:
+def normalize_topic(topic: str) -> str:
+    """Ключ кэша: регистр и лишние пробелы не различаются."""
+    return " ".join(topic.split()).casefold()
+
+
+async def get_recent_news(topic: str, language: str = NEWS_LANGUAGE) -> str:
+    """
+    Заголовки свежих новостей по теме через кэш: повторные запросы той же темы
+    не ходят в CurrentsAPI, одновременные - ждут один общий запрос.
+    """
+    key = (normalize_topic(topic), language)
+    return await news_cache.get(key, lambda: fetch_recent_news(*key))
+
+
+async def fetch_recent_news(topic: str, language: str = NEWS_LANGUAGE) -> str:
     url = "https://api.currentsapi.services/v1/latest-news"
     params = {
-        "language": "en",
+        "language": language,
         "keywords": topic,
         "apiKey": CURRENTS_API_KEY,
     }
-    r = requests.get(url, params=params, timeout=30)
+    r = await http_client().get(url, params=params, timeout=30)
     if r.status_code != 200:
         raise HTTPException(status_code=500, detail=f"Ошибка CurrentsAPI: {r.text}")
 
@@ -93,8 +195,8 @@ def get_recent_news(topic: str) -> str:
 # ---------------------------
 # OpenAI: content generation
 # ---------------------------
-def oai_text(model: str, prompt: str, max_tokens: int, temperature: float = 0.7) -> str:
-    resp = client.chat.completions.create(
+async def oai_text(model: str, prompt: str, max_tokens: int, temperature: float = 0.7) -> str:
+    resp = await client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=max_tokens,
@@ -103,89 +205,175 @@ def oai_text(model: str, prompt: str, max_tokens: int, temperature: float = 0.7)
     return (resp.choices[0].message.content or "").strip()
 
 
-def generate_post_bundle(topic: str) -> Dict[str, str]:
-    recent_news = get_recent_news(topic)
-
-    title = oai_text(
-        model="gpt-4o",
-        max_tokens=80,
-        temperature=0.5,
-        prompt=(
-            f"Придумай привлекательный и точный заголовок статьи на русском на тему: '{topic}'.\n"
-            f"Учитывай актуальные новости:\n{recent_news}\n"
-            f"Ответь только заголовком."
-        ),
+async def oai_text_stream(
+    model: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float = 0.7,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """То же, что oai_text, но ответ приходит потоком: каждый кусок текста отдаётся в on_delta."""
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
     )
+    parts = []
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+    return "".join(parts).strip()
 
-    meta_description = oai_text(
-        model="gpt-4o-mini",
-        max_tokens=140,
-        temperature=0.5,
-        prompt=(
-            f"Напиши мета-описание (на русском) для статьи с заголовком: '{title}'. "
-            f"Должно быть информативно и включать ключевые слова. "
-            f"Ответь одним абзацем."
-        ),
-    )
 
-    post_content = oai_text(
-        model="gpt-4o",
-        max_tokens=1800,
-        temperature=0.5,
-        prompt=(
-            f"Напиши подробную статью для поста в Telegram на тему '{topic}' на русском языке.\n\n"
-            f"Учитывай контекст новостей:\n{recent_news}\n\n"
-            f"Форматирование и ограничения (ОБЯЗАТЕЛЬНО СОБЛЮДАТЬ):\n"
-            f"- Используй ТОЛЬКО HTML-теги: <b></b>, <i></i>, <u></u>, <s></s>, <code></code>, <pre></pre>, <a href=\"\"></a>\n"
-            f"- НЕ используй никакие другие HTML-теги\n"
-            f"- Заголовки и подзаголовки выделяй ТОЛЬКО тегом <b></b>\n"
-            f"- Для структуры используй переносы строк\n\n"
-            f"Требования к тексту:\n"
-            f"- Вступление, основная часть, заключение\n"
-            f"- Чёткая структура с подзаголовками\n"
-            f"- Анализ текущих трендов\n"
-            f"- Не более 800 символов\n\n"
-            f"Выдай ТОЛЬКО текст статьи, без пояснений."
+# шаг DAG: (имена шагов-зависимостей, корутина от их результатов)
+Step = Tuple[Tuple[str, ...], Callable[..., Awaitable[str]]]
+
+
+async def run_dag(steps: Dict[str, Step], on_done: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+    """
+    Выполняет шаги по зависимостям: каждый стартует, как только готовы его зависимости,
+    независимые идут параллельно. При ошибке любого шага остальные отменяются.
+    on_done(имя, результат) вызывается сразу по готовности каждого шага.
+    """
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(name: str) -> str:
+        deps, fn = steps[name]
+        args = [await tasks[d] for d in deps]
+        value = await fn(*args)
+        if on_done is not None:
+            on_done(name, value)
+        return value
+
+    for name in steps:
+        tasks[name] = asyncio.create_task(run(name))
+    try:
+        values = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        raise
+    return dict(zip(tasks, values))
+
+
+BUNDLE_FIELDS = ("title", "meta_description", "post_content", "image_prompt", "image_overlay_text")
+
+
+# событие потоковой генерации: (имя, данные)
+Emit = Callable[[str, Dict[str, Any]], None]
+
+
+async def generate_post_bundle(topic: str, emit: Optional[Emit] = None) -> Dict[str, str]:
+    """
+    Новости + пять генераций. Зависимости между ними:
+    новости -> заголовок -> мета-описание -> промпт картинки -> фраза для оверлея,
+    новости -> статья (параллельно со всей цепочкой заголовка).
+    Время ответа - самая длинная цепочка, а не сумма всех вызовов.
+
+    emit - для потоковой выдачи: каждое поле отдаётся событием сразу по готовности,
+    статья - ещё и по кускам (post_content.delta) по мере генерации.
+    """
+
+    async def title(recent_news: str) -> str:
+        return await oai_text(
+            model="gpt-4o",
+            max_tokens=80,
+            temperature=0.5,
+            prompt=(
+                f"Придумай привлекательный и точный заголовок статьи на русском на тему: '{topic}'.\n"
+                f"Учитывай актуальные новости:\n{recent_news}\n"
+                f"Ответь только заголовком."
             ),
-    )
+        )
+
+    async def meta_description(title: str) -> str:
+        return await oai_text(
+            model="gpt-4o-mini",
+            max_tokens=140,
+            temperature=0.5,
+            prompt=(
+                f"Напиши мета-описание (на русском) для статьи с заголовком: '{title}'. "
+                f"Должно быть информативно и включать ключевые слова. "
+                f"Ответь одним абзацем."
+            ),
+        )
 
-    image_prompt = oai_text(
-        model="gpt-4o",
-        max_tokens=250,
-        temperature=0.8,
-        prompt=(
-            f"Подготовь промпт на английском языке для генерации изображения в Stability.ai "
-            f"к посту по ключевым словам:\n{meta_description}\n\n"
-            f"Требования: изображение должно отражать смысл, быть понятным, без текста на самой картинке. "
-            f"Ответь только промптом."
-        ),
-    )
+    async def post_content(recent_news: str) -> str:
+        if emit is None:
+            generate = oai_text
+        else:
+            generate = partial(oai_text_stream, on_delta=lambda text: emit("post_content.delta", {"text": text}))
+        return await generate(
+            model="gpt-4o",
+            max_tokens=1800,
+            temperature=0.5,
+            prompt=(
+                f"Напиши подробную статью для поста в Telegram на тему '{topic}' на русском языке.\n\n"
+                f"Учитывай контекст новостей:\n{recent_news}\n\n"
+                f"Форматирование и ограничения (ОБЯЗАТЕЛЬНО СОБЛЮДАТЬ):\n"
+                f"- Используй ТОЛЬКО HTML-теги: <b></b>, <i></i>, <u></u>, <s></s>, <code></code>, <pre></pre>, <a href=\"\"></a>\n"
+                f"- НЕ используй никакие другие HTML-теги\n"
+                f"- Заголовки и подзаголовки выделяй ТОЛЬКО тегом <b></b>\n"
+                f"- Для структуры используй переносы строк\n\n"
+                f"Требования к тексту:\n"
+                f"- Вступление, основная часть, заключение\n"
+                f"- Чёткая структура с подзаголовками\n"
+                f"- Анализ текущих трендов\n"
+                f"- Не более 800 символов\n\n"
+                f"Выдай ТОЛЬКО текст статьи, без пояснений."
+                ),
+        )
+
+    async def image_prompt(meta_description: str) -> str:
+        return await oai_text(
+            model="gpt-4o",
+            max_tokens=250,
+            temperature=0.8,
+            prompt=(
+                f"Подготовь промпт на английском языке для генерации изображения в Stability.ai "
+                f"к посту по ключевым словам:\n{meta_description}\n\n"
+                f"Требования: изображение должно отражать смысл, быть понятным, без текста на самой картинке. "
+                f"Ответь только промптом."
+            ),
+        )
+
+    async def image_overlay_text(meta_description: str, image_prompt: str) -> str:
+        return await oai_text(
+            model="gpt-4o",
+            max_tokens=80,
+            temperature=0.8,
+            prompt=(
+                f"На основе ключевых слов:\n{meta_description}\n\n"
+                f"и промпта для изображения:\n{image_prompt}\n\n"
+                f"Сгенерируй вдохновляющую короткую фразу-цитату для оверлея на изображение. "
+                f"До 20 слов, на русском, без кавычек."
+            ),
+        )
 
-    image_overlay_text = oai_text(
-        model="gpt-4o",
-        max_tokens=80,
-        temperature=0.8,
-        prompt=(
-            f"На основе ключевых слов:\n{meta_description}\n\n"
-            f"и промпта для изображения:\n{image_prompt}\n\n"
-            f"Сгенерируй вдохновляющую короткую фразу-цитату для оверлея на изображение. "
-            f"До 20 слов, на русском, без кавычек."
-        ),
-    )
+    def on_done(name: str, value: str) -> None:
+        if emit is not None and name in BUNDLE_FIELDS:
+            emit(name, {"text": value})
 
-    return {
-        "title": title,
-        "meta_description": meta_description,
-        "post_content": post_content,
-        "image_prompt": image_prompt,
-        "image_overlay_text": image_overlay_text,
-    }
+    results = await run_dag({
+        "recent_news": ((), lambda: get_recent_news(topic)),
+        "title": (("recent_news",), title),
+        "post_content": (("recent_news",), post_content),
+        "meta_description": (("title",), meta_description),
+        "image_prompt": (("meta_description",), image_prompt),
+        "image_overlay_text": (("meta_description", "image_prompt"), image_overlay_text),
+    }, on_done)
+    return {k: results[k] for k in BUNDLE_FIELDS}
 
 
 # ---------------------------
 # Stability: image generation
 # ---------------------------
-def stability_generate_jpeg(prompt: str) -> bytes:
+async def stability_generate_jpeg(prompt: str) -> bytes:
     url = "https://api.stability.ai/v2beta/stable-image/generate/sd3"
     headers = {
         "authorization": f"Bearer {STABILITY_API_KEY}",
@@ -195,7 +383,7 @@ def stability_generate_jpeg(prompt: str) -> bytes:
         "prompt": prompt,
         "output_format": "jpeg",
     }
-    r = requests.post(url, headers=headers, files={"none": ""}, data=data, timeout=120)
+    r = await http_client().post(url, headers=headers, files={"none": ""}, data=data, timeout=120)
     if r.status_code != 200:
         try:
             detail = r.json()
@@ -205,106 +393,9 @@ def stability_generate_jpeg(prompt: str) -> bytes:
     return r.content
 
 
-def crop_to_story_9_16(img: Image.Image) -> Image.Image:
-    width, height = img.size
-    target_aspect = 9 / 16
-    current_aspect = width / height
-
-    if current_aspect > target_aspect:
-        new_width = int(height * target_aspect)
-        left = (width - new_width) // 2
-        right = left + new_width
-        return img.crop((left, 0, right, height))
-    elif current_aspect < target_aspect:
-        new_height = int(width / target_aspect)
-        top = (height - new_height) // 2
-        bottom = top + new_height
-        return img.crop((0, top, width, bottom))
-    return img
-
-
-def add_text_overlay(img: Image.Image, text: str) -> Image.Image:
-    """
-    Оверлей-плашка + текст.
-    """
-    img = img.convert("RGBA")
-    draw = ImageDraw.Draw(img)
-
-    font_path = pick_font_path()
-    if not font_path:
-        # Фоллбек: встроенный шрифт PIL может плохо поддерживать кириллицу,
-        # но пусть сервис не падает.
-        font = ImageFont.load_default()
-        font_size = None
-    else:
-        # Размер шрифта под story-формат
-        font_size = 52
-        font = ImageFont.truetype(font_path, font_size)
-
-    W, H = img.size
-    margin_x = int(W * 0.08)
-    margin_y = int(H * 0.08)
-    max_width = W - 2 * margin_x
-
-    # перенос строк
-    words = text.split()
-    lines = []
-    line = ""
-    for w in words:
-        test = (line + " " + w).strip()
-        try:
-            tw = draw.textlength(test, font=font)
-        except Exception:
-            tw = len(test) * 10  # грубый фоллбек
-        if tw <= max_width:
-            line = test
-        else:
-            if line:
-                lines.append(line)
-            line = w
-    if line:
-        lines.append(line)
-
-    # размеры блока
-    ascent, descent = font.getmetrics() if hasattr(font, "getmetrics") else (18, 6)
-    line_h = ascent + descent + 6
-    block_h = line_h * len(lines)
-
-    # позиция: верхняя часть (x=100, y=100)
-    x = margin_x
-    y = margin_y
-
-    # ширина блока по самой длинной строке
-    widths = []
-    for ln in lines:
-        try:
-            widths.append(draw.textlength(ln, font=font))
-        except Exception:
-            widths.append(len(ln) * 10)
-    block_w = int(max(widths) if widths else max_width)
-
-    # плашка
-    overlay = Image.new("RGBA", (block_w + 40, block_h + 30), (0, 0, 128, 180))
-    img.paste(overlay, (x - 20, y - 15), mask=overlay)
-
-    # текст
-    ty = y
-    for ln in lines:
-        draw.text((x, ty), ln, font=font, fill=(255, 255, 255, 255))
-        ty += line_h
-
-    return img.convert("RGB")
-
-
-def make_story_image(image_prompt: str, overlay_text: str) -> bytes:
-    raw = stability_generate_jpeg(image_prompt)
-    with Image.open(io.BytesIO(raw)) as im:
-        im = crop_to_story_9_16(im)
-        im = add_text_overlay(im, overlay_text)
-
-        out = io.BytesIO()
-        im.save(out, format="JPEG", quality=92, optimize=True)
-        return out.getvalue()
+async def make_story_image(image_prompt: str, overlay_text: str) -> bytes:
+    raw = await stability_generate_jpeg(image_prompt)
+    return await run_in_image_pool(story_render.render_story_jpeg, raw, overlay_text)
 
 
 # ---------------------------
@@ -321,43 +412,362 @@ async def heartbeat_api():
 
 @app.post("/generate-post")
 async def generate_post_api(topic: Topic):
-    return generate_post_bundle(topic.topic)
+    return await generate_post_bundle(topic.topic)
 
 
-@app.post("/generate-post-with-image")
-async def generate_post_with_image_api(topic: Topic):
-    cleanup_images()
+async def generate_post_with_image(topic: str) -> Dict[str, Any]:
+    bundle = await generate_post_bundle(topic)
+    return {**bundle, **await attach_story_image(bundle)}
 
-    bundle = generate_post_bundle(topic.topic)
-    img_bytes = make_story_image(bundle["image_prompt"], bundle["image_overlay_text"])
 
-    image_id = uuid.uuid4().hex
-    IMAGE_STORE[image_id] = {
-        "bytes": img_bytes,
-        "created_at": time.time(),
-        "content_type": "image/jpeg",
-    }
+async def attach_story_image(bundle: Dict[str, str]) -> Dict[str, Any]:
+    """Картинка по готовому набору текстов: генерация, оверлей, сохранение; поля image_*."""
+    img_bytes = await make_story_image(bundle["image_prompt"], bundle["image_overlay_text"])
+
+    item = await asyncio.to_thread(image_store.put, img_bytes, "image/jpeg")
 
     # Render обычно сидит за прокси, поэтому базовый URL удобнее передавать env-ом
     base_url = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
-    image_url = f"{base_url}/image/{image_id}" if base_url else f"/image/{image_id}"
+    image_url = f"{base_url}/image/{item.image_id}" if base_url else f"/image/{item.image_id}"
 
     return {
-        **bundle,
-        "image_id": image_id,
+        "image_id": item.image_id,
         "image_url": image_url,
-        "image_expires_at": int(IMAGE_STORE[image_id]["created_at"] + IMAGE_TTL_SECONDS),
+        "image_expires_at": int(item.expires_at),
     }
 
 
+async def post_webhook(url: str, payload: Dict[str, Any]) -> None:
+    r = await http_client().post(url, json=payload, timeout=30)
+    r.raise_for_status()
+
+
+job_manager = JobManager(
+    runner=generate_post_with_image,
+    notify=post_webhook,
+    workers=JOB_WORKERS,
+    queue_size=JOB_QUEUE_SIZE,
+    ttl=IMAGE_TTL_SECONDS,
+)
+
+
+@app.post("/generate-post-with-image")
+async def generate_post_with_image_api(topic: Topic):
+    return await generate_post_with_image(topic.topic)
+
+
+# Пустой комментарий в поток раз в N секунд, чтобы прокси не закрыли соединение во время генерации картинки
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+async def post_events(topic: str, with_image: bool) -> AsyncIterator[Optional[Tuple[str, Dict[str, Any]]]]:
+    """
+    События генерации по мере готовности: title, meta_description, post_content.delta (куски статьи),
+    post_content, image_prompt, image_overlay_text, затем image_url и done (или error).
+    None - пауза без событий дольше STREAM_KEEPALIVE_SECONDS.
+    """
+    queue: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+
+    def emit(event: str, data: Dict[str, Any]) -> None:
+        queue.put_nowait((event, data))
+
+    async def produce() -> None:
+        try:
+            bundle = await generate_post_bundle(topic, emit=emit)
+            if with_image:
+                emit("image_url", await attach_story_image(bundle))
+            emit("done", {})
+        except Exception as e:
+            emit("error", {"detail": getattr(e, "detail", None) or f"{type(e).__name__}: {e}"})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is None:
+                return
+            yield item
+    finally:
+        # клиент отключился - генерацию не продолжаем
+        task.cancel()
+
+
+@app.post("/generate-post-stream")
+async def generate_post_stream_api(topic: Topic, format: str = "sse", image: bool = True):
+    """
+    Поля поста потоком, по мере готовности: Server-Sent Events (format=sse)
+    или NDJSON (format=ndjson, по JSON-объекту {"event": ..., "data": ...} на строку).
+    image=false - без картинки.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be sse or ndjson")
+
+    async def body() -> AsyncIterator[str]:
+        async for item in post_events(topic.topic, image):
+            if item is None:
+                yield ": keep-alive\n\n" if format == "sse" else "\n"
+                continue
+            event, data = item
+            if format == "sse":
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            else:
+                yield json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        # без буферизации на прокси (nginx и т.п.)
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job_api(req: JobRequest):
+    """
+    То же, что /generate-post-with-image, но в фоне: сразу отдаёт job_id,
+    результат - по GET /jobs/{job_id} или POST на callback_url.
+    """
+    try:
+        job = job_manager.submit(req.topic, str(req.callback_url) if req.callback_url else None)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+
+    base_url = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+    return JSONResponse(
+        status_code=202,
+        content={**job.public(), "status_url": f"{base_url}/jobs/{job.job_id}"},
+        headers={"Location": f"{base_url}/jobs/{job.job_id}"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_api(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.public()
+
+
+# ---------------------------
+# Image delivery
+# ---------------------------
+IMAGE_FORMATS = story_render.available_formats()
+
+# генерируемые сейчас версии: одновременные запросы одной версии ждут одну генерацию
+_renditions: Dict[str, "asyncio.Future[Any]"] = {}
+rendition_counters: Dict[str, int] = {"made": 0, "hits": 0, "coalesced": 0}
+
+
+def accept_weights(accept: str) -> Dict[str, float]:
+    """Типы из Accept с их q (без q - 1.0); диапазоны с некорректным q пропускаются."""
+    weights: Dict[str, float] = {}
+    for media_range in accept.lower().split(","):
+        media_type, *params = media_range.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = -1.0
+        if media_type.strip() and q >= 0:
+            weights[media_type.strip()] = q
+    return weights
+
+
+def negotiate_format(accept: str) -> Optional[str]:
+    """
+    Самый компактный формат, который клиент принимает (q > 0): AVIF, затем WebP, а при разных q -
+    с большим q. None - отдать как есть (в том числе если явный image/jpeg весит больше).
+    """
+    weights = accept_weights(accept)
+    best = None
+    for fmt in ("avif", "webp"):
+        q = weights.get(f"image/{fmt}", 0.0)
+        if fmt in IMAGE_FORMATS and q > 0 and (best is None or q > weights[f"image/{best}"]):
+            best = fmt
+    if best is not None and weights[f"image/{best}"] < weights.get("image/jpeg", 0.0):
+        return None
+    return best
+
+
+def pick_width(w: Optional[int]) -> Optional[int]:
+    if not w or not IMAGE_WIDTHS:
+        return None
+    return next((x for x in IMAGE_WIDTHS if x >= w), IMAGE_WIDTHS[-1])
+
+
+def rendition_key(image_id: str, fmt: str, width: Optional[int]) -> str:
+    """Ключ версии в image_store: хэш id оригинала и параметров, в том же формате, что и id картинок."""
+    return hashlib.sha256(f"{image_id}:{fmt}:{width or 0}".encode()).hexdigest()[:32]
+
+
+async def _make_rendition(item: StoredImage, fmt: str, width: Optional[int], rendition_id: str) -> StoredImage:
+    if item.data is not None:
+        raw = item.data
+    else:
+        raw = await asyncio.to_thread(read_file_range, item.path, 0, -1)
+    data = await run_in_image_pool(story_render.render_rendition, raw, fmt, width)
+    rendition_counters["made"] += 1
+    content_type = story_render.RENDITION_FORMATS[fmt][0]
+    # версия живёт до срока оригинала и вытесняется из хранилища раньше оригиналов
+    return await asyncio.to_thread(
+        image_store.put, data, content_type, rendition_id, expires_at=item.expires_at, derived=True
+    )
+
+
+async def get_rendition(item: StoredImage, fmt: str, width: Optional[int]) -> StoredImage:
+    """
+    Версия картинки в формате fmt и ширине width. Делается один раз и хранится в image_store
+    среди производных под ключом rendition_key до срока оригинала, дальше отдаётся оттуда.
+    """
+    rendition_id = rendition_key(item.image_id, fmt, width)
+    stored = image_store.get(rendition_id, derived=True)
+    if stored is not None:
+        rendition_counters["hits"] += 1
+        return stored
+    fut = _renditions.get(rendition_id)
+    if fut is None:
+        fut = asyncio.ensure_future(_make_rendition(item, fmt, width, rendition_id))
+        _renditions[rendition_id] = fut
+        fut.add_done_callback(lambda _: _renditions.pop(rendition_id, None))
+    else:
+        rendition_counters["coalesced"] += 1
+    # shield: отключившийся клиент не отменяет генерацию для остальных
+    return await asyncio.shield(fut)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Один диапазон из Range: bytes=a-b, bytes=a-, bytes=-n -> (начало, конец включительно).
+    None - заголовок не разобран, диапазон некорректен (a > b) или диапазонов несколько
+    (отдаётся вся картинка, как велит RFC 9110), (-1, -1) - диапазон начинается за концом картинки.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            n = int(last)
+            if n <= 0:
+                return (-1, -1)
+            start, end = max(0, size - n), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (-1, -1)
+    return (start, end)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+async def image_response(request: Request, item: StoredImage, headers: Dict[str, str]) -> Response:
+    """Картинка целиком или, по Range, её часть (206)."""
+    etag = headers["ETag"]
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range: диапазон только если у клиента та же версия, иначе вся картинка
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(range_header, item.size)
+    if byte_range == (-1, -1):
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{item.size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        if item.data is not None:
+            chunk = item.data[start:end + 1]
+        else:
+            chunk = await asyncio.to_thread(read_file_range, item.path, start, end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{item.size}"
+        return Response(content=chunk, status_code=206, media_type=item.content_type, headers=headers)
+
+    if item.path:
+        # файл отдаётся через sendfile, без копирования в память процесса
+        return FileResponse(item.path, media_type=item.content_type, headers=headers)
+    return Response(content=item.data, media_type=item.content_type, headers=headers)
+
+
+def read_file_range(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
 @app.get("/image/{image_id}")
-async def get_image(image_id: str):
-    cleanup_images()
-    item = IMAGE_STORE.get(image_id)
+async def get_image(image_id: str, request: Request, format: Optional[str] = None, w: Optional[int] = None):
+    """
+    Картинка как есть или её версия: format=jpeg|webp|avif (без него - по Accept клиента),
+    w - ширина (округляется до IMAGE_WIDTHS). Версии делаются один раз и кэшируются.
+    """
+    if format is not None and format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(IMAGE_FORMATS)}")
+
+    item = image_store.get(image_id)
     if not item:
         raise HTTPException(status_code=404, detail="Image not found or expired")
 
-    return Response(content=item["bytes"], media_type=item["content_type"])
+    fmt = format or negotiate_format(request.headers.get("accept", ""))
+    width = pick_width(w)
+    if fmt is not None or width is not None:
+        fmt = fmt or "jpeg"
+        etag = f'"{rendition_key(image_id, fmt, width)}"'
+    else:
+        etag = f'"{image_id}"'
+    headers = {
+        # id картинки и версии не меняются вместе с содержимым, так что ETag строгий
+        "ETag": etag,
+        # срок - по оригиналу: версии живут ровно до него
+        "Cache-Control": f"public, max-age={max(0, int(item.expires_at - time.time()))}",
+        "Accept-Ranges": "bytes",
+    }
+    if format is None:
+        # ответ выбран по Accept: без immutable, URL может отдавать разные версии
+        headers["Vary"] = "Accept"
+    else:
+        headers["Cache-Control"] += ", immutable"
+
+    # ETag известен до генерации версии: повторная проверка клиентом не запускает рендер
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if fmt is not None:
+        try:
+            item = await get_rendition(item, fmt, width)
+        except FileNotFoundError:
+            # файл оригинала удалила чистка между проверкой и чтением
+            raise HTTPException(status_code=404, detail="Image not found or expired")
+
+    return await image_response(request, item, headers)
+
+
+@app.get("/stats")
+async def stats_api():
+    """Метрики хранилища картинок (записей, байт, вытеснено по лимиту, протухло), версий картинок, кэша новостей и задач."""
+    return {
+        "images": image_store.stats(),
+        "renditions": {**rendition_counters, "inflight": len(_renditions)},
+        "news_cache": news_cache.stats(),
+        "jobs": job_manager.stats(),
+    }
 
 
 if __name__ == "__main__":
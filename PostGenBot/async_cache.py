@@ -0,0 +1,96 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger("postgenbot")
+
+
+class AsyncTTLCache(Generic[T]):
+    """
+    Кэш результатов асинхронных загрузок в памяти процесса.
+
+    - свежая запись (моложе ttl) отдаётся сразу;
+    - устаревшая (моложе ttl + stale_ttl) тоже отдаётся сразу, а в фоне запускается обновление;
+    - одновременные промахи по одному ключу ждут одну и ту же загрузку (single-flight);
+    - ошибки не кэшируются: при неудачном фоновом обновлении остаётся старое значение.
+    Число ключей ограничено max_entries, вытесняются давно не запрошенные.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        # ключ -> (значение, время загрузки)
+        self._items: "OrderedDict[Hashable, Tuple[T, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Future[T]"] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.counters: Dict[str, int] = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    def _store(self, key: Hashable, value: T) -> None:
+        self._items[key] = (value, time.monotonic())
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> "asyncio.Future[T]":
+        """Загрузка ключа: одна на все одновременные запросы."""
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+            return fut
+
+        async def run() -> T:
+            try:
+                value = await loader()
+            except BaseException:
+                self.counters["errors"] += 1
+                raise
+            finally:
+                self._inflight.pop(key, None)
+            self._store(key, value)
+            return value
+
+        fut = asyncio.ensure_future(run())
+        self._inflight[key] = fut
+        return fut
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        item = self._items.get(key)
+        if item is not None:
+            value, loaded_at = item
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                self.counters["hits"] += 1
+                self._items.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.counters["stale"] += 1
+                self._items.move_to_end(key)
+                if key not in self._inflight:
+                    self.counters["refreshes"] += 1
+                    task = self._load(key, loader)
+                    self._background.add(task)
+                    task.add_done_callback(self._refreshed)
+                return value
+
+        self.counters["misses"] += 1
+        # shield: отмена одного запроса не отменяет загрузку для остальных ожидающих
+        return await asyncio.shield(self._load(key, loader))
+
+    def _refreshed(self, task: "asyncio.Future[Any]") -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Фоновое обновление кэша не удалось: %r", task.exception())
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._items), "inflight": len(self._inflight), **self.counters}
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._items.clear()
+        else:
+            self._items.pop(key, None)
@@ -0,0 +1,270 @@
+import os
+import re
+import time
+import uuid
+import heapq
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+# Хранилища готовых картинок для /image/{image_id}.
+# MemoryImageStore - в памяти процесса, с лимитом по байтам (LRU) и TTL через кучу сроков.
+# DiskImageStore - файлы в общей папке (адрес = хэш содержимого): видны всем воркерам uvicorn
+# и репликам с общим диском, отдаются FileResponse (sendfile), протухшие удаляются фоновой чисткой.
+
+EXTENSIONS: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+}
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# подпапка производных версий в DiskImageStore (не пересекается с <id[:2]>: id - hex)
+DERIVED_DIR = "r"
+
+
+@dataclass
+class StoredImage:
+    image_id: str
+    content_type: str
+    created_at: float
+    expires_at: float
+    size: int
+    # содержимое (хранилище в памяти) или путь к файлу (на диске)
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+
+class MemoryImageStore:
+    """
+    Картинки в памяти процесса. Лимит на суммарный размер: сверх него вытесняются
+    давно не запрошенные (LRU), сначала производные версии, потом оригиналы. Сроки жизни
+    лежат в куче: протухшие снимаются с её вершины, O(log n) на запись, без обхода всего хранилища.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # оригиналы и производные версии (derived=True) - разные пространства ключей
+        self._items: "OrderedDict[str, StoredImage]" = OrderedDict()
+        self._derived: "OrderedDict[str, StoredImage]" = OrderedDict()
+        self._expiry: List[Tuple[float, str, bool]] = []
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _space(self, derived: bool) -> "OrderedDict[str, StoredImage]":
+        return self._derived if derived else self._items
+
+    def _remove(self, image_id: str, derived: bool) -> None:
+        item = self._space(derived).pop(image_id)
+        self.bytes -= item.size
+
+    def _expire(self, now: float) -> None:
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, image_id, derived = heapq.heappop(self._expiry)
+            item = self._space(derived).get(image_id)
+            # запись в куче могла остаться от уже вытесненной картинки
+            if item is not None and item.expires_at == expires_at:
+                self._remove(image_id, derived)
+                self.expired += 1
+
+    def _evict(self, keep: str, derived: bool) -> None:
+        # производная версия вытесняет только другие версии, оригинал - сначала версии, потом оригиналы;
+        # только что сохранённую картинку (она в конце своего OrderedDict) не вытесняем,
+        # даже если она одна больше лимита
+        for space_derived in (True,) if derived else (True, False):
+            space = self._space(space_derived)
+            while self.bytes > self.max_bytes and space:
+                image_id = next(iter(space))
+                if image_id == keep and space_derived == derived:
+                    break
+                self._remove(image_id, space_derived)
+                self.evictions += 1
+
+    def put(
+        self,
+        data: bytes,
+        content_type: str = "image/jpeg",
+        image_id: Optional[str] = None,
+        expires_at: Optional[float] = None,
+        derived: bool = False,
+    ) -> StoredImage:
+        """
+        image_id - свой ключ, по умолчанию случайный. derived - производная версия картинки
+        (вытесняется раньше оригиналов), expires_at - её срок (срок оригинала) вместо now + ttl.
+        """
+        now = time.time()
+        item = StoredImage(
+            image_id=image_id or uuid.uuid4().hex,
+            content_type=content_type,
+            created_at=now,
+            expires_at=expires_at if expires_at is not None else now + self.ttl,
+            size=len(data),
+            data=data,
+        )
+        with self._lock:
+            self._expire(now)
+            space = self._space(derived)
+            if item.image_id in space:
+                self._remove(item.image_id, derived)
+            space[item.image_id] = item
+            self.bytes += item.size
+            heapq.heappush(self._expiry, (item.expires_at, item.image_id, derived))
+            self._evict(item.image_id, derived)
+        return item
+
+    def get(self, image_id: str, derived: bool = False) -> Optional[StoredImage]:
+        with self._lock:
+            self._expire(time.time())
+            space = self._space(derived)
+            item = space.get(image_id)
+            if item is not None:
+                space.move_to_end(image_id)
+            return item
+
+    def cleanup(self) -> None:
+        with self._lock:
+            self._expire(time.time())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "derived": len(self._derived),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+class DiskImageStore:
+    """
+    Картинки файлами в общей папке: <root>/<id[:2]>/<id>.<ext>, id - хэш содержимого,
+    производные версии - в <root>/r/<id[:2]>/. Срок жизни считается от mtime файла
+    (повторная запись той же картинки его продлевает), cleanup() удаляет протухшие и,
+    если папка больше лимита, самые старые - сначала версии, потом оригиналы.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        # по последней чистке (папку делят несколько процессов, точные числа знает только обход)
+        self.entries = 0
+        self.derived = 0
+        self.bytes = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _path(self, image_id: str, content_type: str, derived: bool = False) -> str:
+        root = os.path.join(self.root, DERIVED_DIR) if derived else self.root
+        return os.path.join(root, image_id[:2], image_id + EXTENSIONS.get(content_type, ".bin"))
+
+    def put(
+        self,
+        data: bytes,
+        content_type: str = "image/jpeg",
+        image_id: Optional[str] = None,
+        expires_at: Optional[float] = None,
+        derived: bool = False,
+    ) -> StoredImage:
+        """
+        image_id - свой ключ (32 hex-символа), по умолчанию хэш содержимого. derived - производная
+        версия картинки (вытесняется раньше оригиналов), expires_at - её срок (срок оригинала):
+        mtime файла ставится так, чтобы mtime + ttl совпал с ним.
+        """
+        image_id = image_id or hashlib.sha256(data).hexdigest()[:32]
+        path = self._path(image_id, content_type, derived)
+        mtime = expires_at - self.ttl if expires_at is not None else time.time()
+        if os.path.exists(path):
+            os.utime(path, (time.time(), mtime))
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # запись во временный файл + rename: другие воркеры не увидят недописанную картинку
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.utime(tmp, (time.time(), mtime))
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except FileNotFoundError:
+                    pass
+                raise
+        return StoredImage(image_id, content_type, mtime, mtime + self.ttl, len(data), path=path)
+
+    def get(self, image_id: str, derived: bool = False) -> Optional[StoredImage]:
+        if not _ID_RE.match(image_id):
+            return None
+        for content_type in EXTENSIONS:
+            path = self._path(image_id, content_type, derived)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_mtime + self.ttl <= time.time():
+                return None
+            return StoredImage(image_id, content_type, st.st_mtime, st.st_mtime + self.ttl, st.st_size, path=path)
+        return None
+
+    def cleanup(self) -> None:
+        now = time.time()
+        alive: List[Tuple[bool, float, int, str]] = []
+        derived_root = os.path.join(self.root, DERIVED_DIR)
+        for dirpath, _, filenames in os.walk(self.root):
+            derived = os.path.dirname(dirpath) == derived_root
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    # недописанные временные файлы упавших процессов
+                    if name.endswith(".tmp") and st.st_mtime + 3600 <= now:
+                        os.remove(path)
+                    elif not name.endswith(".tmp") and st.st_mtime + self.ttl <= now:
+                        os.remove(path)
+                        self.expired += 1
+                    elif not name.endswith(".tmp"):
+                        # версии вытесняются первыми: в сортировке они раньше оригиналов
+                        alive.append((not derived, st.st_mtime, st.st_size, path))
+                except FileNotFoundError:
+                    # файл уже убрал другой воркер
+                    continue
+        total = sum(size for _, _, size, _ in alive)
+        alive.sort()
+        removed = 0
+        for _, _, size, path in alive:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        derived_left = sum(1 for original, _, _, _ in alive[removed:] if not original)
+        self.entries = len(alive) - removed - derived_left
+        self.derived = derived_left
+        self.bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self.entries,
+            "derived": self.derived,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
@@ -0,0 +1,156 @@
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("postgenbot")
+
+
+@dataclass
+class Job:
+    job_id: str
+    payload: Any
+    callback_url: Optional[str] = None
+    # queued -> running -> done / error
+    status: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+    def public(self) -> Dict[str, Any]:
+        """Состояние задачи для ответа API и webhook."""
+        out: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": int(self.created_at),
+        }
+        if self.finished_at is not None:
+            out["finished_at"] = int(self.finished_at)
+            out["expires_at"] = int(self.expires_at or 0)
+        if self.result is not None:
+            out["result"] = self.result
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobManager:
+    """
+    Фоновые задачи в памяти процесса: очередь ограниченного размера и фиксированное число
+    воркеров (корутин в event loop). Готовый результат хранится ttl секунд после завершения,
+    сроки - в куче, как у картинок. Если у задачи есть callback_url, по завершении туда
+    уходит POST с состоянием задачи (несколько попыток с паузой).
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[Dict[str, Any]]],
+        notify: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        workers: int,
+        queue_size: int,
+        ttl: int,
+        callback_attempts: int = 3,
+    ):
+        self.runner = runner
+        self.notify = notify
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.callback_attempts = callback_attempts
+        self.jobs: Dict[str, Job] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: Set[asyncio.Task] = set()
+
+    def _start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        tasks = self._tasks + list(self._callbacks)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._callbacks.clear()
+        self._queue = None
+
+    def _expire(self) -> None:
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, job_id = heapq.heappop(self._expiry)
+            self.jobs.pop(job_id, None)
+
+    def submit(self, payload: Any, callback_url: Optional[str] = None) -> Job:
+        """Ставит задачу в очередь; QueueFull, если очередь заполнена."""
+        self._start()
+        self._expire()
+        job = Job(job_id=uuid.uuid4().hex, payload=payload, callback_url=callback_url)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull() from None
+        self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self.jobs.get(job_id)
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await self.runner(job.payload)
+            job.status = "done"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.status = "error"
+            job.error = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+            logger.exception("Задача %s завершилась ошибкой", job.job_id)
+        job.finished_at = time.time()
+        job.expires_at = job.finished_at + self.ttl
+        heapq.heappush(self._expiry, (job.expires_at, job.job_id))
+        job.payload = None
+        if job.callback_url:
+            # доставка webhook с повторами не занимает воркер
+            task = asyncio.create_task(self._callback(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    async def _callback(self, job: Job) -> None:
+        for attempt in range(self.callback_attempts):
+            try:
+                await self.notify(job.callback_url, job.public())
+                return
+            except Exception as e:
+                logger.warning("Webhook задачи %s: попытка %d не удалась: %r", job.job_id, attempt + 1, e)
+                if attempt + 1 < self.callback_attempts:
+                    await asyncio.sleep(2 ** attempt)
+
+    def stats(self) -> Dict[str, int]:
+        by_status: Dict[str, int] = {}
+        for job in self.jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"workers": self.workers, "queue_size": self.queue_size, **by_status}
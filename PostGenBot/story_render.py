@@ -0,0 +1,219 @@
+import io
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+
+# Рендер story-картинки: кроп 9:16, плашка с текстом, JPEG.
+# Модуль не зависит от app.py: функции выполняются в пуле процессов, и воркерам
+# достаточно импортировать только Pillow. Шрифты и ширины слов кэшируются
+# на процесс, так что прогретый воркер не читает .ttf и не меряет одно и то же повторно.
+
+# Шрифт с кириллицей.
+DEFAULT_FONT_PATHS = [
+    os.getenv("FONT_PATH", "").strip(),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
+
+# Размер шрифта под story-формат
+FONT_SIZE = 52
+
+# Выше этой высоты JPEG декодируется сразу с уменьшением (draft), а результат ужимается до неё
+STORY_MAX_HEIGHT = int(os.getenv("STORY_MAX_HEIGHT", "1920"))
+
+JPEG_QUALITY = 92
+
+# Версии для выдачи: формат -> (content-type, формат Pillow, параметры save).
+# JPEG - прогрессивный: в Telegram и браузерах картинка проявляется до полной загрузки
+RENDITION_FORMATS: Dict[str, Tuple[str, str, Dict[str, object]]] = {
+    "jpeg": ("image/jpeg", "JPEG", {"quality": 85, "progressive": True}),
+    "webp": ("image/webp", "WEBP", {"quality": 80, "method": 4}),
+    "avif": ("image/avif", "AVIF", {"quality": 60, "speed": 8}),
+}
+
+Font = Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]
+
+
+@lru_cache(maxsize=1)
+def pick_font_path() -> Optional[str]:
+    for p in DEFAULT_FONT_PATHS:
+        if p and os.path.exists(p):
+            return p
+    return None
+
+
+@lru_cache(maxsize=16)
+def load_font(path: Optional[str], size: int) -> Font:
+    if not path:
+        # Фоллбек: встроенный шрифт PIL может плохо поддерживать кириллицу,
+        # но пусть сервис не падает.
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+
+# шрифт -> слово -> ширина; слова в фразах для оверлея повторяются мало, так что кэш ограничен
+_word_widths: Dict[int, Dict[str, float]] = {}
+WORD_CACHE_SIZE = 4096
+
+
+def text_width(font: Font, text: str) -> float:
+    """Ширина строки, запомненная для шрифта (шрифты из load_font живут весь процесс)."""
+    cache = _word_widths.setdefault(id(font), {})
+    w = cache.get(text)
+    if w is None:
+        try:
+            w = font.getlength(text)
+        except Exception:
+            w = len(text) * 10  # грубый фоллбек
+        if len(cache) >= WORD_CACHE_SIZE:
+            cache.clear()
+        cache[text] = w
+    return w
+
+
+def wrap_text(text: str, font: Font, max_width: float) -> List[str]:
+    """
+    Жадный перенос по словам. Ширина строки считается как сумма ширин слов и пробелов,
+    каждое слово меряется один раз: линейно по длине текста, без перемера растущей строки.
+    """
+    space = text_width(font, " ")
+    lines: List[str] = []
+    line: List[str] = []
+    line_w = 0.0
+    for w in text.split():
+        ww = text_width(font, w)
+        if line and line_w + space + ww > max_width:
+            lines.append(" ".join(line))
+            line, line_w = [w], ww
+        elif line:
+            line.append(w)
+            line_w += space + ww
+        else:
+            line, line_w = [w], ww
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+
+def story_box(width: int, height: int) -> Tuple[int, int, int, int]:
+    """Центральная область 9:16 внутри картинки width x height."""
+    target_aspect = 9 / 16
+    current_aspect = width / height
+
+    if current_aspect > target_aspect:
+        new_width = int(height * target_aspect)
+        left = (width - new_width) // 2
+        return (left, 0, left + new_width, height)
+    elif current_aspect < target_aspect:
+        new_height = int(width / target_aspect)
+        top = (height - new_height) // 2
+        return (0, top, width, top + new_height)
+    return (0, 0, width, height)
+
+
+def crop_to_story_9_16(img: Image.Image) -> Image.Image:
+    """
+    Кроп 9:16. Если ещё не декодированный JPEG выше STORY_MAX_HEIGHT, сначала выставляется
+    draft: декодер уменьшает картинку на этапе DCT (в 2/4/8 раз), и полный кадр
+    в исходном размере не распаковывается вовсе.
+    """
+    if img.format == "JPEG" and img.mode == "RGB":
+        _, top, _, bottom = story_box(*img.size)
+        scale = (bottom - top) // STORY_MAX_HEIGHT
+        if scale > 1:
+            img.draft("RGB", (img.width // scale, img.height // scale))
+
+    box = story_box(*img.size)
+    if box != (0, 0) + img.size:
+        img = img.crop(box)
+    if img.height > STORY_MAX_HEIGHT:
+        img = img.resize((round(img.width * STORY_MAX_HEIGHT / img.height), STORY_MAX_HEIGHT), Image.LANCZOS)
+    return img
+
+
+def add_text_overlay(img: Image.Image, text: str) -> Image.Image:
+    """
+    Оверлей-плашка + текст. Рисуется прямо по RGB: полупрозрачная плашка
+    накладывается цветом через маску, без перевода всего кадра в RGBA и обратно.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    draw = ImageDraw.Draw(img)
+
+    font_path = pick_font_path()
+    font = load_font(font_path, FONT_SIZE)
+
+    W, H = img.size
+    margin_x = int(W * 0.08)
+    margin_y = int(H * 0.08)
+    max_width = W - 2 * margin_x
+
+    lines = wrap_text(text, font, max_width)
+
+    # размеры блока
+    ascent, descent = font.getmetrics() if hasattr(font, "getmetrics") else (18, 6)
+    line_h = ascent + descent + 6
+    block_h = line_h * len(lines)
+
+    # позиция: верхняя часть
+    x = margin_x
+    y = margin_y
+
+    # ширина блока по самой длинной строке
+    widths = [text_width(font, ln) for ln in lines]
+    block_w = int(max(widths) if widths else max_width)
+
+    # плашка: цвет (0, 0, 128) с непрозрачностью 180/255
+    plaque = (block_w + 40, block_h + 30)
+    img.paste((0, 0, 128), (x - 20, y - 15, x - 20 + plaque[0], y - 15 + plaque[1]), mask=Image.new("L", plaque, 180))
+
+    # текст
+    ty = y
+    for ln in lines:
+        draw.text((x, ty), ln, font=font, fill=(255, 255, 255))
+        ty += line_h
+
+    return img
+
+
+def render_story_jpeg(raw: bytes, overlay_text: str) -> bytes:
+    """Кроп 9:16 + оверлей + JPEG. CPU-работа, выполняется в пуле процессов."""
+    with Image.open(io.BytesIO(raw)) as im:
+        im = crop_to_story_9_16(im)
+        im = add_text_overlay(im, overlay_text)
+
+        out = io.BytesIO()
+        im.save(out, format="JPEG", quality=JPEG_QUALITY)
+        return out.getvalue()
+
+
+def available_formats() -> List[str]:
+    """Форматы из RENDITION_FORMATS, которые умеет кодировать установленный Pillow."""
+    return [f for f in RENDITION_FORMATS if f == "jpeg" or features.check(f)]
+
+
+def render_rendition(raw: bytes, fmt: str, width: Optional[int] = None) -> bytes:
+    """
+    Версия готовой картинки в формате fmt, уменьшенная до ширины width (не увеличивается).
+    Уменьшаемый JPEG декодируется через draft сразу в меньшем масштабе.
+    """
+    _, pil_format, params = RENDITION_FORMATS[fmt]
+    with Image.open(io.BytesIO(raw)) as im:
+        if width and width < im.width:
+            size = (width, max(1, round(im.height * width / im.width)))
+            im.draft("RGB", size)
+            im = im.resize(size, Image.LANCZOS)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+
+        out = io.BytesIO()
+        im.save(out, format=pil_format, **params)
+        return out.getvalue()
+
+
+def warm_up() -> None:
+    """Инициализатор воркера пула: шрифт загружается до первой картинки."""
+    load_font(pick_font_path(), FONT_SIZE)